@@ -11,7 +11,6 @@ from datetime import date
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from database import Race, RaceEntry, OddsHistory, get_session_local
-from main import get_db
 
 def clear_odds_for_date(target_date):
     """Clear odds data for a specific date"""
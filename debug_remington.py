@@ -13,7 +13,7 @@ os.environ['RACING_API_BASE_URL'] = 'https://api.theracingapi.com'
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from database import get_db, Track, Race, Bet, RaceEntry
+from database import get_db, get_async_session_local, Track, Race, Bet, RaceEntry
 from racing_api import RacingAPIClient
 from data_sync import DataSync
 
@@ -90,7 +90,8 @@ async def debug_remington():
     
     try:
         print("Running initial sync...")
-        await data_sync.sync_initial_data(db)
+        async with get_async_session_local()() as async_db:
+            await data_sync.sync_initial_data(async_db)
         print("✓ Initial sync completed")
         
         # Check races again after sync
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Offline sync load test against the in-process fake TheRacingAPI.
+Needs DATABASE_URL (use a scratch database, synthetic tracks are added to it).
+
+    python load_test_sync.py --tracks 30 --latency-ms 80 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+# The fake server has no quota, don't throttle against it unless asked
+os.environ.setdefault('RACING_API_RATE_LIMIT', '0')
+
+import httpx
+from sqlalchemy import func, select
+
+from database import (Base, get_async_session_local, get_engine, dispose_async_engine, Race, RaceEntry, OddsHistory,
+                      SyncJournalEntry)
+from data_sync import DataSync
+from fake_racing_api import FakeConfig, create_app, synthetic_tracks
+from racing_api import RacingAPIClient
+from sync_journal import phase_summary, run_key_for
+from track_registry import track_registry
+
+
+async def load_test(args):
+    Base.metadata.create_all(bind=get_engine())
+
+    config = FakeConfig(tracks=args.tracks, races_per_card=args.races, field_size=args.field,
+                        latency_ms=args.latency_ms, error_rate=args.error_rate)
+    fake_app = create_app(config)
+    api_client = RacingAPIClient(transport=httpx.ASGITransport(app=fake_app))
+    api_client.base_url = "http://fake-racing-api"
+    sync = DataSync(api_client)
+
+    db = get_async_session_local()()
+    try:
+        await db.run_sync(track_registry.seed, synthetic_tracks(args.tracks))
+        await db.run_sync(track_registry.load, reload=True)
+        tracks = [t for t in track_registry.active() if t.code.startswith("FK")][:args.tracks]
+        print(f"Load testing {len(tracks)} tracks, {args.races} races x {args.field} runners, "
+              f"{args.latency_ms} ms latency, {args.error_rate:.1%} errors")
+
+        timings = {}
+        started = time.monotonic()
+        await sync.sync_initial_data(db, resume=False)
+        timings["initial"] = time.monotonic() - started
+
+        started = time.monotonic()
+        await sync.sync_pre_race_data(db, resume=False)
+        timings["pre_race"] = time.monotonic() - started
+
+        # One odds refresh round over every race, the poller's busiest tick
+        today = date.today()
+
+        async def refresh(track_db, track):
+            races = (await track_db.scalars(
+                select(Race).filter(Race.track_id == track.id, Race.race_date == today)
+            )).all()
+            return len(await sync.refresh_odds(track_db, track, today, races))
+
+        started = time.monotonic()
+        moved = await track_registry.run_per_track(refresh, tracks=tracks)
+        timings["odds_refresh"] = time.monotonic() - started
+
+        entries = await db.scalar(
+            select(func.count(RaceEntry.id)).join(Race, Race.id == RaceEntry.race_id).filter(Race.race_date == today)
+        )
+        odds_rows = await db.scalar(select(func.count(OddsHistory.id)))
+        for name, seconds in timings.items():
+            print(f"{name:>12}: {seconds:7.2f}s")
+        print(f"entries today: {entries}, odds history rows: {odds_rows}, "
+              f"{entries / max(timings['pre_race'], 1e-6):.1f} entries/s in pre-race sync")
+        print(f"races with moved odds: {sum(count or 0 for count in moved.values())}")
+        print(f"fake API: {fake_app.state.stats}")
+        for endpoint, stats in api_client.telemetry.snapshot()["endpoints"].items():
+            latency = stats["latency_ms"]
+            print(f"{endpoint}: {stats['calls']} calls, {stats['retries']} retries, {stats['bytes']} bytes, "
+                  f"p50 {latency['p50']} ms, p95 {latency['p95']} ms, max {latency['max']} ms")
+        failed = 0
+        for kind in ("initial", "pre_race"):
+            for phase in await db.run_sync(phase_summary, run_key_for(kind, today)):
+                print(f"{kind} {phase}")
+                failed += phase["failed"]
+        for entry in await db.scalars(select(SyncJournalEntry).filter(
+            SyncJournalEntry.run_key.in_([run_key_for("initial", today), run_key_for("pre_race", today)]),
+            SyncJournalEntry.status == "failed"
+        ).limit(10)):
+            print(f"failed {entry.run_key} {entry.phase} {entry.unit}: {entry.error}")
+        return failed
+    finally:
+        await db.close()
+        await api_client.aclose()
+        await dispose_async_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test DataSync against the fake TheRacingAPI")
+    parser.add_argument("--tracks", type=int, default=20)
+    parser.add_argument("--races", type=int, default=10)
+    parser.add_argument("--field", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    failed = asyncio.run(load_test(parser.parse_args()))
+    if failed:
+        print(f"{failed} journal units failed")
+        sys.exit(1)
@@ -0,0 +1,43 @@
+"""Unique (horse_id, race_date) on historical_performances
+
+Revision ID: 3c5e9a1f7b42
+Revises: 94af63798d7e
+Create Date: 2026-10-17 09:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5e9a1f7b42'
+down_revision: Union[str, None] = '94af63798d7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Remove duplicate performances, keeping the first row stored for each horse/date
+    op.execute("""
+        DELETE FROM historical_performances a
+        USING historical_performances b
+        WHERE a.horse_id = b.horse_id
+          AND a.race_date = b.race_date
+          AND a.id > b.id
+    """)
+    op.create_unique_constraint(
+        'uq_historical_performances_horse_race_date',
+        'historical_performances',
+        ['horse_id', 'race_date']
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint(
+        'uq_historical_performances_horse_race_date',
+        'historical_performances',
+        type_='unique'
+    )
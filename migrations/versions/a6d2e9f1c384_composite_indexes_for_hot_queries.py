@@ -0,0 +1,48 @@
+"""Composite indexes for the scoring and dashboard queries
+
+Revision ID: a6d2e9f1c384
+Revises: f4c1d8a2b937
+Create Date: 2026-10-17 17:12:26.480193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2e9f1c384'
+down_revision: Union[str, None] = 'f4c1d8a2b937'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns). A horse's runs by date are already covered by
+# uq_historical_performances_horse_race_date, and btree indexes are scanned
+# backwards for ORDER BY race_date DESC.
+INDEXES = [
+    ('ix_historical_performances_jockey_id_race_date', 'historical_performances', ['jockey_id', 'race_date']),
+    ('ix_historical_performances_trainer_id_race_date', 'historical_performances', ['trainer_id', 'race_date']),
+    ('ix_race_entries_race_id', 'race_entries', ['race_id']),
+    ('ix_races_track_id_race_date', 'races', ['track_id', 'race_date', 'race_number']),
+    ('ix_bets_race_id_entry_id', 'bets', ['race_id', 'entry_id']),
+    ('ix_daily_roi_track_id_date', 'daily_roi', ['track_id', 'date']),
+    ('ix_odds_history_entry_id_timestamp', 'odds_history', ['entry_id', 'timestamp']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY keeps the tables writable while multi-season data is indexed,
+    # it can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        op.execute(sa.text("ANALYZE historical_performances, race_entries, races, bets, daily_roi, odds_history"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,53 @@
+"""Add sync_tasks work queue
+
+Revision ID: b81d4e6c2a07
+Revises: 3c5e9a1f7b42
+Create Date: 2026-10-17 11:40:18.902731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81d4e6c2a07'
+down_revision: Union[str, None] = '3c5e9a1f7b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sync_tasks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('dedupe_key', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('duration_ms', sa.Float(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_sync_tasks_dedupe_key_active', 'sync_tasks', ['dedupe_key'], unique=True,
+        postgresql_where=sa.text("status IN ('pending', 'running')")
+    )
+    op.create_index('ix_sync_tasks_status_available_at', 'sync_tasks', ['status', 'available_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sync_tasks_status_available_at', table_name='sync_tasks')
+    op.drop_index('ix_sync_tasks_dedupe_key_active', table_name='sync_tasks')
+    op.drop_table('sync_tasks')
@@ -0,0 +1,38 @@
+"""Rekey legacy 'R<n>' race api_ids to '<track>-<yyyymmdd>-R<n>'
+
+Revision ID: c93b7e4d1f06
+Revises: a6d2e9f1c384
+Create Date: 2026-10-18 09:41:12.553870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c93b7e4d1f06'
+down_revision: Union[str, None] = 'a6d2e9f1c384'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Same format as data_sync.race_api_id, so stored races match the keys new syncs write
+    op.execute(sa.text("""
+        UPDATE races
+        SET api_id = tracks.code || '-' || to_char(races.race_date, 'YYYYMMDD') || '-R' || races.race_number
+        FROM tracks
+        WHERE races.track_id = tracks.id
+          AND races.api_id ~ '^R[0-9]+$'
+          AND races.race_date IS NOT NULL
+          AND races.race_number IS NOT NULL
+    """))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 'R<n>' keys are not unique across tracks and days, the rekeyed rows are left as they are
+    pass
@@ -0,0 +1,34 @@
+"""Track registry columns on tracks
+
+Revision ID: d52c7e3f9a18
+Revises: b81d4e6c2a07
+Create Date: 2026-10-17 13:05:27.640912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52c7e3f9a18'
+down_revision: Union[str, None] = 'b81d4e6c2a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tracks', sa.Column('api_codes', sa.JSON(), nullable=True))
+    op.add_column('tracks', sa.Column('active', sa.Boolean(), server_default=sa.text('true'), nullable=True))
+
+    # Carry over the code mapping that used to be hardcoded in the API client
+    op.execute("""UPDATE tracks SET api_codes = '["FMT", "FP"]' WHERE code = 'FM'""")
+    op.execute("UPDATE tracks SET api_codes = json_build_array(code) WHERE api_codes IS NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tracks', 'active')
+    op.drop_column('tracks', 'api_codes')
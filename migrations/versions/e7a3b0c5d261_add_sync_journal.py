@@ -0,0 +1,42 @@
+"""Add sync_journal for resumable sync runs
+
+Revision ID: e7a3b0c5d261
+Revises: d52c7e3f9a18
+Create Date: 2026-10-17 14:22:08.317645
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3b0c5d261'
+down_revision: Union[str, None] = 'd52c7e3f9a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sync_journal',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('run_key', sa.String(), nullable=False),
+        sa.Column('phase', sa.String(), nullable=False),
+        sa.Column('unit', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('duration_ms', sa.Float(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('run_key', 'phase', 'unit', name='uq_sync_journal_run_phase_unit')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sync_journal')
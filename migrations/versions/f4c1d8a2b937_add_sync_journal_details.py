@@ -0,0 +1,28 @@
+"""Add details to sync_journal for upstream API usage
+
+Revision ID: f4c1d8a2b937
+Revises: e7a3b0c5d261
+Create Date: 2026-10-17 16:05:41.902318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1d8a2b937'
+down_revision: Union[str, None] = 'e7a3b0c5d261'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sync_journal', sa.Column('details', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sync_journal', 'details')
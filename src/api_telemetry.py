@@ -0,0 +1,201 @@
+"""
+Upstream API telemetry
+Per-endpoint call counts, status codes, retries, response sizes and
+latency histograms for TheRacingAPI, plus time spent waiting on our own
+rate limiter. Sync journal units also get the upstream usage made while
+they ran, through a context variable.
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Upper bounds of the latency histogram buckets, the last bucket is open-ended
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Collapse ids in paths so each endpoint is one series
+_ENDPOINT_PATTERNS = [
+    (re.compile(r"^/v1/north-america/meets/[^/]+/(entries|results)$"), r"/v1/north-america/meets/{meet_id}/\1"),
+    (re.compile(r"^/v1/horses/[^/]+/history$"), "/v1/horses/{registration_number}/history"),
+    (re.compile(r"^/v1/(jockeys|trainers)/[^/]+/stats$"), r"/v1/\1/{id}/stats"),
+    (re.compile(r"^/v1/conditions/[^/]+/[^/]+$"), "/v1/conditions/{track_code}/{date}"),
+]
+
+# Usage collector of the sync unit currently running, if any
+_unit_usage: ContextVar[Optional[dict]] = ContextVar("racing_api_unit_usage", default=None)
+
+
+def endpoint_for(path: str) -> str:
+    for pattern, template in _ENDPOINT_PATTERNS:
+        if pattern.match(path):
+            return pattern.sub(template, path)
+    return path
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.status_codes: Dict[str, int] = {}
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Approximate percentile: upper bound of the bucket holding it (max for the open bucket)"""
+        if not self.calls:
+            return None
+        rank = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else self.latency_ms_max
+        return self.latency_ms_max
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "status_codes": dict(self.status_codes),
+            "latency_ms": {
+                "total": round(self.latency_ms_total, 1),
+                "avg": round(self.latency_ms_total / self.calls, 1) if self.calls else None,
+                "p50": self.percentile(0.5),
+                "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99),
+                "max": round(self.latency_ms_max, 1),
+                "buckets": {
+                    **{f"le_{bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)},
+                    "inf": self.buckets[-1]
+                }
+            }
+        }
+
+
+class ApiTelemetry:
+    def __init__(self, rate_limit: float = 0):
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.rate_limit = rate_limit
+        self.rate_limit_waits = 0
+        self.rate_limit_wait_ms = 0.0
+        self.started = time.time()
+        # Call times over the last minute, for quota usage
+        self._recent: List[float] = []
+        self._lock = threading.Lock()
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        return stats
+
+    def record(self, path: str, status: Optional[int], latency_ms: float, size: int = 0):
+        """One upstream attempt; status None means the request failed before a response"""
+        endpoint = endpoint_for(path)
+        error = status is None or status == 429 or status >= 500
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats(endpoint)
+            stats.calls += 1
+            stats.errors += error
+            stats.bytes += size
+            stats.latency_ms_total += latency_ms
+            stats.latency_ms_max = max(stats.latency_ms_max, latency_ms)
+            stats.buckets[sum(1 for bound in LATENCY_BUCKETS_MS if latency_ms > bound)] += 1
+            key = str(status) if status is not None else "error"
+            stats.status_codes[key] = stats.status_codes.get(key, 0) + 1
+
+            self._recent.append(now)
+            while self._recent and self._recent[0] < now - 60:
+                self._recent.pop(0)
+
+        usage = _unit_usage.get()
+        if usage is not None:
+            usage["calls"] += 1
+            usage["errors"] += error
+            usage["bytes"] += size
+            usage["latency_ms"] += latency_ms
+
+    def record_retry(self, path: str):
+        with self._lock:
+            self._stats(endpoint_for(path)).retries += 1
+        usage = _unit_usage.get()
+        if usage is not None:
+            usage["retries"] += 1
+
+    def record_rate_limit_wait(self, waited_ms: float):
+        with self._lock:
+            self.rate_limit_waits += 1
+            self.rate_limit_wait_ms += waited_ms
+        usage = _unit_usage.get()
+        if usage is not None:
+            usage["rate_limit_wait_ms"] += waited_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            last_minute = sum(1 for t in self._recent if t >= now - 60)
+            endpoints = {endpoint: stats.to_dict() for endpoint, stats in sorted(self.endpoints.items())}
+            return {
+                "since": self.started,
+                "calls": sum(stats.calls for stats in self.endpoints.values()),
+                "errors": sum(stats.errors for stats in self.endpoints.values()),
+                "retries": sum(stats.retries for stats in self.endpoints.values()),
+                "bytes": sum(stats.bytes for stats in self.endpoints.values()),
+                "quota": {
+                    "rate_limit_per_second": self.rate_limit or None,
+                    "calls_last_minute": last_minute,
+                    # Share of the configured quota used over the last minute
+                    "utilization": round(last_minute / (self.rate_limit * 60), 3) if self.rate_limit else None,
+                    "rate_limit_waits": self.rate_limit_waits,
+                    "rate_limit_wait_ms": round(self.rate_limit_wait_ms, 1)
+                },
+                "endpoints": endpoints
+            }
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.rate_limit_waits = 0
+            self.rate_limit_wait_ms = 0.0
+            self.started = time.time()
+            self._recent.clear()
+
+
+@contextmanager
+def track_usage():
+    """Collect the upstream usage of the code run inside, including tasks it starts"""
+    usage = {"calls": 0, "errors": 0, "retries": 0, "bytes": 0, "latency_ms": 0.0, "rate_limit_wait_ms": 0.0}
+    token = _unit_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _unit_usage.reset(token)
+        usage["latency_ms"] = round(usage["latency_ms"], 1)
+        usage["rate_limit_wait_ms"] = round(usage["rate_limit_wait_ms"], 1)
+
+
+def usage_delta(before: dict, after: dict) -> Dict[str, dict]:
+    """Per-endpoint calls, errors, retries, bytes and latency between two snapshots"""
+    delta = {}
+    for endpoint, stats in after["endpoints"].items():
+        prev = before["endpoints"].get(endpoint)
+        calls = stats["calls"] - (prev["calls"] if prev else 0)
+        if calls <= 0:
+            continue
+        delta[endpoint] = {
+            "calls": calls,
+            "errors": stats["errors"] - (prev["errors"] if prev else 0),
+            "retries": stats["retries"] - (prev["retries"] if prev else 0),
+            "bytes": stats["bytes"] - (prev["bytes"] if prev else 0),
+            "latency_ms": round(stats["latency_ms"]["total"] - (prev["latency_ms"]["total"] if prev else 0), 1)
+        }
+    return delta
@@ -0,0 +1,313 @@
+"""
+Multi-season historical backfill
+Walks every meet of the registered tracks in a date range and loads its
+races, entries, results and the full history of every horse that ran,
+with bounded parallelism. Progress is journaled per meet and per horse,
+so an interrupted backfill picks up where it stopped.
+
+    cd src && python backfill.py --start 2023-01-01 --end 2025-12-31 --workers 8
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Base, Race, dispose_async_engine, get_async_session_local, get_engine
+from data_sync import DataSync, race_api_id
+from racing_api import RacingAPIClient, get_api_client
+from sync_journal import SyncJournal, phase_summary
+from track_registry import TrackInfo, track_registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Days of meets requested per call when planning the backfill
+MEETS_WINDOW_DAYS = 30
+
+
+class BackfillStats:
+    def __init__(self, total_meets: int):
+        self.total_meets = total_meets
+        self.meets = 0
+        self.failed_meets = 0
+        self.races = 0
+        self.entries = 0
+        self.results = 0
+        self.horses = 0
+        self.performances = 0
+        self.started = time.monotonic()
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.meets / elapsed
+        remaining = self.total_meets - self.meets
+        eta = f"{remaining / rate / 60:.1f} min" if rate else "-"
+        return (
+            f"meets {self.meets}/{self.total_meets} ({self.failed_meets} failed), "
+            f"races {self.races}, entries {self.entries}, results {self.results}, "
+            f"horses {self.horses}, performances {self.performances} | "
+            f"{rate:.2f} meets/s, {self.entries / elapsed:.1f} entries/s, "
+            f"{self.performances / elapsed:.1f} performances/s, ETA {eta}"
+        )
+
+
+class Backfill:
+    def __init__(self, start_date: date, end_date: date, track_codes: Optional[List[str]] = None,
+                 workers: int = 8, histories: bool = True, resume: bool = True,
+                 api_client: RacingAPIClient = None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.track_codes = track_codes
+        self.workers = workers
+        self.histories = histories
+        self.api_client = api_client or get_api_client()
+        self.sync = DataSync(self.api_client)
+        self.journal = SyncJournal("backfill", resume=resume)
+        self.report_seconds = float(os.getenv("BACKFILL_REPORT_SECONDS", "10"))
+        # Horses claimed by a worker in this process, so each history is fetched once
+        self._claimed_horses: Set[str] = set()
+        self.stats: Optional[BackfillStats] = None
+
+    async def run(self) -> BackfillStats:
+        SessionLocal = get_async_session_local()
+        async with SessionLocal() as db:
+            await db.run_sync(track_registry.load)
+            await db.run_sync(self.journal.load)
+
+        tracks = track_registry.active()
+        if self.track_codes:
+            tracks = [track for track in tracks if track.code in self.track_codes]
+
+        meets = await self._plan(tracks)
+        self.stats = BackfillStats(len(meets))
+        logger.info(f"Backfilling {len(meets)} meets for {', '.join(t.code for t in tracks)} "
+                    f"from {self.start_date} to {self.end_date} with {self.workers} workers")
+
+        queue: "asyncio.Queue[Tuple[date, TrackInfo]]" = asyncio.Queue()
+        for meet in meets:
+            queue.put_nowait(meet)
+
+        async def worker():
+            while True:
+                try:
+                    race_date, track = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    async with SessionLocal() as db:
+                        await self._backfill_meet(db, track, race_date)
+                finally:
+                    # Cards and meet lookups are not reused once a meet is loaded
+                    self.api_client.invalidate_card_cache(track.code, race_date)
+                    self.api_client.invalidate_meet_cache(track.code, race_date)
+
+        started_at, usage_before = datetime.now(), self.api_client.telemetry.snapshot()
+        reporter = asyncio.create_task(self._report())
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(self.workers, 1))))
+        finally:
+            reporter.cancel()
+
+        logger.info(f"Backfill finished: {self.stats.report()}")
+        async with SessionLocal() as db:
+            await db.run_sync(self.journal.record_upstream, usage_before, self.api_client.telemetry.snapshot(), started_at)
+            await db.commit()
+            for phase in await db.run_sync(phase_summary, self.journal.run_key):
+                logger.info(f"  {phase}")
+        return self.stats
+
+    async def _plan(self, tracks: List[TrackInfo]) -> List[Tuple[date, TrackInfo]]:
+        """List the meets in range from a few ranged meet lookups, skipping meets already done"""
+        tracks_by_api_code: Dict[str, List[Tuple[int, TrackInfo]]] = {}
+        for track in tracks:
+            for priority, api_code in enumerate(track.api_codes):
+                tracks_by_api_code.setdefault(api_code, []).append((priority, track))
+
+        found: Dict[Tuple[date, str], Tuple[int, str, str]] = {}
+        window_start = self.start_date
+        while window_start <= self.end_date:
+            window_end = min(window_start + timedelta(days=MEETS_WINDOW_DAYS - 1), self.end_date)
+            for meet in await self.api_client.get_meets(window_start, window_end):
+                if not meet.get('date') or not meet.get('meet_id'):
+                    continue
+                race_date = date.fromisoformat(meet['date'])
+                for priority, track in tracks_by_api_code.get(meet.get('track_id'), []):
+                    # Keep the preferred API code when a track matches more than one meet
+                    key = (race_date, track.code)
+                    if key not in found or priority < found[key][0]:
+                        found[key] = (priority, meet['meet_id'], meet['track_id'])
+            window_start = window_end + timedelta(days=1)
+
+        tracks_by_code = {track.code: track for track in tracks}
+        meets = []
+        for (race_date, code), (_, meet_id, api_code) in sorted(found.items()):
+            if self.journal.is_done("meet", f"{code}:{race_date}"):
+                continue
+            self.api_client.remember_meet(code, race_date, meet_id, api_code)
+            meets.append((race_date, tracks_by_code[code]))
+        return meets
+
+    async def _backfill_meet(self, db: AsyncSession, track: TrackInfo, race_date: date):
+        """Load one meet; each write step commits before the next await so workers never block each other"""
+        unit = f"{track.code}:{race_date}"
+        failed = True
+        async with self.journal.unit(db, "meet", unit):
+            race_ids = await self._load_entries(db, track, race_date)
+            self.stats.races += len(race_ids)
+
+            results = await self.sync.ingest_meet_results(db, track, race_date)
+            await db.commit()
+            self.stats.results += sum(results.values())
+
+            if self.histories and race_ids:
+                await self._backfill_histories(db, list(race_ids.values()))
+            failed = False
+
+        self.stats.meets += 1
+        if failed:
+            self.stats.failed_meets += 1
+
+    async def _load_entries(self, db: AsyncSession, track: TrackInfo, race_date: date) -> Dict[int, int]:
+        """Load the meet's races and entries, returns {race_number: race_id}"""
+        if not self.api_client.streaming:
+            _, by_race = await self.api_client.get_meet_card(track.code, race_date)
+            race_ids = await db.run_sync(self._store_races, track, race_date, by_race)
+            self.stats.entries += sum(len(entries) for entries in by_race.values())
+            await db.commit()
+            return race_ids
+
+        # Streaming keeps one race in memory; commit each race before reading the next
+        race_ids = {}
+        async for race_number, entries in self.api_client.stream_meet_entries(track.code, race_date):
+            race_ids.update(await db.run_sync(self._store_races, track, race_date, {race_number: entries}))
+            await db.commit()
+            self.stats.entries += len(entries)
+        return race_ids
+
+    def _store_races(self, db: Session, track: TrackInfo, race_date: date, by_race: Dict[int, list]) -> Dict[int, int]:
+        """Upsert races and store their entries, returns {race_number: race_id}"""
+        race_ids = self._upsert_races(db, track, race_date, by_race)
+        for race_number, entries in by_race.items():
+            self.sync._sync_entries(db, race_ids[race_number], {"entries": entries})
+        return race_ids
+
+    def _upsert_races(self, db: Session, track: TrackInfo, race_date: date, by_race: Dict[int, list]) -> Dict[int, int]:
+        """Insert the meet's missing races, returns {race_number: race_id}"""
+        if not by_race:
+            return {}
+
+        def existing_races():
+            return dict(db.query(Race.race_number, Race.id).filter(
+                Race.track_id == track.id,
+                Race.race_date == race_date,
+                Race.race_number.in_(list(by_race))
+            ).all())
+
+        # Races already synced on the day keep their rows
+        race_ids = existing_races()
+        rows = []
+        for race_number, entries in by_race.items():
+            if race_number in race_ids:
+                continue
+            race_info = entries[0] if entries else {}
+            post_time_str = race_info.get('post_time', '')
+            try:
+                race_time = datetime.fromisoformat(post_time_str.replace('Z', '+00:00')) if post_time_str else None
+            except ValueError:
+                race_time = None
+
+            rows.append({
+                "api_id": race_api_id(track.code, race_date, race_number),
+                "track_id": track.id,
+                "race_number": race_number,
+                "race_date": race_date,
+                "race_time": race_time or datetime.combine(race_date, datetime.min.time()),
+                "distance": race_info.get('distance_value', 0),
+                "surface": race_info.get('surface_description', ''),
+                "race_type": race_info.get('race_type', ''),
+                "purse": race_info.get('purse', 0),
+                "conditions": race_info.get('race_restriction_description', '')
+            })
+
+        if not rows:
+            return race_ids
+
+        db.execute(pg_insert(Race).values(rows).on_conflict_do_nothing(index_elements=['api_id']))
+        return existing_races()
+
+    async def _backfill_histories(self, db: AsyncSession, race_ids: List[int]):
+        """Fetch the full history of every horse in these races not already loaded by this backfill"""
+        entries_by_horse: Dict[str, int] = {}
+        for reg_number, entry_id in (await db.run_sync(self.sync._card_horses, race_ids)).items():
+            if reg_number in self._claimed_horses or self.journal.is_done("history", reg_number):
+                continue
+            self._claimed_horses.add(reg_number)
+            entries_by_horse[reg_number] = entry_id
+
+        if not entries_by_horse:
+            return
+
+        fetch_stats = {}
+        histories = await self.sync._fetch_horse_histories(list(entries_by_horse), fetch_stats)
+        self.stats.performances += await db.run_sync(
+            self.sync._store_histories, entries_by_horse, histories, limit=None, incremental=False
+        )
+        self.stats.horses += len(entries_by_horse)
+
+        await db.run_sync(self.journal.record_many, "history", {
+            reg_number: ("done" if histories.get(reg_number) is not None else "failed", duration_ms, error)
+            for reg_number, (duration_ms, error) in fetch_stats.items()
+        })
+        await db.commit()
+
+        # Failed horses can be picked up again by a later meet
+        for reg_number in entries_by_horse:
+            if histories.get(reg_number) is None:
+                self._claimed_horses.discard(reg_number)
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            logger.info(f"Backfill progress: {self.stats.report()}")
+
+
+async def main(args):
+    Base.metadata.create_all(bind=get_engine())
+
+    api_client = get_api_client()
+    await api_client.open()
+    try:
+        backfill = Backfill(
+            args.start,
+            args.end,
+            track_codes=args.tracks.split(",") if args.tracks else None,
+            workers=args.workers,
+            histories=not args.no_history,
+            resume=not args.restart,
+            api_client=api_client
+        )
+        await backfill.run()
+    finally:
+        await api_client.aclose()
+        await dispose_async_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill races, entries, results and horse histories for past meets")
+    parser.add_argument("--start", type=date.fromisoformat, required=True, help="First meet date, YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today() - timedelta(days=1),
+                        help="Last meet date, YYYY-MM-DD (default yesterday)")
+    parser.add_argument("--tracks", help="Comma separated track codes (default every active track)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BACKFILL_WORKERS", "8")),
+                        help="Meets loaded concurrently, each holds a DB connection")
+    parser.add_argument("--no-history", action="store_true", help="Skip horse histories")
+    parser.add_argument("--restart", action="store_true", help="Ignore the journal and reload every meet")
+    asyncio.run(main(parser.parse_args()))
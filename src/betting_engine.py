@@ -7,23 +7,23 @@ from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from database import Horse, Jockey, Trainer, RaceEntry, HistoricalPerformance, Race, Bet
 import asyncio
-from racing_api import RacingAPIClient
+from racing_api import RacingAPIClient, get_api_client
 
 class BettingEngine:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, api_client: RacingAPIClient = None):
         self.db = db
-        self.api_client = RacingAPIClient()
+        self.api_client = api_client or get_api_client()
         self.daily_budget = 100.0
         self.max_bet_per_race = 50.0
         self.model = RandomForestRegressor(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
         
-    async def analyze_race(self, race: Race) -> List[Dict]:
+    def analyze_race(self, race: Race) -> List[Dict]:
         entries = self.db.query(RaceEntry).filter(RaceEntry.race_id == race.id).all()
         recommendations = []
         
         for entry in entries:
-            features = await self._extract_features(entry, race)
+            features = self._extract_features(entry, race)
             if features is not None:
                 confidence, expected_value = self._calculate_betting_metrics(features, entry.current_odds)
                 
@@ -44,7 +44,7 @@ class BettingEngine:
         recommendations.sort(key=lambda x: x['expected_value'], reverse=True)
         return self._optimize_bets(recommendations)
     
-    async def _extract_features(self, entry: RaceEntry, race: Race) -> np.ndarray:
+    def _extract_features(self, entry: RaceEntry, race: Race) -> np.ndarray:
         features = []
         
         # Horse performance features
@@ -185,4 +185,26 @@ class BettingEngine:
             for race_recs in all_recommendations
         )
         
-        return ((expected_return - total_wagered) / total_wagered) * 100
\ No newline at end of file
+        return ((expected_return - total_wagered) / total_wagered) * 100
+
+
+def score_race(db: Session, race_id: int, api_client: RacingAPIClient = None):
+    """Replace a race's bets with the engine's current recommendations"""
+    race = db.query(Race).filter(Race.id == race_id).first()
+    if not race:
+        return
+    
+    db.query(Bet).filter(Bet.race_id == race_id).delete()
+    
+    for rec in BettingEngine(db, api_client).analyze_race(race):
+        db.add(Bet(
+            race_id=race.id,
+            entry_id=rec['entry_id'],
+            bet_type=rec['bet_type'],
+            amount=rec['bet_amount'],
+            odds=rec['current_odds'],
+            confidence=rec['confidence'],
+            expected_value=rec['expected_value']
+        ))
+    
+    db.commit()
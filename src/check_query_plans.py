@@ -0,0 +1,118 @@
+"""
+Query plan check
+EXPLAINs the scoring and dashboard hot queries and fails if any of them
+reads its main table with a sequential scan instead of an index. Sample
+ids are the busiest horse, jockey, trainer, track and race, so run it on
+a database holding a multi-season backfill; on small tables Postgres
+rightly prefers sequential scans.
+
+    cd src && python check_query_plans.py --analyze
+"""
+
+import argparse
+import json
+import sys
+from typing import Iterator, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query, Session
+
+from database import Bet, DailyROI, HistoricalPerformance, OddsHistory, Race, RaceEntry, get_session_local
+
+
+def busiest(db: Session, column) -> Optional[int]:
+    """Value of `column` with the most rows, the worst case for its queries"""
+    row = db.query(column, func.count()).filter(column.isnot(None)).group_by(column).order_by(
+        func.count().desc()
+    ).first()
+    return row[0] if row else None
+
+
+def hot_queries(db: Session) -> List[tuple]:
+    """(name, table read, query) for the access paths the indexes are for"""
+    horse_id = busiest(db, HistoricalPerformance.horse_id)
+    jockey_id = busiest(db, HistoricalPerformance.jockey_id)
+    trainer_id = busiest(db, HistoricalPerformance.trainer_id)
+    race_id = busiest(db, RaceEntry.race_id)
+    track_id = busiest(db, Race.track_id)
+    race_date = db.query(func.max(Race.race_date)).filter(Race.track_id == track_id).scalar()
+    entry_ids = [entry_id for (entry_id,) in db.query(RaceEntry.id).filter(RaceEntry.race_id == race_id)]
+
+    return [
+        ("horse form (BettingEngine, SimpleOptimalBettingModel)", "historical_performances",
+         db.query(HistoricalPerformance).filter(HistoricalPerformance.horse_id == horse_id)
+         .order_by(HistoricalPerformance.race_date.desc()).limit(20)),
+        ("jockey form (BettingEngine)", "historical_performances",
+         db.query(HistoricalPerformance).filter(HistoricalPerformance.jockey_id == jockey_id)
+         .order_by(HistoricalPerformance.race_date.desc()).limit(20)),
+        ("trainer form (BettingEngine)", "historical_performances",
+         db.query(HistoricalPerformance).filter(HistoricalPerformance.trainer_id == trainer_id)
+         .order_by(HistoricalPerformance.race_date.desc()).limit(20)),
+        ("race entries", "race_entries",
+         db.query(RaceEntry).filter(RaceEntry.race_id == race_id)),
+        ("track card for a day", "races",
+         db.query(Race).filter(Race.track_id == track_id, Race.race_date == race_date)
+         .order_by(Race.race_number)),
+        ("bets on a race", "bets",
+         db.query(Bet).filter(Bet.race_id == race_id)),
+        ("odds movement of a race", "odds_history",
+         db.query(OddsHistory).filter(OddsHistory.entry_id.in_(entry_ids or [0]))
+         .order_by(OddsHistory.entry_id, OddsHistory.timestamp)),
+        ("recent daily ROI", "daily_roi",
+         db.query(DailyROI).filter(DailyROI.track_id == track_id).order_by(DailyROI.date.desc()).limit(10)),
+    ]
+
+
+def plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(db: Session, query: Query, analyze: bool = False) -> dict:
+    compiled = query.statement.compile(dialect=postgresql.dialect())
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    result = db.connection().exec_driver_sql(f"EXPLAIN ({options}) {compiled}", compiled.params).scalar()
+    return (json.loads(result) if isinstance(result, str) else result)[0]
+
+
+def check(db: Session, analyze: bool = False) -> bool:
+    """Print each hot query's plan summary, returns False if any reads its table sequentially"""
+    queries = hot_queries(db)
+    table_rows = dict(db.execute(text(
+        "SELECT relname, reltuples::bigint FROM pg_class WHERE relkind = 'r' AND relname = ANY(:tables)"
+    ), {"tables": [table for _, table, _ in queries]}).all())
+
+    ok = True
+    for name, table, query in queries:
+        plan = explain(db, query, analyze)
+        scans = [node for node in plan_nodes(plan["Plan"]) if node.get("Relation Name") == table]
+        seq_scan = any(node["Node Type"] == "Seq Scan" for node in scans)
+        ok = ok and not seq_scan
+
+        used = ", ".join(
+            f"{node['Node Type']} using {node['Index Name']}" if node.get("Index Name") else node["Node Type"]
+            for node in scans
+        ) or "no scan of " + table
+        timing = f", {plan['Execution Time']:.2f} ms" if analyze else ""
+        print(f"{'SEQ ' if seq_scan else 'ok  '} {name}: {used} "
+              f"(cost {plan['Plan']['Total Cost']:.1f}{timing}, {table} ~{table_rows.get(table, 0)} rows)")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the hot scoring and dashboard queries use index scans")
+    parser.add_argument("--analyze", action="store_true", help="Run the queries (EXPLAIN ANALYZE) and show timings")
+    args = parser.parse_args()
+
+    db = get_session_local()()
+    try:
+        passed = check(db, args.analyze)
+    finally:
+        db.rollback()
+        db.close()
+    if not passed:
+        print("Some hot queries use sequential scans: run the migrations and ANALYZE, "
+              "or load more data if the tables are still small")
+    sys.exit(0 if passed else 1)
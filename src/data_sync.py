@@ -1,138 +1,258 @@
 import asyncio
+import hashlib
+import json
+import os
+import time
 from datetime import datetime, date, timedelta
+from sqlalchemy import event, func, update, insert, select, values, column, literal, Integer, Float
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from database import (
     Track, Horse, Jockey, Trainer, Race, RaceEntry, 
-    RaceResult, HistoricalPerformance, get_db
+    RaceResult, HistoricalPerformance, OddsHistory, entry_graph
 )
-from racing_api import RacingAPIClient
+from racing_api import RacingAPIClient, get_api_client
+from track_registry import track_registry, TrackInfo
+from sync_journal import SyncJournal
+from identity_map import identity_map, resolve_entry_ids, resolve_entry_ids_by_name, HORSES, JOCKEYS, TRAINERS, ENTRIES, ENTRY_NAMES
+from typing import Dict, List, Optional, Set, Tuple
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class DataSync:
+class HistoryWatermarks:
+    """Per-horse watermark for historical performances: latest stored race_date and last payload hash"""
+    
+    _PENDING_KEY = "history_watermarks_pending"
+    
     def __init__(self):
-        self.api_client = RacingAPIClient()
-        self.track_codes = {
-            "Remington Park": "RP",
-            "Fair Meadows": "FM"
-        }
+        self.latest: Dict[int, Optional[date]] = {}
+        self.payload_hash: Dict[int, str] = {}
+        self.synced_on: Dict[str, date] = {}
+    
+    def load(self, db: Session, horse_ids: List[int]):
+        """Load watermarks for horses not seen yet with one grouped query"""
+        unknown = [horse_id for horse_id in set(horse_ids) if horse_id not in self.latest]
+        if not unknown:
+            return
+        
+        found = dict(db.query(
+            HistoricalPerformance.horse_id, func.max(HistoricalPerformance.race_date)
+        ).filter(
+            HistoricalPerformance.horse_id.in_(unknown)
+        ).group_by(HistoricalPerformance.horse_id).all())
         
-    async def sync_initial_data(self, db: Session):
+        for horse_id in unknown:
+            self.latest[horse_id] = found.get(horse_id)
+    
+    def get_latest(self, db: Session, horse_id: int) -> Optional[date]:
+        pending = db.info.get(self._PENDING_KEY, {}).get(horse_id)
+        return pending[1] if pending else self.latest.get(horse_id)
+    
+    def get_payload_hash(self, db: Session, horse_id: int) -> Optional[str]:
+        pending = db.info.get(self._PENDING_KEY, {}).get(horse_id)
+        return pending[2] if pending else self.payload_hash.get(horse_id)
+    
+    def stage(self, db: Session, horse_id: int, reg_number: str, latest: Optional[date], digest: str):
+        """Record a new watermark, applied once the session commits"""
+        db.info.setdefault(self._PENDING_KEY, {})[horse_id] = (reg_number, latest, digest, date.today())
+    
+    def apply(self, session):
+        for horse_id, (reg_number, latest, digest, synced_on) in session.info.pop(self._PENDING_KEY, {}).items():
+            self.latest[horse_id] = latest
+            self.payload_hash[horse_id] = digest
+            self.synced_on[reg_number] = synced_on
+    
+    def discard(self, session):
+        session.info.pop(self._PENDING_KEY, None)
+
+history_watermarks = HistoryWatermarks()
+
+def race_api_id(track_code: str, race_date: date, race_number: int) -> str:
+    """Race key unique across tracks and days"""
+    return f"{track_code}-{race_date:%Y%m%d}-R{race_number}"
+
+def find_race(db: Session, track_id: int, race_date: date, race_number: int) -> Optional[Race]:
+    """A stored race by (track, date, number), so races stored under the legacy
+    'R<n>' api_id (before migration c93b7e4d1f06) are found rather than duplicated"""
+    return db.query(Race).filter(
+        Race.track_id == track_id,
+        Race.race_date == race_date,
+        Race.race_number == race_number
+    ).first()
+
+event.listen(Session, "after_commit", history_watermarks.apply)
+event.listen(Session, "after_rollback", history_watermarks.discard)
+
+class DataSync:
+    def __init__(self, api_client: RacingAPIClient = None):
+        self.api_client = api_client or get_api_client()
+        # Max concurrent horse history requests during pre-race sync
+        self.history_concurrency = int(os.getenv("SYNC_HISTORY_CONCURRENCY", "8"))
+        self._history_semaphore = None
+        # Rows per INSERT when bulk-loading historical performances
+        self.history_batch_size = int(os.getenv("SYNC_HISTORY_BATCH_SIZE", "1000"))
+        # Hand history fetches to `main.py --worker` processes through the sync_tasks queue
+        self.use_task_queue = os.getenv("SYNC_TASK_QUEUE", "false").lower() in ("1", "true", "yes")
+        
+    async def sync_initial_data(self, db: AsyncSession, resume: bool = True):
         """8 AM sync - get all races for the day"""
         logger.info("Starting 8 AM initial data sync")
         
-        for track_name, track_code in self.track_codes.items():
-            # Ensure track exists in database
-            track = db.query(Track).filter(Track.code == track_code).first()
-            if not track:
-                track = Track(name=track_name, code=track_code)
-                db.add(track)
-                db.commit()
+        today = date.today()
+        journal = SyncJournal("initial", today, resume)
+        await db.run_sync(journal.load)
+        await db.run_sync(track_registry.load)
+        started_at, usage_before = datetime.now(), self.api_client.telemetry.snapshot()
+        synced = await track_registry.run_per_track(self._sync_track_races, today, journal)
+        
+        await db.run_sync(journal.record_upstream, usage_before, self.api_client.telemetry.snapshot(), started_at)
+        await db.commit()
+        logger.info(f"Initial data sync completed: {synced}")
+    
+    async def _sync_track_races(self, db: AsyncSession, track: TrackInfo, race_date: date, journal: SyncJournal) -> int:
+        """Initial sync pipeline for one track"""
+        if journal.is_done("races", track.code):
+            return 0
+        
+        races_by_number = {}
+        async with journal.unit(db, "races", track.code):
+            races_data = await self.api_client.get_races_by_date(track.code, race_date)
             
-            # Get today's races
-            today = date.today()
-            try:
-                races_data = await self.api_client.get_races_by_date(track_code, today)
-                
-                # Group entries by race_number to identify unique races
-                races_by_number = {}
-                for entry in races_data.get('entries', []):
-                    race_num = entry.get('race_number', 0)
-                    if race_num not in races_by_number:
-                        races_by_number[race_num] = entry
-                
-                for race_number, race_info in races_by_number.items():
-                    await self._sync_race(db, track.id, race_info, today, race_number)
-                    
-            except Exception as e:
-                logger.error(f"Error syncing races for {track_name}: {e}")
-                
-        db.commit()
-        logger.info("Initial data sync completed")
+            # Group entries by race_number to identify unique races
+            for entry in races_data.get('entries', []):
+                race_num = entry.get('race_number', 0)
+                if race_num not in races_by_number:
+                    races_by_number[race_num] = entry
+            
+            for race_number, race_info in races_by_number.items():
+                await db.run_sync(self._sync_race, track.id, race_info, race_date, race_number)
+        
+        return len(races_by_number)
     
-    async def sync_pre_race_data(self, db: Session):
+    async def sync_pre_race_data(self, db: AsyncSession, resume: bool = True):
         """1 hour before first race - sync entries and calculate odds"""
         logger.info("Starting pre-race data sync")
         
         today = date.today()
+        journal = SyncJournal("pre_race", today, resume)
+        await db.run_sync(journal.load)
+        await db.run_sync(track_registry.load)
+        started_at, usage_before = datetime.now(), self.api_client.telemetry.snapshot()
+        synced = await track_registry.run_per_track(self._sync_track_pre_race, today, journal)
         
-        for track_name, track_code in self.track_codes.items():
-            track = db.query(Track).filter(Track.code == track_code).first()
-            if not track:
-                continue
-                
-            # Get today's races
-            races = db.query(Race).filter(
-                Race.track_id == track.id,
-                Race.race_date == today
-            ).all()
-            
-            for race in races:
-                try:
-                    # Sync entries for each race
-                    entries_data = await self.api_client.get_race_entries(
-                        track_code, today, race.race_number
-                    )
-                    
-                    await self._sync_entries(db, race.id, entries_data)
-                    
-                    # Sync historical data for each horse/jockey/trainer
-                    entries = db.query(RaceEntry).filter(RaceEntry.race_id == race.id).all()
-                    
-                    for entry in entries:
-                        await self._sync_historical_data(db, entry)
-                        
-                except Exception as e:
-                    logger.error(f"Error syncing entries for race {race.race_number}: {e}")
-                    
-        db.commit()
-        logger.info("Pre-race data sync completed")
+        await db.run_sync(journal.record_upstream, usage_before, self.api_client.telemetry.snapshot(), started_at)
+        await db.commit()
+        logger.info(f"Pre-race data sync completed: {synced}")
     
-    async def sync_race_updates(self, db: Session, race_id: int):
-        """10 minutes before each race - update odds and sync previous results"""
-        logger.info(f"Starting race update sync for race {race_id}")
+    async def _sync_track_pre_race(self, db: AsyncSession, track: TrackInfo, race_date: date, journal: SyncJournal) -> int:
+        """Pre-race sync pipeline for one track: entries for every race, then horse histories"""
+        # Plain (id, number) pairs, a failed unit's rollback expires ORM rows
+        races = (await db.execute(
+            select(Race.id, Race.race_number).filter(Race.track_id == track.id, Race.race_date == race_date)
+        )).all()
         
-        race = db.query(Race).filter(Race.id == race_id).first()
-        if not race:
-            return
+        for race_id, race_number in races:
+            unit = f"{track.code}:R{race_number}"
+            if journal.is_done("entries", unit):
+                continue
             
-        track = race.track
+            # The unit commits straight after the writes, so concurrent track
+            # pipelines never hold row locks across an await
+            async with journal.unit(db, "entries", unit):
+                entries_data = await self.api_client.get_race_entries(
+                    track.code, race_date, race_number
+                )
+                await db.run_sync(self._sync_entries, race_id, entries_data)
         
-        try:
-            # Update current odds
-            entries_data = await self.api_client.get_race_entries(
-                track.code, race.race_date, race.race_number
-            )
-            
-            await self._update_current_odds(db, race.id, entries_data)
+        # Every horse on the card, including races finished by an earlier run
+        card_horses = await db.run_sync(self._card_horses, [race_id for race_id, _ in races])
+        
+        if self.use_task_queue:
+            from task_queue import enqueue_task
             
-            # Sync results from previous race if exists
-            if race.race_number > 1:
-                prev_race = db.query(Race).filter(
-                    Race.track_id == track.id,
-                    Race.race_date == race.race_date,
-                    Race.race_number == race.race_number - 1
-                ).first()
-                
-                if prev_race:
-                    await self._sync_race_results(db, prev_race, track.code)
-                    
-        except Exception as e:
-            logger.error(f"Error updating race {race_id}: {e}")
+            def enqueue(sync_db: Session):
+                for reg_number, entry_id in card_horses.items():
+                    enqueue_task(sync_db, "fetch_history", {"entry_id": entry_id},
+                                 dedupe_key=f"fetch_history:{reg_number}")
             
-        db.commit()
-        logger.info(f"Race update sync completed for race {race_id}")
+            await db.run_sync(enqueue)
+            await db.commit()
+            logger.info(f"{track.name}: queued history fetches for {len(card_horses)} horses")
+            return len(card_horses)
+        
+        # Horses whose history was already synced today, or journaled done by this run, don't need refetching
+        to_fetch = [
+            reg_number for reg_number in card_horses
+            if history_watermarks.synced_on.get(reg_number) != race_date
+            and not journal.is_done("history", reg_number)
+        ]
+        
+        # Fetch history for every horse on the card concurrently, then write in one go
+        fetch_stats = {}
+        histories = await self._fetch_horse_histories(to_fetch, fetch_stats)
+        await db.run_sync(self._store_histories, card_horses, histories)
+        
+        # Journal each horse with the rows it produced, failed fetches are retried by the next run
+        await db.run_sync(journal.record_many, "history", {
+            reg_number: ("done" if histories.get(reg_number) is not None else "failed", duration_ms, error)
+            for reg_number, (duration_ms, error) in fetch_stats.items()
+        })
+        await db.commit()
+        return len(card_horses)
+    
+    def _card_horses(self, db: Session, race_ids: List[int]) -> Dict[str, int]:
+        """{registration_number: entry_id} for every horse entered in these races"""
+        if not race_ids:
+            return {}
+        return dict(db.query(Horse.registration_number, RaceEntry.id).join(
+            RaceEntry, RaceEntry.horse_id == Horse.id
+        ).filter(RaceEntry.race_id.in_(race_ids)).all())
     
-    async def _sync_race(self, db: Session, track_id: int, race_info: dict, race_date: date, race_number: int):
-        # Create race_key from race_number
-        race_key = f"R{race_number}"
-        existing_race = db.query(Race).filter(
-            Race.api_id == race_key,
-            Race.track_id == track_id
-        ).first()
+    def _store_histories(self, db: Session, entry_ids: Dict[str, int], histories: Dict[str, Optional[dict]],
+                         limit: Optional[int] = 20, incremental: bool = True) -> int:
+        """Insert the performances of the fetched histories, entry_ids maps each horse to
+        one of its entries. Returns the rows inserted"""
+        fetched = [entry_ids[reg_number] for reg_number, history in histories.items()
+                   if history is not None and reg_number in entry_ids]
+        if not fetched:
+            return 0
+        
+        entries = db.query(RaceEntry).options(*entry_graph()).filter(RaceEntry.id.in_(fetched)).all()
+        history_watermarks.load(db, [entry.horse_id for entry in entries])
+        
+        rows = []
+        for entry in entries:
+            rows.extend(self._build_historical_rows(
+                db, entry, histories[entry.horse.registration_number], limit, incremental
+            ))
+        return self._bulk_insert_historical(db, rows)
+    
+    async def refresh_odds(self, db: AsyncSession, track: Track, race_date: date, races: List[Race]) -> Dict[int, Dict[int, float]]:
+        """Refresh odds for several races at one track from a single card fetch, returns changed odds by race id"""
+        # One forced reload of the meet card, every race below is served from it
+        await self.api_client.get_races_by_date(track.code, race_date, refresh=True)
+        
+        moved = {}
+        for race_id, race_number in [(race.id, race.race_number) for race in races]:
+            try:
+                entries_data = await self.api_client.get_race_entries(track.code, race_date, race_number)
+                # Savepoint so one bad race doesn't abort the others
+                async with db.begin_nested():
+                    changed = await db.run_sync(self._update_current_odds, race_id, entries_data)
+                if changed:
+                    moved[race_id] = changed
+            except Exception as e:
+                logger.error(f"Error refreshing odds for race {race_number} at {track.name}: {e}")
+        
+        await db.commit()
+        return moved
+    
+    def _sync_race(self, db: Session, track_id: int, race_info: dict, race_date: date, race_number: int):
+        existing_race = find_race(db, track_id, race_date, race_number)
         
         if not existing_race:
             # Parse post time
@@ -145,12 +265,10 @@ class DataSync:
             else:
                 race_time = datetime.now()
             
-            # Get track name
-            track = db.query(Track).filter(Track.id == track_id).first()
-            track_name = track.name if track else ""
+            track = track_registry.by_id(track_id) or db.query(Track).filter(Track.id == track_id).first()
             
             race = Race(
-                api_id=race_key,
+                api_id=race_api_id(track.code, race_date, race_number),
                 track_id=track_id,
                 race_number=race_number,
                 race_date=race_date,
@@ -163,78 +281,144 @@ class DataSync:
             )
             db.add(race)
             
-    async def _sync_entries(self, db: Session, race_id: int, entries_data: dict):
+    def _sync_entries(self, db: Session, race_id: int, entries_data: dict):
         # Handle both 'entries' and 'runners' formats (Fair Meadows uses 'runners')
         entries_list = entries_data.get('entries', []) or entries_data.get('runners', [])
         
         logger.info(f"Processing {len(entries_list)} entries for race {race_id}")
         
+        # Collect horses, jockeys and trainers for the whole race
+        parsed = []
+        horses, jockeys, trainers = {}, {}, {}
         for entry_info in entries_list:
             try:
-                # Sync horse
-                horse = await self._get_or_create_horse(db, entry_info)
+                horse = self._horse_fields(entry_info)
+                jockey = self._jockey_fields(entry_info)
+                trainer = self._trainer_fields(entry_info)
                 
-                # Sync jockey
-                jockey = await self._get_or_create_jockey(db, entry_info)
+                horses.setdefault(horse['registration_number'], horse)
+                if jockey['api_id']:
+                    jockeys.setdefault(jockey['api_id'], jockey)
+                if trainer['api_id']:
+                    trainers.setdefault(trainer['api_id'], trainer)
+                parsed.append((entry_info, horse, jockey, trainer))
+            except Exception as e:
+                logger.error(f"Error processing entry in race {race_id}: {e}")
+        
+        # Resolve them with a fixed number of statements regardless of field size
+        horse_ids = self._bulk_get_or_create(db, Horse, Horse.registration_number, horses, HORSES)
+        jockey_ids = self._bulk_get_or_create(db, Jockey, Jockey.api_id, jockeys, JOCKEYS)
+        trainer_ids = self._bulk_get_or_create(db, Trainer, Trainer.api_id, trainers, TRAINERS)
+        
+        # Check which entries already exist, asking the database only about cache misses
+        existing_horse_ids = {
+            horse_id for horse_id in horse_ids.values()
+            if identity_map.get(ENTRIES, (race_id, horse_id), db) is not None
+        }
+        unknown_horse_ids = [horse_id for horse_id in horse_ids.values() if horse_id not in existing_horse_ids]
+        if unknown_horse_ids:
+            existing_horse_ids.update(
+                horse_id for (horse_id,) in db.query(RaceEntry.horse_id).filter(
+                    RaceEntry.race_id == race_id,
+                    RaceEntry.horse_id.in_(unknown_horse_ids)
+                ).all()
+            )
+        
+        new_entries = []
+        for entry_info, horse, jockey, trainer in parsed:
+            try:
+                horse_id = horse_ids.get(horse['registration_number'])
+                if horse_id is None or horse_id in existing_horse_ids:
+                    continue
+                existing_horse_ids.add(horse_id)
                 
-                # Sync trainer
-                trainer = await self._get_or_create_trainer(db, entry_info)
+                # Handle different field names for different APIs
+                post_pos = (entry_info.get('post_position') or 
+                           entry_info.get('post_pos') or 
+                           entry_info.get('program_number') or
+                           entry_info.get('cloth_number'))
                 
-                # Check if entry exists
-                existing_entry = db.query(RaceEntry).filter(
-                    RaceEntry.race_id == race_id,
-                    RaceEntry.horse_id == horse.id
-                ).first()
+                # Handle morning line odds
+                morning_odds = (entry_info.get('morning_line_odds') or
+                               entry_info.get('odds') or
+                               entry_info.get('ml_odds'))
                 
-                if not existing_entry:
-                    # Handle different field names for different APIs
-                    post_pos = (entry_info.get('post_position') or 
-                               entry_info.get('post_pos') or 
-                               entry_info.get('program_number') or
-                               entry_info.get('cloth_number'))
-                    
-                    # Handle morning line odds
-                    morning_odds = (entry_info.get('morning_line_odds') or
-                                   entry_info.get('odds') or
-                                   entry_info.get('ml_odds'))
-                    
-                    if isinstance(morning_odds, str):
-                        # Convert "12-1" to decimal odds
-                        try:
-                            if '-' in morning_odds:
-                                parts = morning_odds.split('-')
-                                if len(parts) == 2:
-                                    morning_odds = float(parts[0]) / float(parts[1]) + 1
-                            else:
-                                morning_odds = float(morning_odds)
-                        except:
-                            morning_odds = 3.0  # Default odds
-                    elif not morning_odds:
+                if isinstance(morning_odds, str):
+                    # Convert "12-1" to decimal odds
+                    try:
+                        if '-' in morning_odds:
+                            parts = morning_odds.split('-')
+                            if len(parts) == 2:
+                                morning_odds = float(parts[0]) / float(parts[1]) + 1
+                        else:
+                            morning_odds = float(morning_odds)
+                    except:
                         morning_odds = 3.0  # Default odds
-                    
-                    # Handle weight
-                    weight = entry_info.get('weight') or entry_info.get('jockey_weight') or 126
-                    
-                    entry = RaceEntry(
-                        race_id=race_id,
-                        horse_id=horse.id,
-                        jockey_id=jockey.id,
-                        trainer_id=trainer.id,
-                        post_position=post_pos,
-                        morning_line_odds=morning_odds,
-                        current_odds=entry_info.get('current_odds', morning_odds),
-                        weight=weight,
-                        medication=entry_info.get('medication'),
-                        equipment=entry_info.get('equipment')
-                    )
-                    db.add(entry)
-                    logger.info(f"Added entry for horse {horse.name} in race {race_id}")
-                    
+                elif not morning_odds:
+                    morning_odds = 3.0  # Default odds
+                
+                # Handle weight
+                weight = entry_info.get('weight') or entry_info.get('jockey_weight') or 126
+                
+                entry = RaceEntry(
+                    race_id=race_id,
+                    horse_id=horse_id,
+                    jockey_id=jockey_ids.get(jockey['api_id']),
+                    trainer_id=trainer_ids.get(trainer['api_id']),
+                    post_position=post_pos,
+                    morning_line_odds=morning_odds,
+                    current_odds=self._parse_odds(entry_info.get('current_odds')) or morning_odds,
+                    weight=weight,
+                    medication=entry_info.get('medication'),
+                    equipment=entry_info.get('equipment')
+                )
+                db.add(entry)
+                new_entries.append((entry, horse['name']))
+                logger.info(f"Added entry for horse {horse['name']} in race {race_id}")
+                
             except Exception as e:
                 logger.error(f"Error processing entry in race {race_id}: {e}")
                 continue
+        
+        if new_entries:
+            db.flush()
+            for entry, horse_name in new_entries:
+                identity_map.stage(db, ENTRIES, (race_id, entry.horse_id), entry.id)
+                identity_map.stage(db, ENTRY_NAMES, (race_id, horse_name), entry.id)
+    
+    def _bulk_get_or_create(self, db: Session, model, key_column, rows: Dict[str, dict], namespace: str) -> Dict[str, int]:
+        """Map natural keys to ids with one IN query, inserting missing rows in one statement"""
+        if not rows:
+            return {}
+        
+        ids = {}
+        for key in rows:
+            cached_id = identity_map.get(namespace, key, db)
+            if cached_id is not None:
+                ids[key] = cached_id
+        
+        unknown = [key for key in rows if key not in ids]
+        if unknown:
+            ids.update(dict(db.query(key_column, model.id).filter(key_column.in_(unknown)).all()))
+        
+        missing = [values for key, values in rows.items() if key not in ids]
+        if missing:
+            stmt = pg_insert(model).values(missing).on_conflict_do_nothing(
+                index_elements=[key_column]
+            ).returning(key_column, model.id)
+            ids.update(dict(db.execute(stmt).all()))
+            
+            # Rows inserted concurrently by another sync aren't returned by DO NOTHING
+            still_missing = [key for key in rows if key not in ids]
+            if still_missing:
+                ids.update(dict(db.query(key_column, model.id).filter(key_column.in_(still_missing)).all()))
+        
+        for key in unknown:
+            identity_map.stage(db, namespace, key, ids.get(key))
+        
+        return ids
                 
-    async def _get_or_create_horse(self, db: Session, entry_info: dict) -> Horse:
+    def _horse_fields(self, entry_info: dict) -> dict:
         # Handle different API field names
         reg_number = (entry_info.get('horse_registration_number') or 
                      entry_info.get('registration_number') or
@@ -254,20 +438,13 @@ class DataSync:
         if not reg_number:
             reg_number = f"TEMP_{hash(horse_name or 'unknown') % 100000}"
         
-        horse = db.query(Horse).filter(Horse.registration_number == reg_number).first()
-        
-        if not horse:
-            horse = Horse(
-                registration_number=reg_number,
-                name=horse_name or f"Horse {reg_number}",
-                age=entry_info.get('horse_age') or entry_info.get('age') or 4
-            )
-            db.add(horse)
-            db.flush()
-            
-        return horse
+        return {
+            "registration_number": reg_number,
+            "name": horse_name or f"Horse {reg_number}",
+            "age": entry_info.get('horse_age') or entry_info.get('age') or 4
+        }
     
-    async def _get_or_create_jockey(self, db: Session, entry_info: dict) -> Jockey:
+    def _jockey_fields(self, entry_info: dict) -> dict:
         # Handle different API formats - jockey can be ID or object
         jockey_data = entry_info.get('jockey')
         
@@ -280,19 +457,9 @@ class DataSync:
             jockey_id = entry_info.get('jockey_id') or jockey_data
             jockey_name = entry_info.get('jockey_name')
         
-        jockey = db.query(Jockey).filter(Jockey.api_id == jockey_id).first()
-        
-        if not jockey:
-            jockey = Jockey(
-                api_id=jockey_id,
-                name=jockey_name
-            )
-            db.add(jockey)
-            db.flush()
-            
-        return jockey
+        return {"api_id": jockey_id, "name": jockey_name}
     
-    async def _get_or_create_trainer(self, db: Session, entry_info: dict) -> Trainer:
+    def _trainer_fields(self, entry_info: dict) -> dict:
         # Handle different API formats - trainer can be ID or object
         trainer_data = entry_info.get('trainer')
         
@@ -305,89 +472,247 @@ class DataSync:
             trainer_id = entry_info.get('trainer_id') or trainer_data
             trainer_name = entry_info.get('trainer_name')
         
-        trainer = db.query(Trainer).filter(Trainer.api_id == trainer_id).first()
+        return {"api_id": trainer_id, "name": trainer_name}
+    
+    async def _fetch_horse_histories(self, registration_numbers: List[str],
+                                     stats: Optional[Dict[str, tuple]] = None) -> Dict[str, Optional[dict]]:
+        """Fetch horse histories with bounded concurrency, each horse once.
+        Fills stats with {registration_number: (duration_ms, error)} when given"""
+        # Shared by all track pipelines so the cap holds across concurrent tracks
+        if self._history_semaphore is None:
+            self._history_semaphore = asyncio.Semaphore(self.history_concurrency)
+        semaphore = self._history_semaphore
         
-        if not trainer:
-            trainer = Trainer(
-                api_id=trainer_id,
-                name=trainer_name
-            )
-            db.add(trainer)
-            db.flush()
-            
-        return trainer
+        async def fetch(reg_number: str):
+            async with semaphore:
+                started = time.monotonic()
+                try:
+                    history = await self.api_client.get_horse_history(reg_number)
+                    error = None
+                except Exception as e:
+                    logger.error(f"Error fetching history for horse {reg_number}: {e}")
+                    history, error = None, f"{type(e).__name__}: {e}"
+                if stats is not None:
+                    stats[reg_number] = ((time.monotonic() - started) * 1000, error)
+                return reg_number, history
+        
+        unique_numbers = list(dict.fromkeys(registration_numbers))
+        logger.info(f"Fetching history for {len(unique_numbers)} horses")
+        
+        results = await asyncio.gather(*(fetch(reg_number) for reg_number in unique_numbers))
+        return dict(results)
     
-    async def _sync_historical_data(self, db: Session, entry: RaceEntry):
-        # Get horse history
+    def _build_historical_rows(self, db: Session, entry: RaceEntry, history_data: dict,
+                               limit: Optional[int] = 20, incremental: bool = True) -> List[dict]:
+        """Turn a horse history payload into historical_performances rows newer than the watermark.
+        Keeps the last `limit` races, None keeps the full history. incremental=False (backfills)
+        skips the watermark and payload hash checks and returns every performance, older seasons
+        included; the insert's ON CONFLICT (horse_id, race_date) skips the ones already stored"""
+        rows = []
         try:
-            history_data = await self.api_client.get_horse_history(entry.horse.registration_number)
+            performances = history_data.get('performances', [])
+            if limit:
+                performances = performances[-limit:]
             
-            for perf in history_data.get('performances', [])[-20:]:  # Last 20 races
-                existing_perf = db.query(HistoricalPerformance).filter(
-                    HistoricalPerformance.horse_id == entry.horse_id,
-                    HistoricalPerformance.race_date == date.fromisoformat(perf.get('race_date'))
-                ).first()
-                
-                if not existing_perf:
-                    hist_perf = HistoricalPerformance(
-                        horse_id=entry.horse_id,
-                        jockey_id=entry.jockey_id if perf.get('jockey_id') == entry.jockey.api_id else None,
-                        trainer_id=entry.trainer_id if perf.get('trainer_id') == entry.trainer.api_id else None,
-                        race_date=date.fromisoformat(perf.get('race_date')),
-                        distance=perf.get('distance'),
-                        surface=perf.get('surface'),
-                        finish_position=perf.get('finish_position'),
-                        beaten_lengths=perf.get('beaten_lengths', 0),
-                        odds=perf.get('odds'),
-                        speed_figure=perf.get('speed_figure')
-                    )
-                    db.add(hist_perf)
-                    
-        except Exception as e:
-            logger.error(f"Error syncing historical data for horse {entry.horse.name}: {e}")
+            # Unchanged payload since the last sync, nothing to insert; restage the watermark
+            # so the horse still counts as synced today and isn't refetched
+            digest = hashlib.sha1(json.dumps(performances, sort_keys=True, default=str).encode()).hexdigest()
+            if incremental and history_watermarks.get_payload_hash(db, entry.horse_id) == digest:
+                history_watermarks.stage(db, entry.horse_id, entry.horse.registration_number,
+                                         history_watermarks.get_latest(db, entry.horse_id), digest)
+                return rows
             
-    async def _update_current_odds(self, db: Session, race_id: int, entries_data: dict):
-        for entry_info in entries_data.get('entries', []):
-            reg_number = entry_info.get('horse_registration_number')
+            # Only performances newer than what we already store
+            watermark = history_watermarks.get_latest(db, entry.horse_id)
+            latest = watermark
+            seen_dates = set()
             
-            horse = db.query(Horse).filter(Horse.registration_number == reg_number).first()
-            if horse:
-                entry = db.query(RaceEntry).filter(
-                    RaceEntry.race_id == race_id,
-                    RaceEntry.horse_id == horse.id
-                ).first()
+            for perf in performances:
+                if not perf.get('race_date'):
+                    continue
+                race_date = date.fromisoformat(perf.get('race_date'))
+                if (incremental and watermark and race_date <= watermark) or race_date in seen_dates:
+                    continue
+                seen_dates.add(race_date)
                 
-                if entry:
-                    entry.current_odds = entry_info.get('current_odds', entry.current_odds)
+                rows.append({
+                    "horse_id": entry.horse_id,
+                    "jockey_id": entry.jockey_id if entry.jockey and perf.get('jockey_id') == entry.jockey.api_id else None,
+                    "trainer_id": entry.trainer_id if entry.trainer and perf.get('trainer_id') == entry.trainer.api_id else None,
+                    "race_date": race_date,
+                    "distance": perf.get('distance'),
+                    "surface": perf.get('surface'),
+                    "finish_position": perf.get('finish_position'),
+                    "beaten_lengths": perf.get('beaten_lengths', 0),
+                    "odds": perf.get('odds'),
+                    "speed_figure": perf.get('speed_figure')
+                })
+                latest = max(latest, race_date) if latest else race_date
+            
+            history_watermarks.stage(db, entry.horse_id, entry.horse.registration_number, latest, digest)
                     
-    async def _sync_race_results(self, db: Session, race: Race, track_code: str):
-        try:
-            results_data = await self.api_client.get_race_results(
-                track_code, race.race_date, race.race_number
+        except Exception as e:
+            logger.error(f"Error syncing historical data for horse {entry.horse.name}: {e}")
+            return []
+        
+        return rows
+    
+    def _bulk_insert_historical(self, db: Session, rows: List[dict]) -> int:
+        """Insert performances in batches, relying on the (horse_id, race_date) unique constraint to skip duplicates"""
+        inserted = 0
+        for start in range(0, len(rows), self.history_batch_size):
+            batch = rows[start:start + self.history_batch_size]
+            stmt = pg_insert(HistoricalPerformance).values(batch).on_conflict_do_nothing(
+                index_elements=['horse_id', 'race_date']
             )
+            inserted += db.execute(stmt).rowcount
+        
+        if rows:
+            logger.info(f"Inserted {inserted} of {len(rows)} historical performances")
+        return inserted
             
-            if results_data:
-                for result_info in results_data.get('results', []):
-                    reg_number = result_info.get('horse_registration_number')
+    def _update_current_odds(self, db: Session, race_id: int, entries_data: dict) -> Dict[int, float]:
+        """Write changed odds for a race in one statement and append them to the odds history"""
+        odds_by_reg = {}
+        for entry_info in entries_data.get('entries', []) or entries_data.get('runners', []):
+            odds = self._parse_odds(entry_info.get('current_odds'))
+            if odds is not None:
+                odds_by_reg[self._horse_fields(entry_info)['registration_number']] = odds
+        
+        entry_ids = resolve_entry_ids(db, race_id, odds_by_reg)
+        if not entry_ids:
+            return {}
+        
+        new_odds = values(
+            column('entry_id', Integer), column('odds', Float), name='new_odds'
+        ).data([(entry_id, odds_by_reg[reg_number]) for reg_number, entry_id in entry_ids.items()])
+        
+        # UPDATE ... FROM (VALUES ...) only touching entries whose odds moved, feeding the history insert
+        changed = update(RaceEntry).where(
+            RaceEntry.id == new_odds.c.entry_id,
+            RaceEntry.current_odds.is_distinct_from(new_odds.c.odds)
+        ).values(current_odds=new_odds.c.odds).returning(RaceEntry.id, RaceEntry.current_odds).cte('changed')
+        
+        stmt = insert(OddsHistory).from_select(
+            ['entry_id', 'odds', 'source'],
+            select(changed.c.id, changed.c.current_odds, literal('api'))
+        ).returning(OddsHistory.entry_id, OddsHistory.odds)
+        
+        changed_odds = dict(db.execute(stmt).all())
+        logger.info(f"Odds changed for {len(changed_odds)} of {len(entry_ids)} entries in race {race_id}")
+        return changed_odds
+    
+    async def _meet_results_by_race(self, track: Track, race_date: date):
+        """Yield (race_number, results) for a meet, streamed when the client is in streaming mode"""
+        if self.api_client.streaming:
+            async for race_number, results in self.api_client.stream_meet_results(track.code, race_date):
+                yield race_number, results
+            return
+        
+        results_data = await self.api_client.get_meet_results(track.code, race_date)
+        results_by_race: Dict[int, list] = {}
+        for result_info in (results_data or {}).get('results', []):
+            if result_info.get('race_number') is not None:
+                results_by_race.setdefault(int(result_info['race_number']), []).append(result_info)
+        
+        for race_number, results in results_by_race.items():
+            yield race_number, results
+    
+    def _parse_odds(self, odds) -> Optional[float]:
+        # Convert "12-1" style odds to decimal odds
+        if isinstance(odds, str):
+            try:
+                if '-' in odds:
+                    parts = odds.split('-')
+                    return float(parts[0]) / float(parts[1]) + 1 if len(parts) == 2 else None
+                return float(odds)
+            except (ValueError, ZeroDivisionError):
+                return None
+        return float(odds) if odds is not None else None
                     
-                    horse = db.query(Horse).filter(Horse.registration_number == reg_number).first()
-                    if horse:
-                        entry = db.query(RaceEntry).filter(
-                            RaceEntry.race_id == race.id,
-                            RaceEntry.horse_id == horse.id
-                        ).first()
-                        
-                        if entry and not entry.result:
-                            result = RaceResult(
-                                entry_id=entry.id,
-                                finish_position=result_info.get('finish_position'),
-                                win_odds=result_info.get('win_odds'),
-                                place_odds=result_info.get('place_odds'),
-                                show_odds=result_info.get('show_odds'),
-                                margin=result_info.get('margin'),
-                                time=result_info.get('time')
-                            )
-                            db.add(result)
-                            
+    async def ingest_meet_results(self, db: AsyncSession, track: Track, race_date: date) -> Dict[int, int]:
+        """Pull the meet results once and store results for every finished race,
+        returns {race_id: results added} for races that got new results"""
+        races, settled_races = await db.run_sync(self._meet_races, track.id, race_date)
+        if not races:
+            return {}
+        
+        rows = []
+        race_by_entry = {}
+        try:
+            # Results arrive one race at a time, only compact rows are kept
+            async for race_number, results in self._meet_results_by_race(track, race_date):
+                race_id = races.get(race_number)
+                if race_id is None or race_id in settled_races:
+                    continue
+                rows.extend(await db.run_sync(self._result_rows, race_id, results, race_by_entry))
         except Exception as e:
-            logger.error(f"Error syncing results for race {race.race_number}: {e}")
\ No newline at end of file
+            logger.error(f"Error fetching results for {track.name} on {race_date}: {e}")
+            return {}
+        
+        if not rows:
+            return {}
+        
+        became_final = await db.run_sync(self._insert_results, rows, race_by_entry)
+        logger.info(f"{track.name} {race_date}: results stored for races {sorted(became_final)}")
+        return became_final
+    
+    def _meet_races(self, db: Session, track_id: int, race_date: date) -> Tuple[Dict[int, int], Set[int]]:
+        """{race_number: race_id} for a meet, and the ids of its races that are complete"""
+        races = dict(db.query(Race.race_number, Race.id).filter(
+            Race.track_id == track_id,
+            Race.race_date == race_date
+        ).all())
+        if not races:
+            return {}, set()
+        
+        # Races are complete once every entry has a result; partly posted races are read
+        # again and ON CONFLICT skips the finishers already stored. Scratched entries never
+        # get a result, so their races are re-read, which costs no extra fetch.
+        settled_races = {
+            race_id for race_id, entries, results in db.query(
+                RaceEntry.race_id, func.count(RaceEntry.id), func.count(RaceResult.id)
+            ).outerjoin(
+                RaceResult, RaceResult.entry_id == RaceEntry.id
+            ).filter(
+                RaceEntry.race_id.in_(list(races.values()))
+            ).group_by(RaceEntry.race_id).all()
+            if results >= entries
+        }
+        return races, settled_races
+    
+    def _result_rows(self, db: Session, race_id: int, results: List[dict], race_by_entry: Dict[int, int]) -> List[dict]:
+        """race_results rows for one race's results, noting each entry's race in race_by_entry"""
+        by_reg = resolve_entry_ids(db, race_id, [result_info.get('horse_registration_number') for result_info in results])
+        by_name = resolve_entry_ids_by_name(db, race_id, [
+            result_info.get('horse_name') for result_info in results
+            if result_info.get('horse_registration_number') not in by_reg
+        ])
+        
+        rows = []
+        for result_info in results:
+            entry_id = by_reg.get(result_info.get('horse_registration_number')) or by_name.get(result_info.get('horse_name'))
+            if entry_id and entry_id not in race_by_entry:
+                race_by_entry[entry_id] = race_id
+                rows.append({
+                    "entry_id": entry_id,
+                    "finish_position": result_info.get('finish_position', 0),
+                    "win_odds": result_info.get('win_odds', 0),
+                    "place_odds": result_info.get('place_odds', 0),
+                    "show_odds": result_info.get('show_odds', 0),
+                    "margin": result_info.get('margin', 0),
+                    "time": result_info.get('time', 0)
+                })
+        return rows
+    
+    def _insert_results(self, db: Session, rows: List[dict], race_by_entry: Dict[int, int]) -> Dict[int, int]:
+        """Insert result rows, skipping entries that already have one, returns {race_id: results added}"""
+        stmt = pg_insert(RaceResult).values(rows).on_conflict_do_nothing(
+            index_elements=['entry_id']
+        ).returning(RaceResult.entry_id)
+        
+        became_final: Dict[int, int] = {}
+        for (entry_id,) in db.execute(stmt).all():
+            race_id = race_by_entry[entry_id]
+            became_final[race_id] = became_final.get(race_id, 0) + 1
+        return became_final
@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Date
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Date, UniqueConstraint, Index, JSON, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import Session, joinedload, relationship, selectinload, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.sql import func
+from sqlalchemy import event, exc
+import asyncio
+import logging
 import os
+import threading
+import time
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
 # Load .env file if it exists, but allow environment variables to override
@@ -14,20 +23,154 @@ env_path = Path(__file__).parent.parent / '.env'
 if env_path.exists():
     load_dotenv(env_path, override=False)
 
+# Connection pool settings, per engine and per process: with several uvicorn workers
+# Postgres sees up to workers * engines * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+class PoolMetrics:
+    """Checkout waits, exhaustion timeouts, overflow connections and invalidations of one pool"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.slow_checkouts = 0  # waited for a connection to be returned
+        self.timeouts = 0
+        self.overflow_connections = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+    
+    def record_checkout(self, waited_ms: float, overflowed: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_ms_total += waited_ms
+            self.wait_ms_max = max(self.wait_ms_max, waited_ms)
+            self.slow_checkouts += waited_ms >= 100
+            self.overflow_connections += overflowed
+    
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+    
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+    
+    def stats(self, pool) -> dict:
+        return {
+            "size": pool.size(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "wait_ms": {
+                "avg": round(self.wait_ms_total / self.checkouts, 2) if self.checkouts else None,
+                "max": round(self.wait_ms_max, 2)
+            },
+            "slow_checkouts": self.slow_checkouts,
+            "timeouts": self.timeouts,
+            "overflow_connections": self.overflow_connections,
+            "invalidations": self.invalidations
+        }
+
+class _MeteredPool:
+    """Times every checkout; recreate() (engine.dispose) keeps the same metrics"""
+    metrics: PoolMetrics = None
+    
+    def _do_get(self):
+        started = time.monotonic()
+        overflow = self.overflow()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            # The pool stayed exhausted for DB_POOL_TIMEOUT
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout((time.monotonic() - started) * 1000, self.overflow() > max(overflow, 0))
+        return connection
+    
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class MeteredQueuePool(_MeteredPool, QueuePool):
+    pass
+
+class MeteredAsyncPool(_MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+# Engines with metered pools in this process, by name
+metered_engines: Dict[str, object] = {}
+
+def _pool_options(poolclass) -> dict:
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING
+    }
+
+def _meter_pool(name: str, sync_engine):
+    pool = sync_engine.pool
+    pool.metrics = PoolMetrics(name)
+    # Dead connections found by pre-ping or dropped mid-query
+    event.listen(pool, "invalidate", lambda *args: pool.metrics.record_invalidation())
+    metered_engines[name] = sync_engine
+
+def pool_stats() -> Dict[str, dict]:
+    """Current state and counters of every pool in this process"""
+    return {name: engine.pool.metrics.stats(engine.pool) for name, engine in metered_engines.items()}
+
 # Create engine lazily to avoid issues during import
 engine = None
 SessionLocal = None
 
+# asyncpg engine for the API endpoints, so queries don't block the event loop
+async_engine = None
+AsyncSessionLocal = None
+
+# Optional streaming replica for read-only GET endpoints
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Reads go to the primary for this long after this process writes, so callers see their own writes.
+# Only this process's writes count: a --worker process or another uvicorn worker writing doesn't
+# stop this one reading the replica. Callers needing that would carry a write marker (cookie/header)
+DB_REPLICA_WRITE_GRACE_SECONDS = float(os.getenv("DB_REPLICA_WRITE_GRACE_SECONDS", "5"))
+# Replica lag above which reads go to the primary, re-measured at most every DB_REPLICA_LAG_CHECK_SECONDS
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "10"))
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "5"))
+replica_engine = None
+ReplicaSessionLocal = None
+
+logger = logging.getLogger(__name__)
+
+def get_database_url():
+    DATABASE_URL = os.getenv("DATABASE_URL")
+    if not DATABASE_URL:
+        raise ValueError(
+            "DATABASE_URL environment variable is not set. "
+            "Please set it in your Render dashboard under Environment Variables."
+        )
+    return DATABASE_URL
+
 def get_engine():
     global engine
     if engine is None:
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if not DATABASE_URL:
-            raise ValueError(
-                "DATABASE_URL environment variable is not set. "
-                "Please set it in your Render dashboard under Environment Variables."
-            )
-        engine = create_engine(DATABASE_URL)
+        connect_args = {}
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        engine = create_engine(get_database_url(), connect_args=connect_args, **_pool_options(MeteredQueuePool))
+        _meter_pool("primary", engine)
+        _track_writes(engine)
     return engine
 
 def get_session_local():
@@ -36,6 +179,113 @@ def get_session_local():
         SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
     return SessionLocal
 
+def async_url(database_url: str):
+    """The same database through asyncpg; libpq's sslmode becomes asyncpg's ssl"""
+    url = make_url(database_url)
+    query = dict(url.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+def _async_connect_args() -> dict:
+    if DB_STATEMENT_TIMEOUT_MS:
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {}
+
+def get_async_engine():
+    global async_engine
+    if async_engine is None:
+        async_engine = create_async_engine(
+            async_url(get_database_url()), connect_args=_async_connect_args(), **_pool_options(MeteredAsyncPool)
+        )
+        _meter_pool("async", async_engine.sync_engine)
+        _track_writes(async_engine.sync_engine)
+    return async_engine
+
+def get_async_session_local():
+    global AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        # Objects stay readable after commit, lazy loads can't run outside run_sync
+        AsyncSessionLocal = async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+# Monotonic time of this process's last committed write to the primary
+_last_write_at = 0.0
+
+def _track_writes(sync_engine):
+    """Note commits of transactions that wrote, for the replica staleness guard"""
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # WITH counts as a write, data-modifying CTEs (UPDATE ... RETURNING) start with it
+        if statement.lstrip()[:6].upper().startswith(("INSERT", "UPDATE", "DELETE", "WITH")):
+            conn.info["wrote"] = True
+
+    def commit(conn):
+        global _last_write_at
+        if conn.info.pop("wrote", False):
+            _last_write_at = time.monotonic()
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "commit", commit)
+    event.listen(sync_engine, "rollback", lambda conn: conn.info.pop("wrote", None))
+
+def get_replica_session_local():
+    global replica_engine, ReplicaSessionLocal
+    if ReplicaSessionLocal is None:
+        replica_engine = create_async_engine(
+            async_url(DATABASE_REPLICA_URL),
+            connect_args=_async_connect_args(),
+            execution_options={"postgresql_readonly": True},
+            **_pool_options(MeteredAsyncPool)
+        )
+        _meter_pool("replica", replica_engine.sync_engine)
+        ReplicaSessionLocal = async_sessionmaker(replica_engine, autoflush=False, expire_on_commit=False)
+    return ReplicaSessionLocal
+
+# (measured at, lag in seconds or None if it couldn't be measured)
+_replica_lag = (0.0, None)
+_replica_lag_lock = asyncio.Lock()
+
+async def replica_lag() -> Optional[float]:
+    """Seconds the replica is behind, measured at most every DB_REPLICA_LAG_CHECK_SECONDS"""
+    global _replica_lag
+    async with _replica_lag_lock:
+        measured_at, lag = _replica_lag
+        if time.monotonic() - measured_at < DB_REPLICA_LAG_CHECK_SECONDS:
+            return lag
+        try:
+            async with get_replica_session_local()() as db:
+                # An idle replica that replayed everything is current however old its last replayed commit is.
+                # NULL means it isn't a standby or hasn't replayed anything yet: unknown lag, read the primary
+                lag = await db.scalar(text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                ))
+                lag = float(lag) if lag is not None else None
+        except Exception as e:
+            logger.warning(f"Replica lag check failed, reading from the primary: {e}")
+            lag = None
+        _replica_lag = (time.monotonic(), lag)
+        return lag
+
+async def use_replica() -> bool:
+    """Staleness guard: the replica serves reads only when it's configured, this process
+    hasn't written within DB_REPLICA_WRITE_GRACE_SECONDS and its lag is within bounds"""
+    if not DATABASE_REPLICA_URL:
+        return False
+    if time.monotonic() - _last_write_at < DB_REPLICA_WRITE_GRACE_SECONDS:
+        return False
+    lag = await replica_lag()
+    return lag is not None and lag <= DB_REPLICA_MAX_LAG_SECONDS
+
+def replica_status() -> dict:
+    measured_at, lag = _replica_lag
+    return {
+        "configured": bool(DATABASE_REPLICA_URL),
+        "lag_seconds": lag,
+        "lag_measured_seconds_ago": round(time.monotonic() - measured_at, 1) if measured_at else None,
+        "last_write_seconds_ago": round(time.monotonic() - _last_write_at, 1) if _last_write_at else None
+    }
+
 Base = declarative_base()
 
 class Track(Base):
@@ -44,6 +294,9 @@ class Track(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, index=True)
     code = Column(String, unique=True)
+    # TheRacingAPI track codes to try, in order (defaults to [code])
+    api_codes = Column(JSON)
+    active = Column(Boolean, default=True, server_default=text("true"))
     
 class Horse(Base):
     __tablename__ = "horses"
@@ -69,6 +322,10 @@ class Trainer(Base):
 
 class Race(Base):
     __tablename__ = "races"
+    __table_args__ = (
+        # A track's card for a day, and a race on it
+        Index("ix_races_track_id_race_date", "track_id", "race_date", "race_number"),
+    )
     
     id = Column(Integer, primary_key=True)
     api_id = Column(String, unique=True, index=True)
@@ -87,6 +344,9 @@ class Race(Base):
     
 class RaceEntry(Base):
     __tablename__ = "race_entries"
+    __table_args__ = (
+        Index("ix_race_entries_race_id", "race_id"),
+    )
     
     id = Column(Integer, primary_key=True)
     race_id = Column(Integer, ForeignKey("races.id"))
@@ -122,6 +382,12 @@ class RaceResult(Base):
     
 class HistoricalPerformance(Base):
     __tablename__ = "historical_performances"
+    __table_args__ = (
+        # Also serves a horse's latest runs (ORDER BY race_date DESC scans it backwards)
+        UniqueConstraint("horse_id", "race_date", name="uq_historical_performances_horse_race_date"),
+        Index("ix_historical_performances_jockey_id_race_date", "jockey_id", "race_date"),
+        Index("ix_historical_performances_trainer_id_race_date", "trainer_id", "race_date"),
+    )
     
     id = Column(Integer, primary_key=True)
     horse_id = Column(Integer, ForeignKey("horses.id"))
@@ -141,6 +407,9 @@ class HistoricalPerformance(Base):
 
 class Bet(Base):
     __tablename__ = "bets"
+    __table_args__ = (
+        Index("ix_bets_race_id_entry_id", "race_id", "entry_id"),
+    )
     
     id = Column(Integer, primary_key=True)
     race_id = Column(Integer, ForeignKey("races.id"))
@@ -169,6 +438,9 @@ class BetResult(Base):
     
 class DailyROI(Base):
     __tablename__ = "daily_roi"
+    __table_args__ = (
+        Index("ix_daily_roi_track_id_date", "track_id", "date"),
+    )
     
     id = Column(Integer, primary_key=True)
     track_id = Column(Integer, ForeignKey("tracks.id"))
@@ -181,6 +453,9 @@ class DailyROI(Base):
 
 class OddsHistory(Base):
     __tablename__ = "odds_history"
+    __table_args__ = (
+        Index("ix_odds_history_entry_id_timestamp", "entry_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True)
     entry_id = Column(Integer, ForeignKey("race_entries.id"))
@@ -190,10 +465,118 @@ class OddsHistory(Base):
     
     entry = relationship("RaceEntry")
 
+class SyncTask(Base):
+    __tablename__ = "sync_tasks"
+    __table_args__ = (
+        # Only one pending/running task per dedupe key
+        Index("ix_sync_tasks_dedupe_key_active", "dedupe_key", unique=True,
+              postgresql_where=text("status IN ('pending', 'running')")),
+        Index("ix_sync_tasks_status_available_at", "status", "available_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # 'fetch_history', 'refresh_odds', 'ingest_results', 'score_race', or 'job:<kind>' (jobs.py)
+    payload = Column(JSON)
+    dedupe_key = Column(String)
+    status = Column(String, nullable=False, default="pending")  # 'pending', 'running', 'done', 'failed'; jobs: 'queued', 'running', 'completed', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    available_at = Column(DateTime, nullable=False, server_default=func.now())
+    locked_by = Column(String)
+    locked_until = Column(DateTime)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Float)
+    last_error = Column(Text)
+    created_at = Column(DateTime, server_default=func.now())
+
+class SyncJournalEntry(Base):
+    __tablename__ = "sync_journal"
+    __table_args__ = (
+        UniqueConstraint("run_key", "phase", "unit", name="uq_sync_journal_run_phase_unit"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    run_key = Column(String, nullable=False)  # e.g. 'pre_race:2026-10-17'
+    phase = Column(String, nullable=False)  # 'races', 'entries', 'history'
+    unit = Column(String, nullable=False)  # track code, 'RP:R3', horse registration number
+    status = Column(String, nullable=False)  # 'done', 'failed'
+    attempts = Column(Integer, nullable=False, default=1)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration_ms = Column(Float)
+    error = Column(Text)
+    details = Column(JSON)  # upstream API usage of the unit
+
+# Eager-loading query helpers. Walking race.entries / entry.horse / bet.result on
+# rows from a plain query costs one SELECT per access; these load the whole graph
+# in a fixed number of queries (and are safe inside AsyncSession.run_sync).
+
+def entry_graph():
+    """Loader options for an entry's horse, jockey, trainer and result"""
+    return (
+        joinedload(RaceEntry.horse),
+        joinedload(RaceEntry.jockey),
+        joinedload(RaceEntry.trainer),
+        joinedload(RaceEntry.result)
+    )
+
+def load_race_cards(db: Session, track_id: int, race_date) -> List[Race]:
+    """A track's races for a day ordered by post time, with entries and their
+    horse/jockey/trainer/result: two queries for the whole card"""
+    return db.query(Race).filter(
+        Race.track_id == track_id,
+        Race.race_date == race_date
+    ).options(
+        selectinload(Race.entries).options(*entry_graph())
+    ).order_by(Race.race_time).all()
+
+def load_bets(db: Session, *criteria) -> List[Bet]:
+    """Bets matching the criteria (Race is joined, so Race columns can be used)
+    with their result, race, and entry with its horse and result: one query"""
+    return db.query(Bet).join(Race, Race.id == Bet.race_id).filter(*criteria).options(
+        joinedload(Bet.result),
+        joinedload(Bet.race),
+        joinedload(Bet.entry).options(joinedload(RaceEntry.horse), joinedload(RaceEntry.result))
+    ).all()
+
+def bets_by_race(bets: List[Bet]) -> Dict[int, List[Bet]]:
+    grouped: Dict[int, List[Bet]] = {}
+    for bet in bets:
+        grouped.setdefault(bet.race_id, []).append(bet)
+    return grouped
+
 def get_db():
     SessionLocal = get_session_local()
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def dispose_async_engine():
+    """Close the asyncpg pools, on shutdown"""
+    global async_engine, AsyncSessionLocal, replica_engine, ReplicaSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+        metered_engines.pop("async", None)
+        async_engine = None
+        AsyncSessionLocal = None
+    if replica_engine is not None:
+        await replica_engine.dispose()
+        metered_engines.pop("replica", None)
+        replica_engine = None
+        ReplicaSessionLocal = None
+
+async def get_async_db():
+    """AsyncSession for endpoints. ORM code written against Session runs through
+    `await db.run_sync(fn, ...)`, which gets a Session whose queries (and lazy loads) go through asyncpg."""
+    async with get_async_session_local()() as db:
+        yield db
+
+async def get_async_read_db():
+    """Read-only AsyncSession for GET endpoints: the replica when DATABASE_REPLICA_URL
+    is set and the staleness guard allows it, the primary otherwise. Never write through it."""
+    SessionLocal = get_replica_session_local() if await use_replica() else get_async_session_local()
+    async with SessionLocal() as db:
+        yield db
\ No newline at end of file
@@ -0,0 +1,301 @@
+"""
+Local fake TheRacingAPI server for offline runs and load tests
+Replays responses recorded with RACING_API_RECORD_DIR and/or serves
+synthetic, deterministic cards for any number of tracks, with
+configurable latency and error rates.
+
+    cd src && python fake_racing_api.py --tracks 30 --write-registry fake_tracks.json
+    RACING_API_BASE_URL=http://localhost:8100 TRACK_REGISTRY_FILE=fake_tracks.json python main.py
+
+Or in-process, without a socket:
+    RacingAPIClient(transport=httpx.ASGITransport(app=create_app(FakeConfig(tracks=50))))
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from racing_api import recording_path
+
+
+class FakeConfig:
+    def __init__(self, tracks: Optional[int] = None, races_per_card: Optional[int] = None,
+                 field_size: Optional[int] = None, latency_ms: Optional[float] = None,
+                 jitter_ms: Optional[float] = None, error_rate: Optional[float] = None,
+                 throttle_rate: Optional[float] = None, recordings: Optional[str] = None,
+                 first_post_minutes: Optional[int] = None):
+        env = os.getenv
+        self.tracks = tracks if tracks is not None else int(env("FAKE_API_TRACKS", "20"))
+        self.races_per_card = races_per_card if races_per_card is not None else int(env("FAKE_API_RACES_PER_CARD", "10"))
+        self.field_size = field_size if field_size is not None else int(env("FAKE_API_FIELD_SIZE", "10"))
+        self.latency_ms = latency_ms if latency_ms is not None else float(env("FAKE_API_LATENCY_MS", "50"))
+        self.jitter_ms = jitter_ms if jitter_ms is not None else float(env("FAKE_API_JITTER_MS", "25"))
+        # Share of requests answered 503 / 429
+        self.error_rate = error_rate if error_rate is not None else float(env("FAKE_API_ERROR_RATE", "0"))
+        self.throttle_rate = throttle_rate if throttle_rate is not None else float(env("FAKE_API_THROTTLE_RATE", "0"))
+        # Recorded responses are served first, everything else is synthetic
+        self.recordings = recordings if recordings is not None else env("FAKE_API_RECORDINGS")
+        # Today's first post, in minutes from server start, so the scheduler's jobs fire during a test
+        self.first_post_minutes = first_post_minutes if first_post_minutes is not None else int(env("FAKE_API_FIRST_POST_MINUTES", "90"))
+
+
+def synthetic_tracks(count: int) -> List[dict]:
+    """Track registry rows for the synthetic tracks, see TRACK_REGISTRY_FILE"""
+    return [
+        {"name": f"Fake Downs {i:02d}", "code": f"FK{i:02d}", "api_codes": [f"FK{i:02d}"]}
+        for i in range(1, count + 1)
+    ]
+
+
+class SyntheticRacing:
+    """Deterministic cards, results and histories: the same request always gets the same data,
+    except current odds, which drift every minute"""
+
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.tracks = synthetic_tracks(config.tracks)
+        self.codes = {track["code"] for track in self.tracks}
+        self.started = datetime.now()
+
+    def _rng(self, *key) -> random.Random:
+        return random.Random(":".join(str(k) for k in key))
+
+    def _post_time(self, race_date: date, race_number: int) -> datetime:
+        if race_date == date.today():
+            first_post = self.started + timedelta(minutes=self.config.first_post_minutes)
+        else:
+            first_post = datetime.combine(race_date, datetime.min.time()) + timedelta(hours=13)
+        return first_post + timedelta(minutes=30 * (race_number - 1))
+
+    def _parse_meet(self, meet_id: str):
+        code, _, day = meet_id.partition("_")
+        if code not in self.codes:
+            return None, None
+        try:
+            return code, datetime.strptime(day, "%Y%m%d").date()
+        except ValueError:
+            return None, None
+
+    def meets(self, start_date: date, end_date: date) -> dict:
+        meets = []
+        day = start_date
+        while day <= end_date:
+            for track in self.tracks:
+                meets.append({
+                    "meet_id": f"{track['code']}_{day:%Y%m%d}",
+                    "track_id": track["code"],
+                    "track_name": track["name"],
+                    "date": day.isoformat()
+                })
+            day += timedelta(days=1)
+        return {"meets": meets}
+
+    def _field(self, code: str, race_date: date, race_number: int) -> List[dict]:
+        rng = self._rng(code, race_date, race_number)
+        horses = rng.sample(range(1, 2000), self.config.field_size)
+        runners = []
+        for post_position, horse in enumerate(horses, start=1):
+            morning_line = rng.choice([2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 30])
+            jockey, trainer = rng.randint(1, 40), rng.randint(1, 30)
+            runners.append({
+                "horse_registration_number": f"{code}H{horse:04d}",
+                "horse_name": f"{code} Runner {horse}",
+                "horse_age": rng.randint(2, 9),
+                "jockey_id": f"jky_{code}_{jockey}",
+                "jockey_name": f"{code} Jockey {jockey}",
+                "trainer_id": f"trn_{code}_{trainer}",
+                "trainer_name": f"{code} Trainer {trainer}",
+                "post_position": post_position,
+                "morning_line_odds": f"{morning_line}-1",
+                "weight": rng.randint(118, 126)
+            })
+        return runners
+
+    def entries(self, meet_id: str) -> Optional[dict]:
+        code, race_date = self._parse_meet(meet_id)
+        if not code:
+            return None
+
+        minute = datetime.now().strftime("%Y%m%d%H%M")
+        entries = []
+        for race_number in range(1, self.config.races_per_card + 1):
+            rng = self._rng(code, race_date, race_number)
+            race_info = {
+                "race_number": race_number,
+                "post_time": self._post_time(race_date, race_number).isoformat(),
+                "distance_value": rng.choice([5.5, 6, 6.5, 7, 8, 8.5, 9]),
+                "surface_description": rng.choice(["Dirt", "Turf"]),
+                "race_type": rng.choice(["Claiming", "Allowance", "Maiden Special Weight", "Stakes"]),
+                "purse": rng.choice([15000, 25000, 40000, 75000]),
+                "race_restriction_description": "3 Year Olds And Up"
+            }
+            for runner in self._field(code, race_date, race_number):
+                # Odds drift every minute so odds polling sees movement
+                drift = self._rng(meet_id, race_number, runner["horse_registration_number"], minute).uniform(0.7, 1.3)
+                morning_line = float(runner["morning_line_odds"].split("-")[0])
+                entries.append({**race_info, **runner, "current_odds": f"{max(1, round(morning_line * drift))}-1"})
+        return {"entries": entries}
+
+    def results(self, meet_id: str) -> Optional[dict]:
+        code, race_date = self._parse_meet(meet_id)
+        if not code:
+            return None
+
+        now = datetime.now()
+        results = []
+        for race_number in range(1, self.config.races_per_card + 1):
+            # Results appear a few minutes after post time
+            if self._post_time(race_date, race_number) + timedelta(minutes=3) > now:
+                continue
+            field = self._field(code, race_date, race_number)
+            rng = self._rng(code, race_date, race_number, "result")
+            rng.shuffle(field)
+            for position, runner in enumerate(field, start=1):
+                odds = float(runner["morning_line_odds"].split("-")[0])
+                results.append({
+                    "race_number": race_number,
+                    "horse_registration_number": runner["horse_registration_number"],
+                    "horse_name": runner["horse_name"],
+                    "finish_position": position,
+                    "win_odds": odds if position == 1 else 0,
+                    "place_odds": odds / 2 if position <= 2 else 0,
+                    "show_odds": odds / 3 if position <= 3 else 0,
+                    "margin": round(rng.uniform(0, 3), 2) if position > 1 else 0,
+                    "time": round(rng.uniform(68, 115), 2)
+                })
+        if not results:
+            return None
+        return {"results": results}
+
+    def history(self, registration_number: str) -> dict:
+        rng = self._rng(registration_number, "history")
+        code = registration_number[:4]
+        performances = []
+        day = date.today()
+        for _ in range(rng.randint(3, 40)):
+            day -= timedelta(days=rng.randint(14, 45))
+            performances.append({
+                "race_date": day.isoformat(),
+                "distance": rng.choice([5.5, 6, 6.5, 7, 8, 8.5, 9]),
+                "surface": rng.choice(["Dirt", "Turf"]),
+                "finish_position": rng.randint(1, self.config.field_size),
+                "beaten_lengths": round(rng.uniform(0, 15), 1),
+                "odds": rng.choice([2, 3, 4, 5, 6, 8, 10, 12, 15, 20, 30]),
+                "speed_figure": rng.randint(50, 105),
+                "jockey_id": f"jky_{code}_{rng.randint(1, 40)}",
+                "trainer_id": f"trn_{code}_{rng.randint(1, 30)}"
+            })
+        # Oldest first, like the real API
+        return {"performances": list(reversed(performances))}
+
+    def person_stats(self, person_id: str) -> dict:
+        rng = self._rng(person_id, "stats")
+        starts = rng.randint(50, 800)
+        wins = rng.randint(0, starts // 4)
+        return {"id": person_id, "starts": starts, "wins": wins, "win_percentage": round(100 * wins / starts, 1)}
+
+
+def create_app(config: Optional[FakeConfig] = None) -> FastAPI:
+    config = config or FakeConfig()
+    synthetic = SyntheticRacing(config)
+    app = FastAPI(title="Fake TheRacingAPI")
+    app.state.config = config
+    app.state.stats = {"requests": 0, "errors": 0, "throttled": 0, "replayed": 0}
+
+    @app.middleware("http")
+    async def latency_and_errors(request: Request, call_next):
+        app.state.stats["requests"] += 1
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        roll = random.random()
+        if roll < config.error_rate:
+            app.state.stats["errors"] += 1
+            return JSONResponse({"detail": "Injected upstream error"}, status_code=503)
+        if roll < config.error_rate + config.throttle_rate:
+            app.state.stats["throttled"] += 1
+            return JSONResponse({"detail": "Too many requests"}, status_code=429, headers={"Retry-After": "1"})
+
+        if config.recordings:
+            recorded = recording_path(config.recordings, request.url.path, request.query_params.multi_items())
+            if recorded.exists():
+                app.state.stats["replayed"] += 1
+                recording = json.loads(recorded.read_text())
+                return JSONResponse(recording["body"], status_code=recording["status"])
+
+        return await call_next(request)
+
+    def found(document: Optional[dict]):
+        if document is None:
+            return JSONResponse({"detail": "Not found"}, status_code=404)
+        return document
+
+    @app.get("/v1/north-america/meets")
+    async def meets(start_date: date, end_date: date):
+        return synthetic.meets(start_date, end_date)
+
+    @app.get("/v1/north-america/meets/{meet_id}/entries")
+    async def entries(meet_id: str):
+        return found(synthetic.entries(meet_id))
+
+    @app.get("/v1/north-america/meets/{meet_id}/results")
+    async def results(meet_id: str):
+        return found(synthetic.results(meet_id))
+
+    @app.get("/v1/horses/{registration_number}/history")
+    async def horse_history(registration_number: str):
+        return synthetic.history(registration_number)
+
+    @app.get("/v1/jockeys/{jockey_id}/stats")
+    async def jockey_stats(jockey_id: str):
+        return synthetic.person_stats(jockey_id)
+
+    @app.get("/v1/trainers/{trainer_id}/stats")
+    async def trainer_stats(trainer_id: str):
+        return synthetic.person_stats(trainer_id)
+
+    @app.get("/v1/tracks")
+    async def tracks():
+        return {"tracks": [{"track_id": t["code"], "track_name": t["name"]} for t in synthetic.tracks]}
+
+    @app.get("/v1/conditions/{track_code}/{race_date}")
+    async def conditions(track_code: str, race_date: date):
+        return {"track_id": track_code, "date": race_date.isoformat(), "condition": "Fast", "weather": "Clear"}
+
+    @app.get("/_fake/stats")
+    async def fake_stats():
+        return app.state.stats
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve a fake TheRacingAPI for offline runs and load tests")
+    parser.add_argument("--port", type=int, default=int(os.getenv("FAKE_API_PORT", "8100")))
+    parser.add_argument("--tracks", type=int, help="Synthetic tracks (FAKE_API_TRACKS)")
+    parser.add_argument("--latency-ms", type=float, help="Mean response latency (FAKE_API_LATENCY_MS)")
+    parser.add_argument("--error-rate", type=float, help="Share of requests answered 503 (FAKE_API_ERROR_RATE)")
+    parser.add_argument("--recordings", help="Directory of responses recorded with RACING_API_RECORD_DIR")
+    parser.add_argument("--write-registry", help="Write the synthetic tracks as a TRACK_REGISTRY_FILE and exit")
+    args = parser.parse_args()
+
+    config = FakeConfig(tracks=args.tracks, latency_ms=args.latency_ms, error_rate=args.error_rate,
+                        recordings=args.recordings)
+    if args.write_registry:
+        with open(args.write_registry, "w") as f:
+            json.dump(synthetic_tracks(config.tracks), f, indent=2)
+    else:
+        uvicorn.run(create_app(config), host="0.0.0.0", port=args.port)
@@ -0,0 +1,179 @@
+"""
+Process-wide identity map cache
+Maps natural keys (horse registration number, jockey/trainer api_id,
+(race_id, horse_id), (race_id, horse name)) to primary keys so hot odds
+and results paths can skip per-runner lookups.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Hashable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import Horse, Jockey, Trainer, Race, RaceEntry
+
+# Namespaces used as the first part of every cache key
+HORSES = "horses"
+JOCKEYS = "jockeys"
+TRAINERS = "trainers"
+ENTRIES = "race_entries"
+ENTRY_NAMES = "race_entry_names"
+
+_PENDING_KEY = "identity_map_pending"
+
+
+class IdentityMap:
+    def __init__(self, maxsize: int = 50000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: Hashable, db: Optional[Session] = None) -> Optional[int]:
+        """Look up a primary key, including values staged by the caller's own transaction"""
+        cache_key = (namespace, key)
+
+        if db is not None:
+            pending = db.info.get(_PENDING_KEY)
+            if pending and cache_key in pending:
+                return pending[cache_key]
+
+        with self._lock:
+            value = self._data.get(cache_key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(cache_key)
+            self.hits += 1
+            return value
+
+    def put(self, namespace: str, key: Hashable, value: int):
+        """Store a committed primary key, evicting the least recently used entries"""
+        if key is None or value is None:
+            return
+        with self._lock:
+            self._data[(namespace, key)] = value
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stage(self, db: Session, namespace: str, key: Hashable, value: int):
+        """Record a key from an open transaction, applied only once the session commits"""
+        if key is None or value is None:
+            return
+        db.info.setdefault(_PENDING_KEY, {})[(namespace, key)] = value
+
+    def discard(self, namespace: str, key: Hashable):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    def warm(self, db: Session, race_date: date):
+        """Load the keys for a day's card, e.g. at startup for today"""
+        rows = db.query(
+            RaceEntry.id, RaceEntry.race_id, RaceEntry.horse_id,
+            Horse.registration_number, Horse.name,
+            Jockey.id, Jockey.api_id, Trainer.id, Trainer.api_id
+        ).join(Race, Race.id == RaceEntry.race_id).join(
+            Horse, Horse.id == RaceEntry.horse_id
+        ).outerjoin(
+            Jockey, Jockey.id == RaceEntry.jockey_id
+        ).outerjoin(
+            Trainer, Trainer.id == RaceEntry.trainer_id
+        ).filter(Race.race_date == race_date).all()
+
+        for entry_id, race_id, horse_id, reg_number, horse_name, jockey_id, jockey_api_id, trainer_id, trainer_api_id in rows:
+            self.put(HORSES, reg_number, horse_id)
+            self.put(JOCKEYS, jockey_api_id, jockey_id)
+            self.put(TRAINERS, trainer_api_id, trainer_id)
+            self.put(ENTRIES, (race_id, horse_id), entry_id)
+            self.put(ENTRY_NAMES, (race_id, horse_name), entry_id)
+
+        return len(rows)
+
+
+identity_map = IdentityMap(int(os.getenv("IDENTITY_MAP_SIZE", "50000")))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for (namespace, key), value in pending.items():
+            identity_map.put(namespace, key, value)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def resolve_entry_ids(db: Session, race_id: int, registration_numbers: Iterable[str]) -> Dict[str, int]:
+    """Map horse registration numbers to entry ids for a race, querying only cache misses"""
+    registration_numbers = [reg for reg in dict.fromkeys(registration_numbers) if reg]
+
+    horse_ids = {}
+    for reg_number in registration_numbers:
+        horse_id = identity_map.get(HORSES, reg_number, db)
+        if horse_id is not None:
+            horse_ids[reg_number] = horse_id
+
+    missing = [reg for reg in registration_numbers if reg not in horse_ids]
+    if missing:
+        for reg_number, horse_id in db.query(Horse.registration_number, Horse.id).filter(
+            Horse.registration_number.in_(missing)
+        ).all():
+            horse_ids[reg_number] = horse_id
+            identity_map.stage(db, HORSES, reg_number, horse_id)
+
+    entry_ids = {}
+    for reg_number, horse_id in horse_ids.items():
+        entry_id = identity_map.get(ENTRIES, (race_id, horse_id), db)
+        if entry_id is not None:
+            entry_ids[reg_number] = entry_id
+
+    missing = {horse_id: reg for reg, horse_id in horse_ids.items() if reg not in entry_ids}
+    if missing:
+        for entry_id, horse_id in db.query(RaceEntry.id, RaceEntry.horse_id).filter(
+            RaceEntry.race_id == race_id,
+            RaceEntry.horse_id.in_(list(missing))
+        ).all():
+            entry_ids[missing[horse_id]] = entry_id
+            identity_map.stage(db, ENTRIES, (race_id, horse_id), entry_id)
+
+    return entry_ids
+
+
+def resolve_entry_ids_by_name(db: Session, race_id: int, horse_names: Iterable[str]) -> Dict[str, int]:
+    """Map horse names to entry ids for a race, querying only cache misses"""
+    horse_names = [name for name in dict.fromkeys(horse_names) if name]
+
+    entry_ids = {}
+    for name in horse_names:
+        entry_id = identity_map.get(ENTRY_NAMES, (race_id, name), db)
+        if entry_id is not None:
+            entry_ids[name] = entry_id
+
+    missing = [name for name in horse_names if name not in entry_ids]
+    if missing:
+        for entry_id, name in db.query(RaceEntry.id, Horse.name).join(
+            Horse, Horse.id == RaceEntry.horse_id
+        ).filter(
+            RaceEntry.race_id == race_id,
+            Horse.name.in_(missing)
+        ).all():
+            entry_ids[name] = entry_id
+            identity_map.stage(db, ENTRY_NAMES, (race_id, name), entry_id)
+
+    return entry_ids
@@ -0,0 +1,241 @@
+"""
+Background sync jobs
+Runs long sync work (upstream fetches, DB writes, bet generation) on
+in-process worker tasks so HTTP requests return a job id immediately.
+Each job's status, progress and result live in a sync_tasks row of kind
+'job:<kind>', so any uvicorn worker can answer status requests for a job
+running in another one. Task queue workers never claim these rows.
+The process holding a job keeps renewing its locked_until lease, so jobs
+left behind by a process that died are failed by the next JobManager to
+start instead of staying 'running' forever.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Set
+
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SyncTask, get_async_session_local
+
+logger = logging.getLogger(__name__)
+
+# A job runner gets its own AsyncSession and a progress list it appends messages to
+JobRunner = Callable[[AsyncSession, List[str]], Awaitable[dict]]
+
+# How often a running job's progress is written to its row, and status streams re-read it
+JOB_PROGRESS_SECONDS = float(os.getenv("JOB_PROGRESS_SECONDS", "1"))
+
+# A queued or running job whose lease wasn't renewed for this long belongs to a dead process
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", str(JOB_PROGRESS_SECONDS * 30)))
+
+JOB_KIND_PREFIX = "job:"
+
+
+class SyncJob:
+    """A job running in this process; other processes see it through job_status"""
+
+    def __init__(self, id: int, kind: str, runner: JobRunner):
+        self.id = id
+        self.kind = kind
+        self.runner = runner
+        self.status = "queued"
+        self.progress: List[str] = []
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+
+def _lease_expiry() -> datetime:
+    return datetime.now() + timedelta(seconds=JOB_STALE_SECONDS)
+
+
+def _insert_job(db: Session, kind: str, owner: str) -> int:
+    row = SyncTask(kind=JOB_KIND_PREFIX + kind, status="queued", attempts=0, max_attempts=1,
+                   payload={"progress": [], "result": None}, locked_by=owner, locked_until=_lease_expiry())
+    db.add(row)
+    db.flush()
+    return row.id
+
+
+def _save_job(db: Session, job: SyncJob):
+    db.query(SyncTask).filter(SyncTask.id == job.id).update({
+        "status": job.status,
+        "payload": {"progress": list(job.progress), "result": job.result},
+        "last_error": job.error,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "locked_until": None if job.finished_at else _lease_expiry(),
+        "duration_ms": (job.finished_at - job.started_at).total_seconds() * 1000
+        if job.started_at and job.finished_at else None
+    }, synchronize_session=False)
+
+
+def _renew_leases(db: Session, job_ids: List[int]):
+    db.query(SyncTask).filter(
+        SyncTask.id.in_(job_ids),
+        SyncTask.status.in_(("queued", "running"))
+    ).update({"locked_until": _lease_expiry()}, synchronize_session=False)
+
+
+def _fail_stale_jobs(db: Session) -> int:
+    """Fail queued/running jobs whose lease expired, their process is gone. Returns how many"""
+    now = datetime.now()
+    return db.query(SyncTask).filter(
+        SyncTask.kind.startswith(JOB_KIND_PREFIX),
+        SyncTask.status.in_(("queued", "running")),
+        or_(
+            SyncTask.locked_until < now,
+            # Jobs queued before leases were kept
+            and_(SyncTask.locked_until.is_(None), SyncTask.created_at < now - timedelta(seconds=JOB_STALE_SECONDS))
+        )
+    ).update({
+        "status": "failed",
+        "last_error": "The server running the job stopped before it finished",
+        "finished_at": now,
+        "locked_until": None
+    }, synchronize_session=False)
+
+
+def job_status(db: Session, job_id: int, since: int = 0) -> Optional[dict]:
+    """Status, progress messages (from index `since`) and result of a job, None if there is no such job"""
+    row = db.query(SyncTask).filter(
+        SyncTask.id == job_id,
+        SyncTask.kind.startswith(JOB_KIND_PREFIX)
+    ).first()
+    if not row:
+        return None
+
+    payload = row.payload or {}
+    return {
+        "job_id": row.id,
+        "kind": row.kind[len(JOB_KIND_PREFIX):],
+        "status": row.status,
+        "progress": (payload.get("progress") or [])[since:],
+        "result": payload.get("result"),
+        "error": row.last_error,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "started_at": row.started_at.isoformat() if row.started_at else None,
+        "finished_at": row.finished_at.isoformat() if row.finished_at else None
+    }
+
+
+class JobManager:
+    def __init__(self, workers: int = 1):
+        # A single worker keeps jobs in submission order (races before entries)
+        self.workers = workers
+        self._queue: "asyncio.Queue[SyncJob]" = None
+        self._tasks: List[asyncio.Task] = []
+        # Unfinished jobs of this process, their leases are renewed while it runs
+        self._active: Set[int] = set()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def start(self):
+        try:
+            async with get_async_session_local()() as db:
+                failed = await db.run_sync(_fail_stale_jobs)
+                await db.commit()
+            if failed:
+                logger.warning(f"Marked {failed} sync jobs left by a stopped server as failed")
+        except Exception as e:
+            logger.error(f"Could not check for stale sync jobs: {e}")
+
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        # Jobs still queued here would otherwise stay 'queued' forever
+        while self._queue is not None and not self._queue.empty():
+            job = self._queue.get_nowait()
+            job.status = "failed"
+            job.error = "Server shut down before the job started"
+            job.finished_at = datetime.now()
+            await self._save(job)
+            self._active.discard(job.id)
+
+    async def enqueue(self, kind: str, runner: JobRunner) -> SyncJob:
+        if self._queue is None:
+            await self.start()
+
+        async with get_async_session_local()() as db:
+            job_id = await db.run_sync(_insert_job, kind, self.owner)
+            await db.commit()
+
+        job = SyncJob(job_id, kind, runner)
+        self._active.add(job_id)
+        await self._queue.put(job)
+        return job
+
+    async def _save(self, job: SyncJob):
+        try:
+            async with get_async_session_local()() as db:
+                await db.run_sync(_save_job, job)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Could not save sync job {job.kind} {job.id}: {e}")
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(JOB_PROGRESS_SECONDS)
+            if not self._active:
+                continue
+            try:
+                async with get_async_session_local()() as db:
+                    await db.run_sync(_renew_leases, list(self._active))
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Could not renew sync job leases: {e}")
+
+    async def _flush_progress(self, job: SyncJob):
+        while True:
+            await asyncio.sleep(JOB_PROGRESS_SECONDS)
+            await self._save(job)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = datetime.now()
+            await self._save(job)
+
+            flusher = asyncio.create_task(self._flush_progress(job))
+            try:
+                async with get_async_session_local()() as db:
+                    job.result = await job.runner(db, job.progress)
+                # Runners report their own failures in the result
+                if isinstance(job.result, dict) and job.result.get("success") is False:
+                    job.error = job.result.get("error") or job.result.get("status")
+                    job.status = "failed"
+                else:
+                    job.status = "completed"
+            except asyncio.CancelledError:
+                job.error = "Server shut down before the job finished"
+                job.status = "failed"
+                raise
+            except Exception as e:
+                logger.exception(f"Sync job {job.kind} {job.id} failed")
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                # Stop the flusher first so a late progress write can't overwrite the final state
+                flusher.cancel()
+                await asyncio.gather(flusher, return_exceptions=True)
+                job.finished_at = datetime.now()
+                await self._save(job)
+                self._active.discard(job.id)
+                self._queue.task_done()
+
+
+job_manager = JobManager()
@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from sqlalchemy import func
@@ -11,8 +11,18 @@ from pathlib import Path
 from contextlib import asynccontextmanager
 import json
 
-from database import get_db, Base, get_engine, Track, Race, Bet, BetResult, DailyROI, RaceEntry, RaceResult, Horse, Jockey, Trainer, OddsHistory
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from database import get_async_db, get_async_read_db, get_async_session_local, replica_status, dispose_async_engine, pool_stats, load_race_cards, load_bets, bets_by_race, entry_graph, Base, get_engine, Track, Race, Bet, BetResult, DailyROI, RaceEntry, RaceResult, OddsHistory, SyncJournalEntry
 from betting_engine import BettingEngine
+from racing_api import get_api_client
+from identity_map import identity_map
+from jobs import JOB_PROGRESS_SECONDS, job_manager, job_status
+from track_registry import TrackInfo, track_registry
+from sync_journal import phase_summary, run_key_for
+from data_sync import find_race, race_api_id
 import os
 
 # Get the base directory (parent of src)
@@ -55,28 +65,27 @@ async def lifespan(app: FastAPI):
     # Create database tables after environment variables are loaded
     Base.metadata.create_all(bind=get_engine())
     
-    # Initialize tracks if not exists
-    db = next(get_db())
-    try:
-        tracks = [
-            {"name": "Remington Park", "code": "RP"},
-            {"name": "Fair Meadows", "code": "FM"}
-        ]
+    # Open the shared, pooled HTTP client for TheRacingAPI
+    api_client = get_api_client()
+    await api_client.open()
+    
+    # Start the background sync job worker
+    await job_manager.start()
+    
+    # Seed missing tracks and load the track registry
+    async with get_async_session_local()() as db:
+        await db.run_sync(track_registry.seed)
+        await db.run_sync(track_registry.load)
         
-        for track_data in tracks:
-            existing = db.query(Track).filter(Track.code == track_data["code"]).first()
-            if not existing:
-                track = Track(**track_data)
-                db.add(track)
-                
-        db.commit()
-    finally:
-        db.close()
+        # Warm the natural key -> id cache with today's card
+        await db.run_sync(identity_map.warm, date.today())
     
     yield
     
     # Shutdown
-    # Add any cleanup code here if needed
+    await job_manager.stop()
+    await api_client.aclose()
+    await dispose_async_engine()
 
 app = FastAPI(title="Horse Racing Betting Platform", lifespan=lifespan)
 
@@ -104,19 +113,19 @@ async def clear_odds_page():
         return f.read()
 
 @app.get("/api/tracks")
-async def get_tracks(db: Session = Depends(get_db)):
-    tracks = db.query(Track).all()
-    return [{"id": t.id, "name": t.name} for t in tracks]
+async def get_tracks(db: AsyncSession = Depends(get_async_db)):
+    await db.run_sync(track_registry.load)
+    return [{"id": t.id, "name": t.name} for t in track_registry.active()]
 
 @app.get("/api/races/{track_id}")
-async def get_races(track_id: int, db: Session = Depends(get_db)):
+async def get_races(track_id: int, db: AsyncSession = Depends(get_async_db)):
     today = date.today()
     
     # Get races for the track today
-    races = db.query(Race).filter(
+    races = (await db.scalars(select(Race).filter(
         Race.track_id == track_id,
         Race.race_date == today
-    ).order_by(Race.race_time).all()
+    ).order_by(Race.race_time))).all()
     
     race_list = []
     
@@ -143,7 +152,10 @@ async def get_races(track_id: int, db: Session = Depends(get_db)):
     return race_list
 
 @app.get("/api/recommendations/{track_id}")
-async def get_recommendations(track_id: int, db: Session = Depends(get_db)):
+async def get_recommendations(track_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(_recommendations, track_id)
+
+def _recommendations(db: Session, track_id: int):
     try:
         today = date.today()
         
@@ -152,11 +164,8 @@ async def get_recommendations(track_id: int, db: Session = Depends(get_db)):
         if not track:
             return {"error": "Track not found", "recommendations": []}
         
-        # Get races for the track today
-        races = db.query(Race).filter(
-            Race.track_id == track_id,
-            Race.race_date == today
-        ).order_by(Race.race_time).all()
+        # Get races for the track today, with entries and their results
+        races = load_race_cards(db, track_id, today)
         
         if not races:
             return {
@@ -168,10 +177,11 @@ async def get_recommendations(track_id: int, db: Session = Depends(get_db)):
         
         recommendations = []
         daily_budget = 100.0
+        bets_for_race = bets_by_race(load_bets(db, Race.id.in_([race.id for race in races])))
         
         for race in races:
             # Get bets for this race
-            bets = db.query(Bet).filter(Bet.race_id == race.id).all()
+            bets = bets_for_race.get(race.id, [])
             
             race_recommendations = []
             for bet in bets:
@@ -203,21 +213,22 @@ async def get_recommendations(track_id: int, db: Session = Depends(get_db)):
         return {"error": str(e), "recommendations": []}
 
 @app.get("/api/race-results/{race_id}")
-async def get_race_results(race_id: int, db: Session = Depends(get_db)):
+async def get_race_results(race_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(_race_results, race_id)
+
+def _race_results(db: Session, race_id: int):
     race = db.query(Race).filter(Race.id == race_id).first()
     if not race:
         raise HTTPException(status_code=404, detail="Race not found")
         
     results = []
-    entries = db.query(RaceEntry).filter(RaceEntry.race_id == race_id).all()
+    entries = db.query(RaceEntry).filter(RaceEntry.race_id == race_id).options(*entry_graph()).all()
+    bets = {bet.entry_id: bet for bet in load_bets(db, Bet.race_id == race_id)}
     
     for entry in entries:
         if entry.result:
             # Check if we bet on this horse
-            bet = db.query(Bet).filter(
-                Bet.race_id == race_id,
-                Bet.entry_id == entry.id
-            ).first()
+            bet = bets.get(entry.id)
             
             results.append({
                 "position": entry.result.finish_position,
@@ -231,7 +242,10 @@ async def get_race_results(race_id: int, db: Session = Depends(get_db)):
     return results
 
 @app.get("/api/roi/{track_id}")
-async def get_roi_stats(track_id: int, db: Session = Depends(get_db)):
+async def get_roi_stats(track_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    return await db.run_sync(_roi_stats, track_id)
+
+def _roi_stats(db: Session, track_id: int):
     today = date.today()
     
     # Get expected ROI for today
@@ -243,9 +257,10 @@ async def get_roi_stats(track_id: int, db: Session = Depends(get_db)):
     if races:
         engine = BettingEngine(db)
         all_recommendations = []
+        bets_for_race = bets_by_race(db.query(Bet).filter(Bet.race_id.in_([race.id for race in races])).all())
         
         for race in races:
-            bets = db.query(Bet).filter(Bet.race_id == race.id).all()
+            bets = bets_for_race.get(race.id, [])
             race_recs = [{
                 'bet_amount': bet.amount,
                 'expected_value': bet.expected_value
@@ -285,46 +300,51 @@ async def get_roi_stats(track_id: int, db: Session = Depends(get_db)):
     }
 
 
+def _job_response(job) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "stream_url": f"/api/jobs/{job.id}/stream"
+    }
+
+
 @app.post("/api/sync")
-async def trigger_sync(db: Session = Depends(get_db)):
+async def trigger_sync():
+    """Queue a comprehensive race sync, returns a job id to follow progress"""
+    job = await job_manager.enqueue("sync", run_sync_job)
+    return _job_response(job)
+
+
+async def run_sync_job(db: AsyncSession, debug_info: List[str]) -> dict:
     """Comprehensive manual sync with detailed debugging"""
     try:
-        from racing_api import RacingAPIClient
         import traceback
         
-        api_client = RacingAPIClient()
+        api_client = get_api_client()
         today = date.today()
         
-        # Get both tracks
-        tracks = [
-            {"name": "Remington Park", "code": "RP"},
-            {"name": "Fair Meadows", "code": "FM"}
-        ]
+        await db.run_sync(track_registry.load)
+        tracks = track_registry.active()
         
-        total_races_synced = 0
-        debug_info = [f"Starting sync for date: {today}"]
+        debug_info.append(f"Starting sync for date: {today}")
         
-        for track_data in tracks:
-            track = db.query(Track).filter(Track.name == track_data["name"]).first()
-            if not track:
-                debug_info.append(f"❌ {track_data['name']} track not found in database")
-                continue
-            
-            debug_info.append(f"🏁 Processing {track_data['name']} (code: {track_data['code']} -> API)")
+        async def sync_track(track_db: AsyncSession, track) -> int:
+            debug_info.append(f"🏁 Processing {track.name} (code: {track.code} -> API {track.api_codes})")
             
             try:
                 # Get races directly from API
-                races_data = await api_client.get_races_by_date(track_data["code"], today)
+                races_data = await api_client.get_races_by_date(track.code, today)
                 
                 if races_data is None:
-                    debug_info.append(f"❌ {track_data['name']}: API returned None")
-                    continue
+                    debug_info.append(f"❌ {track.name}: API returned None")
+                    return 0
                 
-                debug_info.append(f"📡 {track_data['name']} API response keys: {list(races_data.keys())}")
+                debug_info.append(f"📡 {track.name} API response keys: {list(races_data.keys())}")
                 
                 # Check for debug info in response
                 if 'debug' in races_data:
-                    debug_info.append(f"🔍 {track_data['name']} API debug: {races_data['debug']}")
+                    debug_info.append(f"🔍 {track.name} API debug: {races_data['debug']}")
                 
                 # Handle both 'entries' and 'races' response formats
                 entries = races_data.get('entries', [])
@@ -332,7 +352,7 @@ async def trigger_sync(db: Session = Depends(get_db)):
                 
                 if races and not entries:
                     # 'races' format - extract entries from each race
-                    debug_info.append(f"📋 {track_data['name']}: {len(races)} races returned (races format)")
+                    debug_info.append(f"📋 {track.name}: {len(races)} races returned (races format)")
                     
                     races_by_number = {}
                     race_keys_found = []
@@ -378,10 +398,10 @@ async def trigger_sync(db: Session = Depends(get_db)):
                     debug_info.append(f"🔑 Race keys: {', '.join(race_keys_found[:5])}{'...' if len(race_keys_found) > 5 else ''}")
                 else:
                     # 'entries' format - group by race number
-                    debug_info.append(f"📋 {track_data['name']}: {len(entries)} entries returned (entries format)")
+                    debug_info.append(f"📋 {track.name}: {len(entries)} entries returned (entries format)")
                     if not entries:
-                        debug_info.append(f"⚠️ {track_data['name']}: No entries found")
-                        continue
+                        debug_info.append(f"⚠️ {track.name}: No entries found")
+                        return 0
                     
                     races_by_number = {}
                     for entry in entries:
@@ -389,21 +409,15 @@ async def trigger_sync(db: Session = Depends(get_db)):
                         if race_num and race_num not in races_by_number:
                             races_by_number[race_num] = entry
                 
-                debug_info.append(f"🏇 {track_data['name']}: Found {len(races_by_number)} unique races: {list(races_by_number.keys())}")
+                debug_info.append(f"🏇 {track.name}: Found {len(races_by_number)} unique races: {list(races_by_number.keys())}")
                 
                 races_synced = 0
                 for race_number, race_info in races_by_number.items():
-                    race_key = f"R{race_number}"
-                    
                     # Check if already exists
-                    existing = db.query(Race).filter(
-                        Race.api_id == race_key,
-                        Race.track_id == track.id,
-                        Race.race_date == today
-                    ).first()
+                    existing = await track_db.run_sync(find_race, track.id, today, race_number)
                     
                     if existing:
-                        debug_info.append(f"⏭️ {track_data['name']} Race {race_number}: Already exists")
+                        debug_info.append(f"⏭️ {track.name} Race {race_number}: Already exists")
                         continue
                     
                     # Debug: show all available fields in race_info
@@ -430,7 +444,7 @@ async def trigger_sync(db: Session = Depends(get_db)):
                         debug_info.append(f"⚠️ No post_time provided, using current time: {race_time.strftime('%I:%M %p')}")
                     
                     race = Race(
-                        api_id=race_key,
+                        api_id=race_api_id(track.code, today, race_number),
                         track_id=track.id,
                         race_number=race_number,
                         race_date=today,
@@ -441,38 +455,28 @@ async def trigger_sync(db: Session = Depends(get_db)):
                         purse=race_info.get('purse', 0),
                         conditions=race_info.get('race_restriction_description', '')
                     )
-                    db.add(race)
+                    track_db.add(race)
                     races_synced += 1
-                    debug_info.append(f"✅ {track_data['name']} Race {race_number}: Added to database")
+                    debug_info.append(f"✅ {track.name} Race {race_number}: Added to database")
                 
-                total_races_synced += races_synced
-                debug_info.append(f"🎯 {track_data['name']}: Synced {races_synced} new races")
+                await track_db.commit()
+                debug_info.append(f"🎯 {track.name}: Synced {races_synced} new races")
+                return races_synced
                 
             except Exception as track_error:
-                debug_info.append(f"❌ {track_data['name']} error: {str(track_error)}")
-                debug_info.append(f"🔍 {track_data['name']} traceback: {traceback.format_exc()}")
+                debug_info.append(f"❌ {track.name} error: {str(track_error)}")
+                debug_info.append(f"🔍 {track.name} traceback: {traceback.format_exc()}")
+                await track_db.rollback()
+                return 0
         
-        db.commit()
+        # Each track runs its own pipeline concurrently with its own session
+        synced = await track_registry.run_per_track(sync_track, tracks=tracks)
+        total_races_synced = sum(count or 0 for count in synced.values())
         
         # Check for most recent racing day if no races today
         last_race_info = {}
         if total_races_synced == 0:
-            # Find the most recent race date for each track
-            for track_data in tracks:
-                track = db.query(Track).filter(Track.name == track_data["name"]).first()
-                if track:
-                    last_race = db.query(Race).filter(
-                        Race.track_id == track.id
-                    ).order_by(Race.race_date.desc()).first()
-                    
-                    if last_race:
-                        last_race_info[track_data["name"]] = {
-                            "last_race_date": last_race.race_date.strftime("%Y-%m-%d"),
-                            "races_that_day": db.query(Race).filter(
-                                Race.track_id == track.id,
-                                Race.race_date == last_race.race_date
-                            ).count()
-                        }
+            last_race_info = await db.run_sync(_last_racing_days, tracks)
         
         # Final status with better explanation
         status_msg = f"Sync completed: {total_races_synced} races synced"
@@ -486,6 +490,7 @@ async def trigger_sync(db: Session = Depends(get_db)):
             debug_info.append("💡 This is normal - not all tracks race every day")
         
         return {
+            "success": True,
             "status": status_msg,
             "races_synced": total_races_synced,
             "debug": debug_info,
@@ -496,95 +501,88 @@ async def trigger_sync(db: Session = Depends(get_db)):
     except Exception as e:
         import traceback
         return {
+            "success": False,
             "status": f"Sync failed: {str(e)}",
             "error": traceback.format_exc(),
-            "debug": debug_info if 'debug_info' in locals() else ["Error occurred before debug initialization"]
+            "debug": debug_info
         }
 
 
+def _last_racing_days(db: Session, tracks: List[TrackInfo]) -> dict:
+    """The most recent race date of each track and its number of races"""
+    last_race_info = {}
+    for track in tracks:
+        last_race = db.query(Race).filter(
+            Race.track_id == track.id
+        ).order_by(Race.race_date.desc()).first()
+        
+        if last_race:
+            last_race_info[track.name] = {
+                "last_race_date": last_race.race_date.strftime("%Y-%m-%d"),
+                "races_that_day": db.query(Race).filter(
+                    Race.track_id == track.id,
+                    Race.race_date == last_race.race_date
+                ).count()
+            }
+    return last_race_info
+
+
 @app.post("/api/sync-entries")
-async def sync_race_entries(db: Session = Depends(get_db)):
+async def sync_race_entries():
+    """Queue an entry sync and bet generation for today's races, returns a job id to follow progress"""
+    job = await job_manager.enqueue("sync-entries", run_sync_entries_job)
+    return _job_response(job)
+
+
+async def run_sync_entries_job(db: AsyncSession, debug_info: List[str]) -> dict:
     """Sync entries (horses, jockeys, trainers) for existing races and generate betting recommendations"""
     try:
         from data_sync import DataSync
-        from betting_engine import BettingEngine
         import traceback
         
-        debug_info = []
         sync = DataSync()
         
-        # Add timeout and chunking
         today = date.today()
-        races = db.query(Race).filter(Race.race_date == today).all()
+        # Plain rows, a rollback below would expire ORM objects
+        races = (await db.execute(
+            select(Race.id, Race.race_number, Track.code).join(Track, Track.id == Race.track_id).filter(
+                Race.race_date == today
+            )
+        )).all()
         
         debug_info.append(f"Found {len(races)} races to sync")
         
         synced_count = 0
         
-        # Process races in chunks to avoid timeout
-        for i, race in enumerate(races[:5]):  # Limit to first 5 races
+        # Running in the background, so the whole card is processed
+        for race_id, race_number, track_code in races:
             try:
-                debug_info.append(f"Processing race {race.race_number}...")
+                debug_info.append(f"Processing race {race_number}...")
                 
                 # Sync entries for this race
                 entries_data = await sync.api_client.get_race_entries(
-                    'FM' if race.track_id == 2 else 'RP', 
+                    track_code, 
                     today, 
-                    race.race_number
+                    race_number
                 )
                 
-                await sync._sync_entries(db, race.id, entries_data)
-                db.commit()
+                await db.run_sync(sync._sync_entries, race_id, entries_data)
+                await db.commit()
                 
                 # Count entries for this race
-                race_entries = db.query(RaceEntry).filter(RaceEntry.race_id == race.id).count()
-                debug_info.append(f"Race {race.race_number}: {race_entries} entries")
+                race_entries = await db.scalar(select(func.count(RaceEntry.id)).filter(RaceEntry.race_id == race_id))
+                debug_info.append(f"Race {race_number}: {race_entries} entries")
                 synced_count += race_entries
                 
             except Exception as race_error:
-                debug_info.append(f"Race {race.race_number} failed: {str(race_error)}")
+                await db.rollback()
+                debug_info.append(f"Race {race_number} failed: {str(race_error)}")
                 continue
         
         # Generate betting recommendations for races with entries
         if synced_count > 0:
             debug_info.append("Generating betting recommendations...")
-            engine = BettingEngine(db)
-            
-            races_with_entries = db.query(Race).join(RaceEntry).filter(
-                Race.race_date == today
-            ).distinct().all()
-            
-            generated_bets = 0
-            for race in races_with_entries:
-                try:
-                    # Generate recommendations using the betting engine
-                    recommendations = await engine.analyze_race(race)
-                    
-                    for rec in recommendations:
-                        # Check if bet already exists
-                        existing_bet = db.query(Bet).filter(
-                            Bet.race_id == race.id,
-                            Bet.entry_id == rec['entry_id']
-                        ).first()
-                        
-                        if not existing_bet:
-                            bet = Bet(
-                                race_id=race.id,
-                                entry_id=rec['entry_id'],
-                                bet_type=rec.get('bet_type', 'WIN'),
-                                amount=rec['bet_amount'],
-                                odds=rec['current_odds'],
-                                confidence=rec['confidence'],
-                                expected_value=rec['expected_value']
-                            )
-                            db.add(bet)
-                            generated_bets += 1
-                            
-                except Exception as bet_error:
-                    debug_info.append(f"Bet generation failed for race {race.race_number}: {str(bet_error)}")
-                    continue
-            
-            db.commit()
+            generated_bets = await db.run_sync(_generate_bets, today, debug_info)
             debug_info.append(f"Generated {generated_bets} betting recommendations")
         
         # Also check for results on completed races
@@ -595,84 +593,54 @@ async def sync_race_entries(db: Session = Depends(get_db)):
         now = datetime.now()
         five_minutes_ago = now - timedelta(minutes=5)
         
-        completed_races = db.query(Race).filter(
-            Race.race_date == today,
-            Race.race_time <= five_minutes_ago
-        ).all()
+        completed_races = (await db.execute(
+            select(Race.id, Race.race_number, Race.track_id).filter(
+                Race.race_date == today,
+                Race.race_time <= five_minutes_ago
+            )
+        )).all()
         
         debug_info.append(f"Checking {len(completed_races)} potentially completed races for results")
         
-        for race in completed_races:
+        tracks = [
+            TrackInfo(*row) for row in (await db.execute(
+                select(Track.id, Track.name, Track.code, Track.api_codes).filter(
+                    Track.id.in_({track_id for _, _, track_id in completed_races})
+                )
+            )).all()
+        ] if completed_races else []
+        
+        # One results fetch per track settles every finished race on its card
+        for track in tracks:
             try:
-                # Check if we already have results for this race
-                existing_results = db.query(RaceResult).join(RaceEntry).filter(
-                    RaceEntry.race_id == race.id
-                ).first()
+                became_final = await sync.ingest_meet_results(db, track, today)
+                if not became_final:
+                    debug_info.append(f"⏳ No new results yet for {track.name}")
                 
-                if not existing_results:
-                    # Try to fetch results
-                    from racing_api import RacingAPIClient
-                    api_client = RacingAPIClient()
-                    track_code = 'RP' if race.track_id == 1 else 'FM'
-                    
-                    results_data = await api_client.get_race_results(track_code, race.race_date, race.race_number)
+                for race_id, race_number, _ in completed_races:
+                    if race_id not in became_final:
+                        continue
                     
-                    if results_data and results_data.get('results'):
-                        # Process results
-                        for result in results_data['results']:
-                            horse_name = result.get('horse_name', '')
-                            entry = db.query(RaceEntry).join(Horse).filter(
-                                RaceEntry.race_id == race.id,
-                                Horse.name == horse_name
-                            ).first()
-                            
-                            if entry:
-                                race_result = RaceResult(
-                                    entry_id=entry.id,
-                                    finish_position=result.get('finish_position', 0),
-                                    win_odds=result.get('win_odds', 0),
-                                    place_odds=result.get('place_odds', 0),
-                                    show_odds=result.get('show_odds', 0),
-                                    margin=result.get('margin', 0),
-                                    time=result.get('time', 0)
-                                )
-                                db.add(race_result)
-                        
-                        # Calculate bet results for this race
-                        bets = db.query(Bet).filter(Bet.race_id == race.id).all()
-                        for bet in bets:
-                            existing_bet_result = db.query(BetResult).filter(
-                                BetResult.bet_id == bet.id
-                            ).first()
-                            
-                            if not existing_bet_result and bet.entry.result:
-                                won = bet.entry.result.finish_position == 1  # WIN bets only
-                                payout = bet.amount * (bet.entry.result.win_odds + 1) if won else 0.0
-                                
-                                bet_result = BetResult(
-                                    bet_id=bet.id,
-                                    won=won,
-                                    payout=payout
-                                )
-                                db.add(bet_result)
-                        
-                        db.commit()
-                        results_processed += 1
-                        debug_info.append(f"✅ Results processed for race {race.race_number}")
-                    else:
-                        debug_info.append(f"⏳ No results yet for race {race.race_number}")
+                    # Calculate bet results for this race
+                    await db.run_sync(_settle_win_bets, race_id)
+                    results_processed += 1
+                    debug_info.append(f"✅ Results processed for race {race_number}")
+                
+                await db.commit()
             except Exception as result_error:
-                debug_info.append(f"❌ Results fetch failed for race {race.race_number}: {str(result_error)}")
+                await db.rollback()
+                debug_info.append(f"❌ Results fetch failed for {track.name}: {str(result_error)}")
                 continue
         
         debug_info.append(f"Processed results for {results_processed} races")
         
         # Count total entries
-        total_entries = db.query(RaceEntry).join(Race).filter(
-            Race.race_date == today
-        ).count()
+        total_entries = await db.scalar(
+            select(func.count(RaceEntry.id)).join(Race, Race.id == RaceEntry.race_id).filter(Race.race_date == today)
+        )
         
         return {
+            "success": True,
             "status": "Entry sync completed",
             "entries_count": total_entries,
             "entries_synced": synced_count,
@@ -684,154 +652,161 @@ async def sync_race_entries(db: Session = Depends(get_db)):
     except Exception as e:
         import traceback
         return {
+            "success": False,
             "status": "Entry sync failed",
             "error": str(e),
             "traceback": traceback.format_exc(),
-            "debug": debug_info if 'debug_info' in locals() else []
+            "debug": debug_info
         }
 
 
+def _generate_bets(db: Session, today: date, debug_info: List[str]) -> int:
+    """Add the betting engine's recommendations for today's races with entries, returns the bets added"""
+    engine = BettingEngine(db)
+    
+    races_with_entries = db.query(Race).join(RaceEntry).filter(
+        Race.race_date == today
+    ).distinct().all()
+    
+    generated_bets = 0
+    for race in races_with_entries:
+        try:
+            # Generate recommendations using the betting engine
+            recommendations = engine.analyze_race(race)
+            
+            for rec in recommendations:
+                # Check if bet already exists
+                existing_bet = db.query(Bet).filter(
+                    Bet.race_id == race.id,
+                    Bet.entry_id == rec['entry_id']
+                ).first()
+                
+                if not existing_bet:
+                    bet = Bet(
+                        race_id=race.id,
+                        entry_id=rec['entry_id'],
+                        bet_type=rec.get('bet_type', 'WIN'),
+                        amount=rec['bet_amount'],
+                        odds=rec['current_odds'],
+                        confidence=rec['confidence'],
+                        expected_value=rec['expected_value']
+                    )
+                    db.add(bet)
+                    generated_bets += 1
+                    
+        except Exception as bet_error:
+            debug_info.append(f"Bet generation failed for race {race.race_number}: {str(bet_error)}")
+            continue
+    
+    db.commit()
+    return generated_bets
+
+
+def _settle_win_bets(db: Session, race_id: int):
+    """Add results for a race's unsettled bets whose entry has a result"""
+    # Bets with their result and entry result, in one query
+    for bet in load_bets(db, Bet.race_id == race_id):
+        if not bet.result and bet.entry.result:
+            won = bet.entry.result.finish_position == 1  # WIN bets only
+            payout = bet.amount * (bet.entry.result.win_odds + 1) if won else 0.0
+            
+            bet.result = BetResult(
+                won=won,
+                payout=payout
+            )
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: int, since: int = 0, db: AsyncSession = Depends(get_async_db)):
+    """Status, progress messages (from index `since`) and result of a sync job"""
+    job = await db.run_sync(job_status, job_id, since)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job_progress(job_id: int):
+    """Stream a sync job's progress as server-sent events until it finishes"""
+    SessionLocal = get_async_session_local()
+    async with SessionLocal() as db:
+        if not await db.run_sync(job_status, job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        sent = 0
+        while True:
+            # The job may be running in another worker process, so follow its row
+            async with SessionLocal() as db:
+                job = await db.run_sync(job_status, job_id, sent)
+            for message in job["progress"]:
+                yield f"event: progress\ndata: {json.dumps(message)}\n\n"
+            sent += len(job["progress"])
+            
+            if job["finished_at"]:
+                yield f"event: done\ndata: {json.dumps(dict(job, progress=[]))}\n\n"
+                return
+            
+            await asyncio.sleep(JOB_PROGRESS_SECONDS)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/api/sync/journal/{kind}")
+async def get_sync_journal(kind: str, run_date: date = None, db: AsyncSession = Depends(get_async_db)):
+    """Per-phase timing and failed units for a sync run ('initial' or 'pre_race', default today)"""
+    return await db.run_sync(_sync_journal, run_key_for(kind, run_date or date.today()))
 
+def _sync_journal(db: Session, run_key: str):
+    failed = db.query(SyncJournalEntry).filter(
+        SyncJournalEntry.run_key == run_key,
+        SyncJournalEntry.status == "failed"
+    ).order_by(SyncJournalEntry.phase, SyncJournalEntry.unit).all()
+    upstream = db.query(SyncJournalEntry).filter(
+        SyncJournalEntry.run_key == run_key,
+        SyncJournalEntry.phase == "upstream"
+    ).order_by(SyncJournalEntry.unit).all()
+    
+    return {
+        "run_key": run_key,
+        "phases": phase_summary(db, run_key),
+        "failed": [
+            {"phase": e.phase, "unit": e.unit, "attempts": e.attempts, "error": e.error}
+            for e in failed
+        ],
+        # TheRacingAPI usage of the run per endpoint
+        "upstream": {e.unit: e.details for e in upstream}
+    }
 
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Process metrics: TheRacingAPI calls, latency histograms, bytes and quota usage per endpoint,
+    DB pool usage and checkout waits, identity map hit rates. Each uvicorn worker reports its own."""
+    return {
+        "pid": os.getpid(),
+        "upstream": get_api_client().telemetry.snapshot(),
+        "db_pools": pool_stats(),
+        "replica": replica_status(),
+        "identity_map": identity_map.stats()
+    }
 
 
 @app.post("/api/results/{race_id}")
-async def log_race_results(race_id: int, db: Session = Depends(get_db)):
+async def log_race_results(race_id: int, db: AsyncSession = Depends(get_async_db)):
     """Fetch and log race results, calculate performance metrics"""
     try:
-        from racing_api import RacingAPIClient
-        
-        race = db.query(Race).filter(Race.id == race_id).first()
+        race = await db.get(Race, race_id, options=[joinedload(Race.track)])
         if not race:
             raise HTTPException(status_code=404, detail="Race not found")
         
-        # Get track code
-        track_code = 'RP' if race.track_id == 1 else 'FM'
-        
-        # Fetch results from API
-        api_client = RacingAPIClient()
-        results_data = await api_client.get_race_results(track_code, race.race_date, race.race_number)
-        
-        if not results_data:
-            return {"status": "No results available yet", "race_id": race_id}
-        
-        # Process results
-        results_logged = 0
-        for result in results_data.get('results', []):
-            # Find the entry
-            horse_name = result.get('horse_name', '')
-            entry = db.query(RaceEntry).join(Horse).filter(
-                RaceEntry.race_id == race_id,
-                Horse.name == horse_name
-            ).first()
-            
-            if entry:
-                # Check if result already exists
-                existing_result = db.query(RaceResult).filter(
-                    RaceResult.entry_id == entry.id
-                ).first()
-                
-                if not existing_result:
-                    race_result = RaceResult(
-                        entry_id=entry.id,
-                        finish_position=result.get('finish_position', 0),
-                        win_odds=result.get('win_odds', 0),
-                        place_odds=result.get('place_odds', 0),
-                        show_odds=result.get('show_odds', 0),
-                        margin=result.get('margin', 0),
-                        time=result.get('time', 0)
-                    )
-                    db.add(race_result)
-                    results_logged += 1
-        
-        db.commit()
-        
-        # Calculate bet results
-        bets = db.query(Bet).filter(Bet.race_id == race_id).all()
-        bet_results_calculated = 0
-        
-        for bet in bets:
-            # Check if bet result already exists
-            existing_bet_result = db.query(BetResult).filter(
-                BetResult.bet_id == bet.id
-            ).first()
-            
-            if not existing_bet_result and bet.entry.result:
-                # Calculate if bet won
-                won = False
-                payout = 0.0
-                
-                if bet.bet_type == 'WIN':
-                    won = bet.entry.result.finish_position == 1
-                    if won:
-                        payout = bet.amount * (bet.entry.result.win_odds + 1)
-                elif bet.bet_type == 'PLACE':
-                    won = bet.entry.result.finish_position <= 2
-                    if won:
-                        payout = bet.amount * (bet.entry.result.place_odds + 1)
-                elif bet.bet_type == 'SHOW':
-                    won = bet.entry.result.finish_position <= 3
-                    if won:
-                        payout = bet.amount * (bet.entry.result.show_odds + 1)
-                
-                bet_result = BetResult(
-                    bet_id=bet.id,
-                    won=won,
-                    payout=payout
-                )
-                db.add(bet_result)
-                bet_results_calculated += 1
-        
-        db.commit()
-        
-        # Update daily ROI
-        today = race.race_date
-        daily_roi = db.query(DailyROI).filter(
-            DailyROI.track_id == race.track_id,
-            DailyROI.date == today
-        ).first()
-        
-        if not daily_roi:
-            daily_roi = DailyROI(
-                track_id=race.track_id,
-                date=today,
-                total_wagered=0,
-                total_returned=0,
-                roi_percentage=0
-            )
-            db.add(daily_roi)
-        
-        # Recalculate daily totals
-        daily_bets = db.query(Bet).join(Race).filter(
-            Race.track_id == race.track_id,
-            Race.race_date == today
-        ).all()
-        
-        total_wagered = sum(bet.amount for bet in daily_bets)
-        total_returned = sum(
-            bet.result.payout 
-            for bet in daily_bets 
-            if hasattr(bet, 'result') and bet.result
-        )
-        
-        daily_roi.total_wagered = total_wagered
-        daily_roi.total_returned = total_returned
-        daily_roi.roi_percentage = ((total_returned - total_wagered) / total_wagered * 100) if total_wagered > 0 else 0
-        
-        db.commit()
+        # Ingest results for the whole meet from one fetch
+        from data_sync import DataSync
+        became_final = await DataSync().ingest_meet_results(db, race.track, race.race_date)
+        # Keep results stored for the meet's other races even if this one has none yet
+        await db.commit()
         
-        return {
-            "status": "Results logged successfully",
-            "race_id": race_id,
-            "results_logged": results_logged,
-            "bet_results_calculated": bet_results_calculated,
-            "performance": {
-                "total_wagered": total_wagered,
-                "total_returned": total_returned,
-                "roi": daily_roi.roi_percentage
-            }
-        }
+        return await db.run_sync(_log_race_results, race, became_final.get(race_id, 0))
         
     except Exception as e:
         import traceback
@@ -842,9 +817,100 @@ async def log_race_results(race_id: int, db: Session = Depends(get_db)):
         }
 
 
+def _log_race_results(db: Session, race: Race, results_logged: int) -> dict:
+    """Settle the race's bets and update the track's daily ROI"""
+    race_id = race.id
+    if not results_logged and not db.query(RaceResult).join(RaceEntry).filter(
+        RaceEntry.race_id == race_id
+    ).first():
+        return {"status": "No results available yet", "race_id": race_id}
+    
+    # Calculate bet results
+    bets = load_bets(db, Bet.race_id == race_id)
+    bet_results_calculated = 0
+    
+    for bet in bets:
+        # Check if bet result already exists
+        if not bet.result and bet.entry.result:
+            # Calculate if bet won
+            won = False
+            payout = 0.0
+            
+            if bet.bet_type == 'WIN':
+                won = bet.entry.result.finish_position == 1
+                if won:
+                    payout = bet.amount * (bet.entry.result.win_odds + 1)
+            elif bet.bet_type == 'PLACE':
+                won = bet.entry.result.finish_position <= 2
+                if won:
+                    payout = bet.amount * (bet.entry.result.place_odds + 1)
+            elif bet.bet_type == 'SHOW':
+                won = bet.entry.result.finish_position <= 3
+                if won:
+                    payout = bet.amount * (bet.entry.result.show_odds + 1)
+            
+            bet_result = BetResult(
+                bet_id=bet.id,
+                won=won,
+                payout=payout
+            )
+            db.add(bet_result)
+            bet_results_calculated += 1
+    
+    db.commit()
+    
+    # Update daily ROI
+    today = race.race_date
+    daily_roi = db.query(DailyROI).filter(
+        DailyROI.track_id == race.track_id,
+        DailyROI.date == today
+    ).first()
+    
+    if not daily_roi:
+        daily_roi = DailyROI(
+            track_id=race.track_id,
+            date=today,
+            total_wagered=0,
+            total_returned=0,
+            roi_percentage=0
+        )
+        db.add(daily_roi)
+    
+    # Recalculate daily totals
+    daily_bets = load_bets(db, Race.track_id == race.track_id, Race.race_date == today)
+    
+    total_wagered = sum(bet.amount for bet in daily_bets)
+    total_returned = sum(
+        bet.result.payout 
+        for bet in daily_bets 
+        if hasattr(bet, 'result') and bet.result
+    )
+    
+    daily_roi.total_wagered = total_wagered
+    daily_roi.total_returned = total_returned
+    daily_roi.roi_percentage = ((total_returned - total_wagered) / total_wagered * 100) if total_wagered > 0 else 0
+    
+    db.commit()
+    
+    return {
+        "status": "Results logged successfully",
+        "race_id": race_id,
+        "results_logged": results_logged,
+        "bet_results_calculated": bet_results_calculated,
+        "performance": {
+            "total_wagered": total_wagered,
+            "total_returned": total_returned,
+            "roi": daily_roi.roi_percentage
+        }
+    }
+
+
 @app.get("/api/performance/{track_id}")
-async def get_performance_metrics(track_id: int, days: int = 30, db: Session = Depends(get_db)):
+async def get_performance_metrics(track_id: int, days: int = 30, db: AsyncSession = Depends(get_async_read_db)):
     """Get performance metrics for a track"""
+    return await db.run_sync(_performance_metrics, track_id, days)
+
+def _performance_metrics(db: Session, track_id: int, days: int):
     from datetime import timedelta
     
     end_date = date.today()
@@ -857,17 +923,18 @@ async def get_performance_metrics(track_id: int, days: int = 30, db: Session = D
         DailyROI.date <= end_date
     ).order_by(DailyROI.date.desc()).all()
     
+    # Every bet in the period with its result, in one query
+    all_bets = load_bets(db, Race.track_id == track_id, Race.race_date >= start_date)
+    
     # Get win rate by confidence level
     confidence_stats = []
     for conf_level, conf_name in [(0.8, "High"), (0.6, "Medium"), (0.0, "Low")]:
         next_level = 1.0 if conf_level == 0.8 else (0.8 if conf_level == 0.6 else 0.6)
         
-        bets = db.query(Bet).join(Race).filter(
-            Race.track_id == track_id,
-            Race.race_date >= start_date,
-            Bet.confidence >= conf_level,
-            Bet.confidence < next_level
-        ).all()
+        bets = [
+            bet for bet in all_bets
+            if bet.confidence is not None and conf_level <= bet.confidence < next_level
+        ]
         
         total_bets = len(bets)
         winning_bets = sum(1 for bet in bets if hasattr(bet, 'result') and bet.result and bet.result.won)
@@ -880,11 +947,6 @@ async def get_performance_metrics(track_id: int, days: int = 30, db: Session = D
         })
     
     # Calculate overall stats
-    all_bets = db.query(Bet).join(Race).filter(
-        Race.track_id == track_id,
-        Race.race_date >= start_date
-    ).all()
-    
     total_wagered = sum(bet.amount for bet in all_bets)
     total_returned = sum(
         bet.result.payout 
@@ -917,7 +979,7 @@ async def get_performance_metrics(track_id: int, days: int = 30, db: Session = D
 
 # WebSocket endpoint for live odds streaming
 @app.websocket("/ws/odds/{track_id}")
-async def websocket_odds(websocket: WebSocket, track_id: int, db: Session = Depends(get_db)):
+async def websocket_odds(websocket: WebSocket, track_id: int):
     await manager.connect(websocket, track_id)
     try:
         while True:
@@ -934,47 +996,15 @@ async def update_manual_odds(
     race_id: int,
     entry_id: int,
     odds: float,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Manually update odds for a specific entry and broadcast via WebSocket"""
     try:
-        # Update the odds in the database
-        entry = db.query(RaceEntry).filter(
-            RaceEntry.id == entry_id,
-            RaceEntry.race_id == race_id
-        ).first()
-        
-        if not entry:
-            raise HTTPException(status_code=404, detail="Entry not found")
-            
-        # Save old odds for history
-        old_odds = entry.current_odds
-        
-        # Update current odds
-        entry.current_odds = odds
-        
-        # Add to odds history
-        odds_history = OddsHistory(
-            entry_id=entry_id,
-            odds=odds,
-            source='manual'
-        )
-        db.add(odds_history)
+        update = await db.run_sync(_save_manual_odds, race_id, entry_id, odds)
         
-        db.commit()
-        
-        # Get track_id for broadcasting
-        race = db.query(Race).filter(Race.id == race_id).first()
-        if race:
+        if update:
             # Broadcast the update via WebSocket
-            await manager.broadcast_odds(race.track_id, {
-                "type": "odds_update",
-                "race_id": race_id,
-                "entry_id": entry_id,
-                "horse_name": entry.horse.name,
-                "new_odds": odds,
-                "timestamp": datetime.now().isoformat()
-            })
+            await manager.broadcast_odds(update.pop("track_id"), update)
         
         return {
             "status": "success",
@@ -983,27 +1013,65 @@ async def update_manual_odds(
             "new_odds": odds
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+def _save_manual_odds(db: Session, race_id: int, entry_id: int, odds: float):
+    """Store the odds and their history row, returns the WebSocket update for the race's track"""
+    # Update the odds in the database
+    entry = db.query(RaceEntry).filter(
+        RaceEntry.id == entry_id,
+        RaceEntry.race_id == race_id
+    ).first()
+    
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    
+    # Update current odds
+    entry.current_odds = odds
+    
+    # Add to odds history
+    odds_history = OddsHistory(
+        entry_id=entry_id,
+        odds=odds,
+        source='manual'
+    )
+    db.add(odds_history)
+    
+    db.commit()
+    
+    # Get track_id for broadcasting
+    race = db.query(Race).filter(Race.id == race_id).first()
+    if not race:
+        return None
+    return {
+        "track_id": race.track_id,
+        "type": "odds_update",
+        "race_id": race_id,
+        "entry_id": entry_id,
+        "horse_name": entry.horse.name,
+        "new_odds": odds,
+        "timestamp": datetime.now().isoformat()
+    }
+
 
 # Get live odds endpoint
 @app.get("/api/odds/live/{track_id}")
-async def get_live_odds(track_id: int, db: Session = Depends(get_db)):
+async def get_live_odds(track_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """Get current live odds for all races at a track today"""
+    return await db.run_sync(_live_odds, track_id)
+
+def _live_odds(db: Session, track_id: int):
     today = date.today()
     
-    races = db.query(Race).filter(
-        Race.track_id == track_id,
-        Race.race_date == today
-    ).order_by(Race.race_time).all()
+    races = load_race_cards(db, track_id, today)
     
     live_odds = []
     for race in races:
-        entries = db.query(RaceEntry).filter(
-            RaceEntry.race_id == race.id
-        ).order_by(RaceEntry.post_position).all()
+        entries = sorted(race.entries, key=lambda entry: (entry.post_position is None, entry.post_position or 0))
         
         race_odds = {
             "race_id": race.id,
@@ -1028,8 +1096,11 @@ async def get_live_odds(track_id: int, db: Session = Depends(get_db)):
 
 # Get optimal betting recommendations
 @app.get("/api/betting/optimal/{track_id}")
-async def get_optimal_bets(track_id: int, bankroll: float = 1000.0, db: Session = Depends(get_db)):
+async def get_optimal_bets(track_id: int, bankroll: float = 1000.0, db: AsyncSession = Depends(get_async_read_db)):
     """Get optimal Win/Place/Show betting recommendations based on current odds"""
+    return await db.run_sync(_optimal_bets, track_id, bankroll)
+
+def _optimal_bets(db: Session, track_id: int, bankroll: float):
     try:
         from simple_optimal_model import SimpleOptimalBettingModel
         
@@ -1075,85 +1146,91 @@ async def get_optimal_bets(track_id: int, bankroll: float = 1000.0, db: Session
 
 # TEMPORARY: Clear odds data for specific date
 @app.post("/api/admin/clear-odds-0614/{secret_key}")
-async def clear_odds_june_14(secret_key: str, db: Session = Depends(get_db)):
+async def clear_odds_june_14(secret_key: str, db: AsyncSession = Depends(get_async_db)):
     """Temporary endpoint to clear odds data for June 14, 2024"""
     # Simple security check
     if secret_key != "clear-odds-2024-temp":
         raise HTTPException(status_code=403, detail="Invalid secret key")
     
     try:
-        from datetime import date
-        target_date = date(2024, 6, 14)
-        
-        # Find all races for the target date
-        races = db.query(Race).filter(
-            Race.race_date == target_date
+        return await db.run_sync(_clear_odds, date(2024, 6, 14))
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error clearing odds data: {str(e)}")
+
+def _clear_odds(db: Session, target_date: date) -> dict:
+    # Find all races for the target date
+    races = db.query(Race).filter(
+        Race.race_date == target_date
+    ).all()
+    
+    if not races:
+        return {"status": "error", "message": f"No races found for {target_date}"}
+    
+    # Counter for affected records
+    entries_cleared = 0
+    history_deleted = 0
+    race_details = []
+    
+    for race in races:
+        # Clear current_odds from race entries
+        entries = db.query(RaceEntry).filter(
+            RaceEntry.race_id == race.id,
+            RaceEntry.current_odds.isnot(None)
         ).all()
         
-        if not races:
-            return {"status": "error", "message": f"No races found for {target_date}"}
-        
-        # Counter for affected records
-        entries_cleared = 0
-        history_deleted = 0
-        race_details = []
-        
-        for race in races:
-            # Clear current_odds from race entries
-            entries = db.query(RaceEntry).filter(
-                RaceEntry.race_id == race.id,
-                RaceEntry.current_odds.isnot(None)
-            ).all()
-            
-            race_entries_cleared = 0
-            for entry in entries:
-                entry.current_odds = None
-                entries_cleared += 1
-                race_entries_cleared += 1
+        race_entries_cleared = 0
+        for entry in entries:
+            entry.current_odds = None
+            entries_cleared += 1
+            race_entries_cleared += 1
+        
+        # Delete odds history for this race's entries
+        entry_ids = [e.id for e in db.query(RaceEntry).filter(RaceEntry.race_id == race.id).all()]
+        race_history_deleted = 0
+        if entry_ids:
+            history_count = db.query(OddsHistory).filter(
+                OddsHistory.entry_id.in_(entry_ids)
+            ).count()
             
-            # Delete odds history for this race's entries
-            entry_ids = [e.id for e in db.query(RaceEntry).filter(RaceEntry.race_id == race.id).all()]
-            race_history_deleted = 0
-            if entry_ids:
-                history_count = db.query(OddsHistory).filter(
+            if history_count > 0:
+                db.query(OddsHistory).filter(
                     OddsHistory.entry_id.in_(entry_ids)
-                ).count()
-                
-                if history_count > 0:
-                    db.query(OddsHistory).filter(
-                        OddsHistory.entry_id.in_(entry_ids)
-                    ).delete(synchronize_session=False)
-                    history_deleted += history_count
-                    race_history_deleted = history_count
-            
-            race_details.append({
-                "race_id": race.id,
-                "track_id": race.track_id,
-                "race_number": race.race_number,
-                "entries_cleared": race_entries_cleared,
-                "history_deleted": race_history_deleted
-            })
-        
-        # Commit the changes
-        db.commit()
-        
-        return {
-            "status": "success",
-            "message": f"Successfully cleared odds data for {target_date}",
-            "summary": {
-                "total_races": len(races),
-                "entries_cleared": entries_cleared,
-                "history_deleted": history_deleted
-            },
-            "race_details": race_details
-        }
+                ).delete(synchronize_session=False)
+                history_deleted += history_count
+                race_history_deleted = history_count
         
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error clearing odds data: {str(e)}")
+        race_details.append({
+            "race_id": race.id,
+            "track_id": race.track_id,
+            "race_number": race.race_number,
+            "entries_cleared": race_entries_cleared,
+            "history_deleted": race_history_deleted
+        })
+    
+    # Commit the changes
+    db.commit()
+    
+    return {
+        "status": "success",
+        "message": f"Successfully cleared odds data for {target_date}",
+        "summary": {
+            "total_races": len(races),
+            "entries_cleared": entries_cleared,
+            "history_deleted": history_deleted
+        },
+        "race_details": race_details
+    }
 
 
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    import sys
+    
+    if "--worker" in sys.argv:
+        # Drain the sync_tasks queue instead of serving HTTP
+        from task_queue import run_worker
+        asyncio.run(run_worker())
+    else:
+        import uvicorn
+        port = int(os.getenv("PORT", 8000))
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -1,113 +1,496 @@
 import httpx
+import asyncio
+import json
 import os
+import time
+import logging
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 import base64
+import hashlib
+from pathlib import Path
 from dotenv import load_dotenv
 
+from api_telemetry import ApiTelemetry
+from track_registry import track_registry
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Token-bucket rate limiter: allows `rate` requests per second with bursts up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> float:
+        """Take a token, returns the seconds spent waiting for it"""
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - started
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def recording_path(directory: str, path: str, params) -> Path:
+    """File a response to `path` with query `params` is recorded to, shared with the fake server for replay"""
+    query = sorted((str(k), str(v)) for k, v in (params.items() if hasattr(params, 'items') else params or []))
+    digest = hashlib.sha1(json.dumps(query).encode()).hexdigest()[:12]
+    name = path.strip('/').replace('/', '_') or 'root'
+    return Path(directory) / f"{name}__{digest}.json"
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Saves every upstream response to disk so it can be replayed by fake_racing_api"""
+    
+    def __init__(self, directory: str, transport: httpx.AsyncBaseTransport):
+        self.directory = directory
+        self.transport = transport
+        Path(directory).mkdir(parents=True, exist_ok=True)
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        
+        try:
+            document = json.loads(body)
+        except ValueError:
+            document = body.decode(errors='replace')
+        
+        path = recording_path(self.directory, request.url.path, request.url.params.multi_items())
+        path.write_text(json.dumps({
+            "path": request.url.path,
+            "params": request.url.params.multi_items(),
+            "status": response.status_code,
+            "body": document
+        }))
+        
+        # The body is already decoded, so drop the encoding headers from the replayed response
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')]
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+    
+    async def aclose(self):
+        await self.transport.aclose()
+
+class _StreamReader:
+    """File-like adapter letting ijson read an httpx response body as it arrives"""
+    
+    def __init__(self, response: httpx.Response):
+        self._chunks = response.aiter_bytes()
+        self._buffer = b""
+        self.bytes = 0
+    
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes with read(0) and discards the result
+        if size == 0:
+            return b""
+        if size < 0:
+            # read() / read(-1): everything left in the body
+            parts = [self._buffer]
+            async for chunk in self._chunks:
+                self.bytes += len(chunk)
+                parts.append(chunk)
+            self._buffer = b""
+            return b"".join(parts)
+        if not self._buffer:
+            async for chunk in self._chunks:
+                if chunk:
+                    self.bytes += len(chunk)
+                    self._buffer = chunk
+                    break
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
 class RacingAPIClient:
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.base_url = os.getenv("RACING_API_BASE_URL", "https://api.theracingapi.com")
         self.username = os.getenv("RACING_API_USERNAME")
         self.password = os.getenv("RACING_API_PASSWORD")
         self.auth_header = self._create_auth_header()
         
+        # Connection pool settings for the shared HTTP client
+        self.http2 = os.getenv("RACING_API_HTTP2", "false").lower() in ("1", "true", "yes")
+        self.max_connections = int(os.getenv("RACING_API_MAX_CONNECTIONS", "20"))
+        self.max_keepalive_connections = int(os.getenv("RACING_API_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry = float(os.getenv("RACING_API_KEEPALIVE_EXPIRY", "30"))
+        self.timeout = float(os.getenv("RACING_API_TIMEOUT", "30"))
+        self.connect_timeout = float(os.getenv("RACING_API_CONNECT_TIMEOUT", "10"))
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        # Custom transport, e.g. httpx.ASGITransport(app=fake_racing_api.app) for offline load tests
+        self.transport = transport
+        # Save every response under this directory for replay by the fake server
+        self.record_dir = os.getenv("RACING_API_RECORD_DIR")
+        
+        # Resolved meet cache: (date, internal track code) -> (expires_at, meet_id, api track code, debug)
+        self.meet_cache_ttl = float(os.getenv("RACING_API_MEET_CACHE_TTL", "3600"))
+        self.meet_negative_ttl = float(os.getenv("RACING_API_MEET_NEGATIVE_TTL", "300"))
+        self._meet_cache: Dict[tuple, tuple] = {}
+        
+        # Whole-card entries cache: (date, internal track code) -> (fetched_at, meet entries, entries by race number)
+        self.card_cache_ttl = float(os.getenv("RACING_API_CARD_CACHE_TTL", "120"))
+        self._card_cache: Dict[tuple, tuple] = {}
+        
+        # In-flight upstream requests keyed by (path, params), shared by concurrent callers
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        
+        # Upstream quota, shared by every request made through this client (0 disables limiting)
+        rate_limit = float(os.getenv("RACING_API_RATE_LIMIT", "5"))
+        rate_burst = float(os.getenv("RACING_API_RATE_BURST", "10"))
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst) if rate_limit > 0 else None
+        
+        # Retries for 429, 5xx and transport errors, backing off base * 2^attempt seconds unless Retry-After says otherwise
+        self.max_retries = int(os.getenv("RACING_API_MAX_RETRIES", "2"))
+        self.retry_backoff = float(os.getenv("RACING_API_RETRY_BACKOFF", "0.5"))
+        
+        # Per-endpoint calls, latency, bytes, status codes and retries
+        self.telemetry = ApiTelemetry(rate_limit)
+        
+        # Parse meet entries/results incrementally instead of building whole documents (needs ijson)
+        self.streaming = os.getenv("RACING_API_STREAMING", "false").lower() in ("1", "true", "yes")
+        
     def _create_auth_header(self):
         credentials = f"{self.username}:{self.password}"
         encoded = base64.b64encode(credentials.encode()).decode()
         return {"Authorization": f"Basic {encoded}"}
     
-    async def get_tracks(self):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/v1/tracks",
-                headers=self.auth_header
+    async def open(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP client if it isn't open yet"""
+        if self._client is None or self._client.is_closed:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("RACING_API_HTTP2 is set but the 'h2' package is not installed, using HTTP/1.1")
+                    http2 = False
+            
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
             )
-            response.raise_for_status()
-            return response.json()
+            transport = self.transport
+            if self.record_dir:
+                # Pool settings go on the wrapped transport, the client ignores them once a transport is given
+                transport = RecordingTransport(
+                    self.record_dir,
+                    transport or httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+                )
+            
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.auth_header,
+                http2=http2,
+                limits=limits,
+                transport=transport,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+        return self._client
     
-    async def get_races_by_date(self, track_code: str, race_date: date):
-        # Map internal track codes to API track codes with fallbacks
-        track_map = {
-            'FM': ['FMT', 'FP'],  # Fair Meadows -> try Fair Meadows Tulsa, then Fairmount Park
-            'RP': ['RP']    # Remington Park stays the same
-        }
+    async def aclose(self):
+        """Close the pooled HTTP client and release its connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def __aenter__(self):
+        await self.open()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def _get(self, path: str, params: Optional[Dict] = None) -> httpx.Response:
+        # Single-flight: identical concurrent requests share one upstream call
+        key = (path, tuple(sorted((params or {}).items())))
         
-        possible_codes = track_map.get(track_code, [track_code])
-        if isinstance(possible_codes, str):
-            possible_codes = [possible_codes]
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._fetch(path, params))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
         
-        async with httpx.AsyncClient() as client:
-            # First, get list of meets to find the meet_id for this track/date
-            target_date = race_date.strftime('%Y-%m-%d')
-            meets_response = await client.get(
-                f"{self.base_url}/v1/north-america/meets",
-                headers=self.auth_header,
-                params={
-                    'start_date': target_date,
-                    'end_date': target_date
-                }
-            )
-            meets_response.raise_for_status()
-            meets_data = meets_response.json()
-            
-            # Debug: log all meets to help troubleshoot
-            all_track_ids = [meet.get('track_id', '') for meet in meets_data.get('meets', [])]
-            all_tracks_info = [(meet.get('track_id', ''), meet.get('track_name', '')) for meet in meets_data.get('meets', [])]
-            
-            # Try each possible track code
-            meet_id = None
-            used_track_code = None
+        # Shield so one caller being cancelled doesn't cancel the call for everyone else
+        return await asyncio.shield(inflight)
+    
+    async def _throttle(self):
+        if self.rate_limiter:
+            waited = await self.rate_limiter.acquire()
+            if waited > 0:
+                self.telemetry.record_rate_limit_wait(waited * 1000)
+    
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response] = None) -> Optional[float]:
+        """Seconds to wait before retrying, None when the attempt shouldn't be retried"""
+        if attempt >= self.max_retries:
+            return None
+        if response is not None:
+            if response.status_code != 429 and response.status_code < 500:
+                return None
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        return self.retry_backoff * (2 ** attempt)
+    
+    async def _fetch(self, path: str, params: Optional[Dict] = None) -> httpx.Response:
+        client = await self.open()
+        attempt = 0
+        while True:
+            await self._throttle()
+            started = time.monotonic()
+            try:
+                response = await client.get(path, params=params)
+            except httpx.TransportError:
+                self.telemetry.record(path, None, (time.monotonic() - started) * 1000)
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                self.telemetry.record(path, response.status_code, (time.monotonic() - started) * 1000,
+                                      len(response.content))
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
+                    response.raise_for_status()
+                    return response
             
-            for api_track_code in possible_codes:
-                for meet in meets_data.get('meets', []):
-                    if meet.get('track_id') == api_track_code and meet.get('date') == target_date:
-                        meet_id = meet.get('meet_id')
-                        used_track_code = api_track_code
-                        break
-                if meet_id:
+            self.telemetry.record_retry(path)
+            attempt += 1
+            await asyncio.sleep(delay)
+    
+    async def _stream_items(self, path: str, prefixes: Tuple[str, ...], params: Optional[Dict] = None) -> AsyncIterator[Tuple[str, object]]:
+        """Yield (prefix, item) for each array item under the given ijson prefixes (e.g. 'results.item')
+        while the body is still downloading. Streams bypass single-flight and the caches."""
+        try:
+            import ijson
+        except ImportError:
+            ijson = None
+        
+        client = await self.open()
+        attempt = 0
+        while True:
+            await self._throttle()
+            started = time.monotonic()
+            try:
+                response = await client.send(client.build_request("GET", path, params=params), stream=True)
+            except httpx.TransportError:
+                self.telemetry.record(path, None, (time.monotonic() - started) * 1000)
+                delay = self._retry_delay(attempt)
+                if delay is None:
+                    raise
+            else:
+                # Only failed statuses are retried, once the body is being read the stream is committed to
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
                     break
+                await response.aread()
+                await response.aclose()
+                self.telemetry.record(path, response.status_code, (time.monotonic() - started) * 1000,
+                                      len(response.content))
             
-            if not meet_id:
-                # Return debug info when no meet found
-                return {
-                    "entries": [],
-                    "debug": {
-                        "looking_for": possible_codes,
-                        "found_tracks": all_track_ids,
-                        "found_tracks_detail": all_tracks_info,
-                        "date": target_date
-                    }
-                }
+            self.telemetry.record_retry(path)
+            attempt += 1
+            await asyncio.sleep(delay)
+        
+        # Latency of a stream covers the whole body download
+        reader = _StreamReader(response)
+        try:
+            response.raise_for_status()
             
-            # Now get the entries for this meet (which contains race info)
-            entries_response = await client.get(
-                f"{self.base_url}/v1/north-america/meets/{meet_id}/entries",
-                headers=self.auth_header
-            )
-            entries_response.raise_for_status()
-            result = entries_response.json()
+            if ijson is None:
+                # Same items from a full parse when ijson isn't installed
+                body = await response.aread()
+                reader.bytes = len(body)
+                document = json.loads(body)
+                for prefix in prefixes:
+                    items = document
+                    for key in prefix.split('.')[:-1]:
+                        items = items.get(key, []) if isinstance(items, dict) else []
+                    for item in items:
+                        yield prefix, item
+                return
             
-            # Add debug info about which track code worked
-            if 'debug' not in result:
-                result['debug'] = {}
-            result['debug']['used_track_code'] = used_track_code
-            result['debug']['tried_codes'] = possible_codes
+            builder, current = None, None
+            async for prefix, event, value in ijson.parse_async(reader, use_float=True):
+                if builder is None:
+                    if prefix in prefixes:
+                        if event in ('start_map', 'start_array'):
+                            builder, current = ijson.ObjectBuilder(), prefix
+                            builder.event(event, value)
+                        else:
+                            yield prefix, value
+                    continue
+                
+                builder.event(event, value)
+                if prefix == current and event in ('end_map', 'end_array'):
+                    yield current, builder.value
+                    builder = None
+        finally:
+            await response.aclose()
+            self.telemetry.record(path, response.status_code, (time.monotonic() - started) * 1000, reader.bytes)
+    
+    async def _races_from_stream(self, items: AsyncIterator[Tuple[str, object]]) -> AsyncIterator[Tuple[int, list]]:
+        """Group streamed items into (race_number, items): 'races' items are whole races,
+        flat entries/results are batched while consecutive items share a race number"""
+        current, batch = None, []
+        async for prefix, item in items:
+            if prefix == 'races.item':
+                race_key = item.get('race_key', {})
+                race_num = race_key.get('race_number') if isinstance(race_key, dict) else item.get('race_number')
+                if race_num is not None:
+                    # Fair Meadows uses 'runners' instead of 'entries'
+                    yield int(race_num), item.get('entries', []) or item.get('runners', [])
+                continue
             
-            return result
+            race_num = item.get('race_number')
+            if race_num is None:
+                continue
+            if current is not None and int(race_num) != current:
+                yield current, batch
+                batch = []
+            current = int(race_num)
+            batch.append(item)
+        
+        if batch:
+            yield current, batch
     
-    async def get_race_entries(self, track_code: str, race_date: date, race_number: int):
-        # This method now gets entries for a specific race from the meet entries
-        # We'll get all meet entries and filter for the specific race
-        race_data = await self.get_races_by_date(track_code, race_date)
+    async def _resolve_meet(self, track_code: str, race_date: date):
+        """Find the meet_id for a track/date, returns (meet_id, used_track_code, debug)"""
+        target_date = race_date.strftime('%Y-%m-%d')
+        cache_key = (target_date, track_code)
+        
+        cached = self._meet_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2], cached[3]
+        
+        # API track codes come from the track registry
+        possible_codes = track_registry.api_codes(track_code)
+        
+        # Get list of meets to find the meet_id for this track/date
+        meets_response = await self._get(
+            "/v1/north-america/meets",
+            params={
+                'start_date': target_date,
+                'end_date': target_date
+            }
+        )
+        meets_data = meets_response.json()
+        
+        # Try each possible track code
+        meet_id = None
+        used_track_code = None
+        
+        for api_track_code in possible_codes:
+            for meet in meets_data.get('meets', []):
+                if meet.get('track_id') == api_track_code and meet.get('date') == target_date:
+                    meet_id = meet.get('meet_id')
+                    used_track_code = api_track_code
+                    break
+            if meet_id:
+                break
+        
+        if meet_id:
+            debug = {"tried_codes": possible_codes}
+            ttl = self.meet_cache_ttl
+        else:
+            # Keep debug info to help troubleshoot when no meet found
+            debug = {
+                "looking_for": possible_codes,
+                "found_tracks": [meet.get('track_id', '') for meet in meets_data.get('meets', [])],
+                "found_tracks_detail": [(meet.get('track_id', ''), meet.get('track_name', '')) for meet in meets_data.get('meets', [])],
+                "date": target_date
+            }
+            # Negative cache "no meet today" for a shorter window
+            ttl = self.meet_negative_ttl
+        
+        self._meet_cache[cache_key] = (time.monotonic() + ttl, meet_id, used_track_code, debug)
+        return meet_id, used_track_code, debug
+    
+    def invalidate_meet_cache(self, track_code: Optional[str] = None, race_date: Optional[date] = None):
+        """Drop cached meet lookups, optionally only for one track and/or date"""
+        target_date = race_date.strftime('%Y-%m-%d') if race_date else None
+        for key in list(self._meet_cache):
+            if (target_date is None or key[0] == target_date) and (track_code is None or key[1] == track_code):
+                del self._meet_cache[key]
+    
+    async def get_meets(self, start_date: date, end_date: date) -> List[dict]:
+        """Every meet in a date range"""
+        response = await self._get(
+            "/v1/north-america/meets",
+            params={
+                'start_date': start_date.strftime('%Y-%m-%d'),
+                'end_date': end_date.strftime('%Y-%m-%d')
+            }
+        )
+        return response.json().get('meets', [])
+    
+    def remember_meet(self, track_code: str, race_date: date, meet_id: str, used_track_code: str):
+        """Seed the meet cache from an already fetched meets list"""
+        debug = {"tried_codes": track_registry.api_codes(track_code)}
+        self._meet_cache[(race_date.strftime('%Y-%m-%d'), track_code)] = (
+            time.monotonic() + self.meet_cache_ttl, meet_id, used_track_code, debug
+        )
+    
+    async def get_tracks(self):
+        response = await self._get("/v1/tracks")
+        return response.json()
+    
+    async def get_races_by_date(self, track_code: str, race_date: date, refresh: bool = False):
+        card = await self._get_card(track_code, race_date, refresh)
+        return card[1]
+    
+    async def _get_card(self, track_code: str, race_date: date, refresh: bool = False):
+        """Fetch the meet entries once and serve them from memory within the freshness window"""
+        cache_key = (race_date.strftime('%Y-%m-%d'), track_code)
+        
+        cached = self._card_cache.get(cache_key)
+        if cached and not refresh and time.monotonic() - cached[0] < self.card_cache_ttl:
+            return cached
+        
+        meet_id, used_track_code, debug = await self._resolve_meet(track_code, race_date)
+        
+        if not meet_id:
+            # Return debug info when no meet found
+            return (time.monotonic(), {"entries": [], "debug": dict(debug)}, {})
+        
+        # Now get the entries for this meet (which contains race info)
+        entries_response = await self._get(f"/v1/north-america/meets/{meet_id}/entries")
+        result = entries_response.json()
+        
+        # Add debug info about which track code worked
+        if 'debug' not in result:
+            result['debug'] = {}
+        result['debug']['used_track_code'] = used_track_code
+        result['debug']['tried_codes'] = debug['tried_codes']
+        
+        card = (time.monotonic(), result, self._index_card(result))
+        self._card_cache[cache_key] = card
+        return card
+    
+    async def get_meet_card(self, track_code: str, race_date: date, refresh: bool = False):
+        """Meet entries document plus its entries indexed by race number"""
+        _, result, by_race = await self._get_card(track_code, race_date, refresh)
+        return result, by_race
+    
+    def _index_card(self, race_data: dict) -> Dict[int, list]:
+        """Index meet entries by race number"""
+        by_race: Dict[int, list] = {}
         
         # Handle both 'entries' and 'races' formats
         if 'races' in race_data and 'entries' not in race_data:
-            # For 'races' format, find the specific race and get its entries
-            debug_info = []
-            for i, race in enumerate(race_data.get('races', [])):
+            for race in race_data.get('races', []):
                 # Extract race number from race_key if needed
                 race_key = race.get('race_key', {})
                 if isinstance(race_key, dict):
@@ -115,118 +498,131 @@ class RacingAPIClient:
                 else:
                     race_num = race.get('race_number')
                 
-                debug_info.append(f"Race {i+1}: race_num={race_num} (type: {type(race_num)}), looking_for={race_number} (type: {type(race_number)})")
-                
-                # Ensure both are the same type for comparison
-                if race_num is not None and int(race_num) == int(race_number):
+                if race_num is not None:
                     # Fair Meadows uses 'runners' instead of 'entries'
-                    entries = race.get('entries', []) or race.get('runners', [])
-                    debug_info.append(f"MATCH! Found {len(entries)} entries/runners")
-                    return {"entries": entries, "debug": debug_info}
-            
-            return {"entries": [], "debug": debug_info}  # No matching race found
+                    by_race[int(race_num)] = race.get('entries', []) or race.get('runners', [])
         else:
-            # For 'entries' format, filter by race number
-            race_entries = []
             for entry in race_data.get('entries', []):
-                if entry.get('race_number') == race_number:
-                    race_entries.append(entry)
-            
-            return {"entries": race_entries}
+                race_num = entry.get('race_number')
+                if race_num is not None:
+                    by_race.setdefault(int(race_num), []).append(entry)
+        
+        return by_race
     
-    async def get_race_results(self, track_code: str, race_date: date, race_number: int):
-        # Map internal track codes to API track codes with fallbacks
-        track_map = {
-            'FM': ['FMT', 'FP'],  # Fair Meadows -> try Fair Meadows Tulsa, then Fairmount Park
-            'RP': ['RP']    # Remington Park stays the same
+    def invalidate_card_cache(self, track_code: Optional[str] = None, race_date: Optional[date] = None):
+        """Drop cached meet cards, optionally only for one track and/or date"""
+        target_date = race_date.strftime('%Y-%m-%d') if race_date else None
+        for key in list(self._card_cache):
+            if (target_date is None or key[0] == target_date) and (track_code is None or key[1] == track_code):
+                del self._card_cache[key]
+    
+    async def get_race_entries(self, track_code: str, race_date: date, race_number: int, refresh: bool = False):
+        # Serve a single race from the cached meet card, pass refresh=True to force a reload (e.g. odds updates)
+        _, _, by_race = await self._get_card(track_code, race_date, refresh)
+        entries = by_race.get(int(race_number), [])
+        
+        return {
+            "entries": entries,
+            "debug": [f"Card has races {sorted(by_race)}, found {len(entries)} entries/runners for race {race_number}"]
         }
+    
+    async def get_meet_results(self, track_code: str, race_date: date):
+        """Results document for the whole meet, None if there is no meet or no results yet"""
+        try:
+            meet_id, _, _ = await self._resolve_meet(track_code, race_date)
+            
+            if not meet_id:
+                return None  # No meet found for this track/date
+            
+            # Get results for this meet
+            results_response = await self._get(f"/v1/north-america/meets/{meet_id}/results")
+            return results_response.json()
+            
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+    
+    async def stream_meet_entries(self, track_code: str, race_date: date) -> AsyncIterator[Tuple[int, list]]:
+        """Yield (race_number, entries) one race at a time as the meet entries are parsed.
+        A race can be yielded more than once if the API doesn't list its entries together."""
+        meet_id, _, _ = await self._resolve_meet(track_code, race_date)
+        if not meet_id:
+            return
         
-        possible_codes = track_map.get(track_code, [track_code])
-        if isinstance(possible_codes, str):
-            possible_codes = [possible_codes]
+        items = self._stream_items(f"/v1/north-america/meets/{meet_id}/entries", ('entries.item', 'races.item'))
+        async for race_number, entries in self._races_from_stream(items):
+            yield race_number, entries
+    
+    async def stream_meet_results(self, track_code: str, race_date: date) -> AsyncIterator[Tuple[int, list]]:
+        """Yield (race_number, results) one race at a time as the meet results are parsed, nothing if there are none"""
+        meet_id, _, _ = await self._resolve_meet(track_code, race_date)
+        if not meet_id:
+            return
         
-        async with httpx.AsyncClient() as client:
+        try:
+            items = self._stream_items(f"/v1/north-america/meets/{meet_id}/results", ('results.item',))
+            async for race_number, results in self._races_from_stream(items):
+                yield race_number, results
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return
+            raise
+    
+    async def get_race_results(self, track_code: str, race_date: date, race_number: int):
+        if self.streaming:
+            # None when there's no meet or no results yet, like get_meet_results below
+            meet_id, _, _ = await self._resolve_meet(track_code, race_date)
+            if not meet_id:
+                return None
+            
+            # Keep only the requested race's results while the meet document streams past
+            race_results = []
             try:
-                # First, get list of meets to find the meet_id for this track/date
-                target_date = race_date.strftime('%Y-%m-%d')
-                meets_response = await client.get(
-                    f"{self.base_url}/v1/north-america/meets",
-                    headers=self.auth_header,
-                    params={
-                        'start_date': target_date,
-                        'end_date': target_date
-                    }
-                )
-                meets_response.raise_for_status()
-                meets_data = meets_response.json()
-                
-                # Try each possible track code
-                meet_id = None
-                
-                for api_track_code in possible_codes:
-                    for meet in meets_data.get('meets', []):
-                        if meet.get('track_id') == api_track_code and meet.get('date') == target_date:
-                            meet_id = meet.get('meet_id')
-                            break
-                    if meet_id:
-                        break
-                
-                if not meet_id:
-                    return None  # No meet found for this track/date
-                
-                # Get results for this meet
-                results_response = await client.get(
-                    f"{self.base_url}/v1/north-america/meets/{meet_id}/results",
-                    headers=self.auth_header
-                )
-                results_response.raise_for_status()
-                results_data = results_response.json()
-                
-                # Filter results for the specific race number
-                race_results = []
-                for result in results_data.get('results', []):
-                    if result.get('race_number') == race_number:
-                        race_results.append(result)
-                
-                return {"results": race_results}
-                
+                items = self._stream_items(f"/v1/north-america/meets/{meet_id}/results", ('results.item',))
+                async for number, results in self._races_from_stream(items):
+                    if number == race_number:
+                        race_results.extend(results)
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 404:
                     return None
                 raise
+            return {"results": race_results}
+        
+        results_data = await self.get_meet_results(track_code, race_date)
+        if results_data is None:
+            return None
+        
+        # Filter results for the specific race number
+        race_results = []
+        for result in results_data.get('results', []):
+            if result.get('race_number') == race_number:
+                race_results.append(result)
+        
+        return {"results": race_results}
     
     async def get_horse_history(self, registration_number: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/v1/horses/{registration_number}/history",
-                headers=self.auth_header
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._get(f"/v1/horses/{registration_number}/history")
+        return response.json()
     
     async def get_jockey_stats(self, jockey_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/v1/jockeys/{jockey_id}/stats",
-                headers=self.auth_header
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._get(f"/v1/jockeys/{jockey_id}/stats")
+        return response.json()
     
     async def get_trainer_stats(self, trainer_id: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/v1/trainers/{trainer_id}/stats",
-                headers=self.auth_header
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._get(f"/v1/trainers/{trainer_id}/stats")
+        return response.json()
     
     async def get_track_conditions(self, track_code: str, race_date: date):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/v1/conditions/{track_code}/{race_date.strftime('%Y-%m-%d')}",
-                headers=self.auth_header
-            )
-            response.raise_for_status()
-            return response.json()
\ No newline at end of file
+        response = await self._get(f"/v1/conditions/{track_code}/{race_date.strftime('%Y-%m-%d')}")
+        return response.json()
+
+
+# Shared client instance, created lazily and owned by the FastAPI lifespan
+_api_client: Optional[RacingAPIClient] = None
+
+def get_api_client() -> RacingAPIClient:
+    global _api_client
+    if _api_client is None:
+        _api_client = RacingAPIClient()
+    return _api_client
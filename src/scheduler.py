@@ -1,21 +1,40 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime, timedelta, date
-import asyncio
-from sqlalchemy.orm import Session
-from database import get_db, Race, Bet, BetResult, DailyROI, Track
+import os
+from typing import Dict, Set
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from database import get_async_session_local, load_bets, Race, Bet, BetResult, DailyROI
 from data_sync import DataSync
-from betting_engine import BettingEngine
+from betting_engine import BettingEngine, score_race
+from racing_api import RacingAPIClient, get_api_client
+from task_queue import enqueue_task
+from track_registry import track_registry
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class RaceScheduler:
-    def __init__(self):
+    def __init__(self, api_client: RacingAPIClient = None):
         self.scheduler = AsyncIOScheduler()
-        self.data_sync = DataSync()
+        self.api_client = api_client or get_api_client()
+        self.data_sync = DataSync(self.api_client)
+        
+        # Adaptive odds polling: (time to post above, seconds between polls), tightening toward post time
+        self.poll_cadence = [
+            (timedelta(minutes=15), 300),
+            (timedelta(minutes=5), 60),
+            (timedelta(0), 20)
+        ]
+        self.poll_window = timedelta(minutes=int(os.getenv("ODDS_POLL_WINDOW_MINUTES", "60")))
+        self.poll_tick_seconds = int(os.getenv("ODDS_POLL_TICK_SECONDS", "10"))
+        self.next_poll: Dict[int, datetime] = {}
+        self.races_off: Set[int] = set()
         
     async def initialize(self):
         # Schedule daily 8 AM sync
@@ -39,21 +58,19 @@ class RaceScheduler:
         
     async def run_initial_sync(self):
         logger.info("Running 8 AM initial sync")
-        db = next(get_db())
-        try:
+        async with get_async_session_local()() as db:
             await self.data_sync.sync_initial_data(db)
-            await self.schedule_race_syncs()
-        finally:
-            db.close()
+        await self.schedule_race_syncs()
             
     async def schedule_race_syncs(self):
         """Schedule pre-race syncs based on today's races"""
-        db = next(get_db())
-        try:
+        async with get_async_session_local()() as db:
             today = date.today()
             
             # Get all races for today
-            races = db.query(Race).filter(Race.race_date == today).order_by(Race.race_time).all()
+            races = (await db.scalars(
+                select(Race).filter(Race.race_date == today).order_by(Race.race_time)
+            )).all()
             
             if races:
                 # Schedule 1 hour before first race
@@ -69,19 +86,15 @@ class RaceScheduler:
                     )
                     logger.info(f"Scheduled pre-race sync at {pre_race_time}")
                 
-                # Schedule 10 minutes before each race
-                for race in races:
-                    update_time = race.race_time - timedelta(minutes=10)
-                    
-                    if update_time > datetime.now():
-                        self.scheduler.add_job(
-                            self.run_race_update,
-                            DateTrigger(run_date=update_time),
-                            args=[race.id],
-                            id=f'race_update_{race.id}',
-                            replace_existing=True
-                        )
-                        logger.info(f"Scheduled update for race {race.race_number} at {update_time}")
+                # Poll odds for every race, more often as post time nears
+                if races[-1].race_time > datetime.now():
+                    self.scheduler.add_job(
+                        self.poll_odds,
+                        IntervalTrigger(seconds=self.poll_tick_seconds),
+                        id='odds_poll',
+                        replace_existing=True
+                    )
+                    logger.info(f"Scheduled odds polling every {self.poll_tick_seconds}s until {races[-1].race_time}")
                         
                 last_race_time = races[-1].race_time + timedelta(minutes=30)
                 self.scheduler.add_job(
@@ -90,31 +103,90 @@ class RaceScheduler:
                     id='daily_results',
                     replace_existing=True
                 )
-                
-        finally:
-            db.close()
             
     async def run_pre_race_sync(self):
         logger.info("Running pre-race sync")
-        db = next(get_db())
-        try:
+        async with get_async_session_local()() as db:
             await self.data_sync.sync_pre_race_data(db)
             await self.generate_daily_recommendations(db)
-        finally:
-            db.close()
-            
-    async def run_race_update(self, race_id: int):
-        logger.info(f"Running race update for race {race_id}")
-        db = next(get_db())
-        try:
-            await self.data_sync.sync_race_updates(db, race_id)
-            await self.generate_race_recommendations(db, race_id)
-        finally:
-            db.close()
-            
-    async def generate_daily_recommendations(self, db: Session):
-        
-        engine = BettingEngine(db)
+            
+    def _poll_interval(self, time_to_post: timedelta) -> int:
+        for threshold, seconds in self.poll_cadence:
+            if time_to_post > threshold:
+                return seconds
+        return self.poll_cadence[-1][1]
+    
+    async def poll_odds(self):
+        """Refresh odds for races that are due, sharing one card fetch per track, and re-score races whose odds moved"""
+        now = datetime.now()
+        today = date.today()
+        async with get_async_session_local()() as db:
+            races = (await db.scalars(
+                select(Race).options(joinedload(Race.track)).filter(Race.race_date == today)
+            )).all()
+            
+            # Drop poll state for races of earlier days
+            today_ids = {race.id for race in races}
+            self.races_off &= today_ids
+            self.next_poll = {race_id: at for race_id, at in self.next_poll.items() if race_id in today_ids}
+            
+            due_by_track = {}
+            off_tracks = {}
+            for race in races:
+                if race.race_time <= now:
+                    # Race has gone off, stop polling it and pick up results at its track
+                    if race.id not in self.races_off:
+                        self.races_off.add(race.id)
+                        self.next_poll.pop(race.id, None)
+                        off_tracks[race.track_id] = race.track
+                    continue
+                
+                time_to_post = race.race_time - now
+                if time_to_post > self.poll_window:
+                    continue
+                
+                next_at = self.next_poll.get(race.id)
+                if next_at is None or next_at <= now:
+                    due_by_track.setdefault(race.track_id, []).append(race)
+                    self.next_poll[race.id] = now + timedelta(seconds=self._poll_interval(time_to_post))
+            
+            if self.data_sync.use_task_queue:
+                # Workers pick these up; refresh tasks queue re-scoring for races whose odds moved
+                await db.run_sync(self._enqueue_poll_tasks, today, due_by_track, off_tracks)
+                await db.commit()
+                due_by_track, off_tracks = {}, {}
+            
+            for track_races in due_by_track.values():
+                track = track_races[0].track
+                moved = await self.data_sync.refresh_odds(db, track, today, track_races)
+                logger.info(f"Polled odds for {len(track_races)} races at {track.name}, {len(moved)} moved")
+                
+                for race_id in moved:
+                    await self.generate_race_recommendations(db, race_id)
+            
+            for track in off_tracks.values():
+                await self.data_sync.ingest_meet_results(db, track, today)
+                await db.commit()
+            
+            if not any(race.race_time > now for race in races):
+                self.scheduler.remove_job('odds_poll')
+                logger.info("All races are off, odds polling stopped")
+    
+    def _enqueue_poll_tasks(self, db: Session, today: date, due_by_track: dict, off_tracks: dict):
+        for track_id, track_races in due_by_track.items():
+            race_ids = sorted(race.id for race in track_races)
+            enqueue_task(db, "refresh_odds",
+                         {"track_id": track_id, "race_date": today.isoformat(), "race_ids": race_ids},
+                         dedupe_key=f"refresh_odds:{track_id}:{','.join(map(str, race_ids))}")
+        for track_id in off_tracks:
+            enqueue_task(db, "ingest_results", {"track_id": track_id, "race_date": today.isoformat()},
+                         dedupe_key=f"ingest_results:{track_id}:{today}")
+            
+    async def generate_daily_recommendations(self, db: AsyncSession):
+        await db.run_sync(self._daily_recommendations)
+    
+    def _daily_recommendations(self, db: Session):
+        engine = BettingEngine(db, self.api_client)
         today = date.today()
         
         races = db.query(Race).filter(Race.race_date == today).order_by(Race.race_time).all()
@@ -122,7 +194,7 @@ class RaceScheduler:
         all_recommendations = []
         
         for race in races:
-            recommendations = await engine.analyze_race(race)
+            recommendations = engine.analyze_race(race)
             
             for rec in recommendations:
                 bet = Bet(
@@ -142,80 +214,52 @@ class RaceScheduler:
         
         db.commit()
         
-    async def generate_race_recommendations(self, db: Session, race_id: int):
-        
-        engine = BettingEngine(db)
-        race = db.query(Race).filter(Race.id == race_id).first()
-        
-        if race:
-            db.query(Bet).filter(Bet.race_id == race_id).delete()
-            
-            recommendations = await engine.analyze_race(race)
-            
-            for rec in recommendations:
-                bet = Bet(
-                    race_id=race.id,
-                    entry_id=rec['entry_id'],
-                    bet_type=rec['bet_type'],
-                    amount=rec['bet_amount'],
-                    odds=rec['current_odds'],
-                    confidence=rec['confidence'],
-                    expected_value=rec['expected_value']
-                )
-                db.add(bet)
-                
-            db.commit()
+    async def generate_race_recommendations(self, db: AsyncSession, race_id: int):
+        await db.run_sync(score_race, race_id, self.api_client)
             
     async def process_daily_results(self):
+        async with get_async_session_local()() as db:
+            await db.run_sync(self._settle_daily_results)
+    
+    def _settle_daily_results(self, db: Session):
+        today = date.today()
         
-        db = next(get_db())
-        try:
-            today = date.today()
-            
-            bets = db.query(Bet).join(Race).filter(Race.race_date == today).all()
-            
-            for bet in bets:
-                if not hasattr(bet, 'result') or not bet.result:
-                    entry = bet.entry
-                    if entry.result:
-                        won = entry.result.finish_position == 1
-                        payout = bet.amount * (bet.odds + 1) if won else 0
-                        
-                        bet_result = BetResult(
-                            bet_id=bet.id,
-                            won=won,
-                            payout=payout
-                        )
-                        db.add(bet_result)
-                        
-            for track_name in ["Remington Park", "Fair Meadows"]:
-                track = db.query(Track).filter(Track.name == track_name).first()
-                if track:
-                    track_bets = db.query(Bet).join(Race).filter(
-                        Race.track_id == track.id,
-                        Race.race_date == today
-                    ).all()
+        # Today's bets with their entry results and bet results, in one query
+        bets = load_bets(db, Race.race_date == today)
+        
+        for bet in bets:
+            if not hasattr(bet, 'result') or not bet.result:
+                entry = bet.entry
+                if entry.result:
+                    won = entry.result.finish_position == 1
+                    payout = bet.amount * (bet.odds + 1) if won else 0
                     
-                    total_wagered = sum(bet.amount for bet in track_bets)
-                    total_returned = sum(
-                        bet.result.payout for bet in track_bets 
-                        if hasattr(bet, 'result') and bet.result
+                    # Set through the relationship so the totals below include it
+                    bet.result = BetResult(
+                        won=won,
+                        payout=payout
                     )
                     
-                    if total_wagered > 0:
-                        roi_percentage = ((total_returned - total_wagered) / total_wagered) * 100
-                        
-                        daily_roi = DailyROI(
-                            track_id=track.id,
-                            date=today,
-                            total_wagered=total_wagered,
-                            total_returned=total_returned,
-                            roi_percentage=roi_percentage
-                        )
-                        db.add(daily_roi)
-                        
-            db.commit()
+        track_registry.load(db)
+        for track in track_registry.active():
+            track_bets = [bet for bet in bets if bet.race.track_id == track.id]
             
-        finally:
-            db.close()
-    
+            total_wagered = sum(bet.amount for bet in track_bets)
+            total_returned = sum(
+                bet.result.payout for bet in track_bets 
+                if hasattr(bet, 'result') and bet.result
+            )
+            
+            if total_wagered > 0:
+                roi_percentage = ((total_returned - total_wagered) / total_wagered) * 100
+                
+                daily_roi = DailyROI(
+                    track_id=track.id,
+                    date=today,
+                    total_wagered=total_wagered,
+                    total_returned=total_returned,
+                    roi_percentage=roi_percentage
+                )
+                db.add(daily_roi)
+                    
+        db.commit()
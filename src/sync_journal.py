@@ -0,0 +1,167 @@
+"""
+Sync journal
+Records every unit of work in a sync run (a track's races, a race's
+entries, a horse's history) with its status, duration and error, so a
+restarted or re-triggered run skips completed units and retries only
+failed ones, and slow phases show up in the timings. Units also keep the
+upstream API usage they caused, and each run records its per-endpoint
+usage under the 'upstream' phase.
+"""
+
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from api_telemetry import track_usage, usage_delta
+from database import SyncJournalEntry
+
+logger = logging.getLogger(__name__)
+
+
+def run_key_for(kind: str, run_date: Optional[date] = None) -> str:
+    """'pre_race:2026-10-17' for daily runs, just the kind for runs that span dates (backfill)"""
+    return f"{kind}:{run_date.isoformat()}" if run_date else kind
+
+
+class SyncJournal:
+    def __init__(self, kind: str, run_date: Optional[date] = None, resume: bool = True):
+        self.run_key = run_key_for(kind, run_date)
+        # resume=False reruns every unit, the journal is still written
+        self.resume = resume
+        self._done: Optional[Set[Tuple[str, str]]] = None
+
+    def load(self, db: Session):
+        """Load the units this run already completed, once"""
+        if self._done is not None:
+            return
+        self._done = set()
+        if self.resume:
+            self._done.update(db.query(SyncJournalEntry.phase, SyncJournalEntry.unit).filter(
+                SyncJournalEntry.run_key == self.run_key,
+                SyncJournalEntry.status == "done"
+            ).all())
+            if self._done:
+                logger.info(f"Resuming {self.run_key}: {len(self._done)} units already done")
+
+    def is_done(self, phase: str, unit: str) -> bool:
+        return self._done is not None and (phase, unit) in self._done
+
+    def record_many(self, db: Session, phase: str, units: Dict[str, Tuple[str, float, Optional[str]]],
+                    started_at: Optional[datetime] = None, details: Optional[Dict[str, dict]] = None):
+        """Upsert {unit: (status, duration_ms, error)} and optional {unit: details} in one statement, the caller commits"""
+        if not units:
+            return
+        now = datetime.now()
+        rows = [
+            {
+                "run_key": self.run_key,
+                "phase": phase,
+                "unit": unit,
+                "status": status,
+                "attempts": 1,
+                "started_at": started_at or now,
+                "finished_at": now,
+                "duration_ms": duration_ms,
+                "error": error,
+                "details": (details or {}).get(unit)
+            }
+            for unit, (status, duration_ms, error) in units.items()
+        ]
+        stmt = pg_insert(SyncJournalEntry).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_sync_journal_run_phase_unit",
+            set_={
+                "status": stmt.excluded.status,
+                "attempts": SyncJournalEntry.attempts + 1,
+                "started_at": stmt.excluded.started_at,
+                "finished_at": stmt.excluded.finished_at,
+                "duration_ms": stmt.excluded.duration_ms,
+                "error": stmt.excluded.error,
+                "details": stmt.excluded.details
+            }
+        )
+        db.execute(stmt)
+
+        if self._done is not None:
+            for unit, (status, _, _) in units.items():
+                if status == "done":
+                    self._done.add((phase, unit))
+
+    def record(self, db: Session, phase: str, unit: str, status: str, duration_ms: float,
+               error: Optional[str] = None, started_at: Optional[datetime] = None, details: Optional[dict] = None):
+        self.record_many(db, phase, {unit: (status, duration_ms, error)}, started_at,
+                         {unit: details} if details else None)
+    
+    def record_upstream(self, db: Session, before: dict, after: dict, started_at: Optional[datetime] = None):
+        """Record the run's per-endpoint upstream usage between two telemetry snapshots
+        under the 'upstream' phase (duration_ms is total upstream latency), the caller commits.
+        A rerun of the same run key replaces the previous run's figures."""
+        delta = usage_delta(before, after)
+        self.record_many(
+            db, "upstream",
+            {endpoint: ("done", usage["latency_ms"], None) for endpoint, usage in delta.items()},
+            started_at,
+            delta
+        )
+
+    @asynccontextmanager
+    async def unit(self, db: AsyncSession, phase: str, unit: str):
+        """Run one unit of work: commits its writes together with a 'done' entry,
+        or rolls them back and records 'failed' with the error. Errors are not re-raised."""
+        started_at = datetime.now()
+        started = time.monotonic()
+        with track_usage() as usage:
+            try:
+                yield
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                error = None
+        
+        details = {"upstream": usage} if usage["calls"] else None
+        if error:
+            await db.rollback()
+            logger.error(f"{self.run_key} {phase} {unit} failed: {error}")
+            await db.run_sync(self.record, phase, unit, "failed", (time.monotonic() - started) * 1000,
+                              error, started_at, details)
+        else:
+            await db.run_sync(self.record, phase, unit, "done", (time.monotonic() - started) * 1000,
+                              None, started_at, details)
+        await db.commit()
+
+
+def phase_summary(db: Session, run_key: str) -> List[dict]:
+    """Per-phase unit counts and timings for a run"""
+    rows = db.query(
+        SyncJournalEntry.phase,
+        func.count(SyncJournalEntry.id),
+        func.sum(case((SyncJournalEntry.status == "failed", 1), else_=0)),
+        func.sum(SyncJournalEntry.duration_ms),
+        func.avg(SyncJournalEntry.duration_ms),
+        func.max(SyncJournalEntry.duration_ms),
+        func.min(SyncJournalEntry.started_at),
+        func.max(SyncJournalEntry.finished_at)
+    ).filter(
+        SyncJournalEntry.run_key == run_key
+    ).group_by(SyncJournalEntry.phase).all()
+
+    return [
+        {
+            "phase": phase,
+            "units": units,
+            "failed": failed or 0,
+            "total_ms": round(total_ms or 0, 1),
+            "avg_ms": round(avg_ms or 0, 1),
+            "max_ms": round(max_ms or 0, 1),
+            # Units run concurrently, so wall time is usually well below total_ms
+            "wall_ms": round((last - first).total_seconds() * 1000, 1) if first and last else None
+        }
+        for phase, units, failed, total_ms, avg_ms, max_ms, first, last in rows
+    ]
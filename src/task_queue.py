@@ -0,0 +1,216 @@
+"""
+Postgres-backed work queue for sync tasks
+Tasks live in the sync_tasks table and are claimed with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of
+`python main.py --worker` processes can drain the queue together.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, date, timedelta
+from typing import Optional
+
+from sqlalchemy import and_, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import Base, Horse, SyncTask, Race, RaceEntry, Track, get_async_session_local, get_engine, get_session_local
+from jobs import JOB_KIND_PREFIX
+from racing_api import get_api_client
+from track_registry import track_registry
+
+logger = logging.getLogger(__name__)
+
+VISIBILITY_TIMEOUT = timedelta(seconds=int(os.getenv("TASK_VISIBILITY_TIMEOUT_SECONDS", "300")))
+TASK_TIMEOUT = float(os.getenv("TASK_TIMEOUT_SECONDS", "120"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("TASK_RETRY_BACKOFF_SECONDS", "10"))
+
+
+def enqueue_task(db: Session, kind: str, payload: dict, dedupe_key: Optional[str] = None,
+                 max_attempts: int = 3, delay: Optional[timedelta] = None) -> Optional[int]:
+    """Add a task, skipped if a pending/running task has the same dedupe key. Returns the new task id"""
+    values = {
+        "kind": kind,
+        "payload": payload,
+        "dedupe_key": dedupe_key,
+        "status": "pending",
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "available_at": datetime.now() + (delay or timedelta(0))
+    }
+    stmt = pg_insert(SyncTask).values(values).on_conflict_do_nothing(
+        index_elements=["dedupe_key"],
+        index_where=text("status IN ('pending', 'running')")
+    ).returning(SyncTask.id)
+    return db.execute(stmt).scalar()
+
+
+def claim_task(db: Session, worker_id: str) -> Optional[SyncTask]:
+    """Claim the next available task, including running tasks whose visibility timeout expired"""
+    while True:
+        now = datetime.now()
+        task = db.query(SyncTask).filter(
+            or_(
+                and_(SyncTask.status == "pending", SyncTask.available_at <= now),
+                # Background jobs (jobs.py) use locked_until as their own lease, they're never claimed
+                and_(SyncTask.status == "running", SyncTask.locked_until < now,
+                     ~SyncTask.kind.startswith(JOB_KIND_PREFIX))
+            )
+        ).order_by(SyncTask.available_at).with_for_update(skip_locked=True).first()
+
+        if not task:
+            db.rollback()
+            return None
+
+        if task.status == "running" and task.attempts >= task.max_attempts:
+            # Worker died or hung on the last attempt
+            task.status = "failed"
+            task.last_error = f"Visibility timeout expired on attempt {task.attempts} (worker {task.locked_by})"
+            task.finished_at = now
+            task.locked_until = None
+            db.commit()
+            continue
+
+        task.status = "running"
+        task.attempts += 1
+        task.locked_by = worker_id
+        task.locked_until = now + VISIBILITY_TIMEOUT
+        task.started_at = now
+        db.commit()
+        return task
+
+
+async def run_task(db: AsyncSession, task: SyncTask):
+    """Run a claimed task and record its outcome, timing and retry schedule"""
+    task_id, kind, payload = task.id, task.kind, task.payload or {}
+    worker_id, attempts, max_attempts = task.locked_by, task.attempts, task.max_attempts
+    started = time.monotonic()
+
+    try:
+        handler = TASK_HANDLERS[kind]
+        await asyncio.wait_for(handler(db, payload), timeout=TASK_TIMEOUT)
+        await db.commit()
+        error = None
+    except Exception as e:
+        await db.rollback()
+        error = f"{type(e).__name__}: {e}"
+        logger.error(f"Task {kind} {task_id} failed: {error}")
+
+    values = {"duration_ms": (time.monotonic() - started) * 1000, "locked_until": None}
+    if error is None:
+        values.update(status="done", finished_at=datetime.now())
+    elif attempts >= max_attempts:
+        values.update(status="failed", last_error=error, finished_at=datetime.now())
+    else:
+        # Retry with exponential backoff
+        values.update(status="pending", last_error=error,
+                      available_at=datetime.now() + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)))
+
+    # Only while we still hold the task: after our visibility timeout another worker may have reclaimed it
+    result = await db.execute(update(SyncTask).where(
+        SyncTask.id == task_id,
+        SyncTask.status == "running",
+        SyncTask.locked_by == worker_id
+    ).values(**values))
+    await db.commit()
+    if result.rowcount == 0:
+        logger.warning(f"Task {kind} {task_id} was reclaimed from {worker_id} before it finished, outcome not recorded")
+
+
+async def _fetch_history(db: AsyncSession, payload: dict):
+    from data_sync import DataSync
+
+    reg_number = (await db.execute(
+        select(Horse.registration_number).join(RaceEntry, RaceEntry.horse_id == Horse.id)
+        .filter(RaceEntry.id == payload["entry_id"])
+    )).scalar()
+    if not reg_number:
+        return
+
+    sync = DataSync()
+    history_data = await sync.api_client.get_horse_history(reg_number)
+    await db.run_sync(sync._store_histories, {reg_number: payload["entry_id"]}, {reg_number: history_data})
+
+
+async def _refresh_odds(db: AsyncSession, payload: dict):
+    from data_sync import DataSync
+
+    track = await db.get(Track, payload["track_id"])
+    races = (await db.scalars(select(Race).filter(Race.id.in_(payload["race_ids"])))).all()
+    if not track or not races:
+        return
+
+    moved = await DataSync().refresh_odds(db, track, date.fromisoformat(payload["race_date"]), races)
+
+    # Re-score only the races whose odds moved
+    for race_id in moved:
+        await db.run_sync(enqueue_task, "score_race", {"race_id": race_id}, dedupe_key=f"score_race:{race_id}")
+
+
+async def _ingest_results(db: AsyncSession, payload: dict):
+    from data_sync import DataSync
+
+    track = await db.get(Track, payload["track_id"])
+    if track:
+        await DataSync().ingest_meet_results(db, track, date.fromisoformat(payload["race_date"]))
+
+
+async def _score_race(db: AsyncSession, payload: dict):
+    from betting_engine import score_race
+
+    await db.run_sync(score_race, payload["race_id"])
+
+
+TASK_HANDLERS = {
+    "fetch_history": _fetch_history,
+    "refresh_odds": _refresh_odds,
+    "ingest_results": _ingest_results,
+    "score_race": _score_race,
+}
+
+
+async def _worker_loop(worker_id: str, poll_interval: float):
+    SessionLocal = get_async_session_local()
+    while True:
+        async with SessionLocal() as db:
+            try:
+                task = await db.run_sync(claim_task, worker_id)
+                if task is None:
+                    await asyncio.sleep(poll_interval)
+                    continue
+                await run_task(db, task)
+            except Exception as e:
+                logger.error(f"Worker {worker_id} error: {e}")
+                await db.rollback()
+                await asyncio.sleep(poll_interval)
+
+
+async def run_worker():
+    """Drain the task queue until stopped, `TASK_WORKER_CONCURRENCY` tasks at a time"""
+    Base.metadata.create_all(bind=get_engine())
+    
+    db = get_session_local()()
+    try:
+        track_registry.load(db)
+    finally:
+        db.close()
+
+    concurrency = int(os.getenv("TASK_WORKER_CONCURRENCY", "4"))
+    poll_interval = float(os.getenv("TASK_POLL_INTERVAL_SECONDS", "1"))
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    api_client = get_api_client()
+    await api_client.open()
+    logger.info(f"Task worker {worker_id} started with concurrency {concurrency}")
+
+    try:
+        await asyncio.gather(*(
+            _worker_loop(f"{worker_id}/{i}", poll_interval) for i in range(concurrency)
+        ))
+    finally:
+        await api_client.aclose()
@@ -0,0 +1,124 @@
+"""
+Track registry
+The tracks table is the single source of truth for which tracks we sync
+and which TheRacingAPI track codes each one maps to. It is loaded once
+and shared by the sync pipelines, scheduler, API client and endpoints.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from database import Track, get_async_session_local
+
+logger = logging.getLogger(__name__)
+
+# Seeded into an empty registry, extra tracks can be listed in TRACK_REGISTRY_FILE
+DEFAULT_TRACKS = [
+    {"name": "Remington Park", "code": "RP", "api_codes": ["RP"]},
+    # Fair Meadows -> try Fair Meadows Tulsa, then Fairmount Park
+    {"name": "Fair Meadows", "code": "FM", "api_codes": ["FMT", "FP"]}
+]
+
+
+class TrackInfo:
+    """Detached snapshot of a tracks row, safe to share across sessions"""
+
+    def __init__(self, id: int, name: str, code: str, api_codes: Optional[List[str]] = None):
+        self.id = id
+        self.name = name
+        self.code = code
+        self.api_codes = list(api_codes or [code])
+
+    def __repr__(self):
+        return f"TrackInfo({self.code}, {self.name})"
+
+
+class TrackRegistry:
+    def __init__(self):
+        self._by_code: Dict[str, TrackInfo] = {}
+        self._by_id: Dict[int, TrackInfo] = {}
+        self.loaded = False
+        # Track pipelines run at once, each holds a DB connection
+        self.concurrency = int(os.getenv("SYNC_TRACK_CONCURRENCY", "4"))
+
+    def seed(self, db: Session, tracks: Optional[List[dict]] = None) -> int:
+        """Insert any configured tracks missing from the table, existing rows are left as edited"""
+        if tracks is None:
+            tracks = list(DEFAULT_TRACKS)
+            registry_file = os.getenv("TRACK_REGISTRY_FILE")
+            if registry_file:
+                with open(registry_file) as f:
+                    tracks.extend(json.load(f))
+
+        existing = {code for (code,) in db.query(Track.code).all()}
+        added = 0
+        for track_data in tracks:
+            if track_data["code"] in existing:
+                continue
+            db.add(Track(
+                name=track_data["name"],
+                code=track_data["code"],
+                api_codes=track_data.get("api_codes") or [track_data["code"]],
+                active=track_data.get("active", True)
+            ))
+            existing.add(track_data["code"])
+            added += 1
+
+        db.commit()
+        if added:
+            self.loaded = False
+        return added
+
+    def load(self, db: Session, reload: bool = False):
+        """Load active tracks once, pass reload=True after editing the table"""
+        if self.loaded and not reload:
+            return
+
+        tracks = [
+            TrackInfo(track.id, track.name, track.code, track.api_codes)
+            for track in db.query(Track).filter(Track.active.is_(True)).order_by(Track.id).all()
+        ]
+        self._by_code = {track.code: track for track in tracks}
+        self._by_id = {track.id: track for track in tracks}
+        self.loaded = True
+        logger.info(f"Track registry loaded {len(tracks)} tracks: {', '.join(self._by_code)}")
+
+    def active(self) -> List[TrackInfo]:
+        return list(self._by_code.values())
+
+    def get(self, code: str) -> Optional[TrackInfo]:
+        return self._by_code.get(code)
+
+    def by_id(self, track_id: int) -> Optional[TrackInfo]:
+        return self._by_id.get(track_id)
+
+    def api_codes(self, code: str) -> List[str]:
+        """TheRacingAPI track codes to try, in order, for an internal track code"""
+        track = self._by_code.get(code)
+        return track.api_codes if track else [code]
+
+    async def run_per_track(self, pipeline: Callable[..., Awaitable], *args,
+                            tracks: Optional[List[TrackInfo]] = None) -> Dict[str, object]:
+        """Run pipeline(db, track, *args) for every active track concurrently, each with its own AsyncSession"""
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+        SessionLocal = get_async_session_local()
+
+        async def run(track: TrackInfo):
+            async with semaphore, SessionLocal() as db:
+                try:
+                    return track.code, await pipeline(db, track, *args)
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"Sync pipeline for {track.name} failed: {e}")
+                    return track.code, None
+
+        results = await asyncio.gather(*(run(track) for track in (tracks if tracks is not None else self.active())))
+        return dict(results)
+
+
+track_registry = TrackRegistry()
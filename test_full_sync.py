@@ -12,7 +12,7 @@ os.environ['RACING_API_BASE_URL'] = 'https://api.theracingapi.com'
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from database import get_db, Base, get_engine, Track, Race, Bet, RaceEntry, Horse
+from database import get_db, get_async_session_local, Base, get_engine, Track, Race, Bet, RaceEntry, Horse
 from scheduler import RaceScheduler
 from data_sync import DataSync
 
@@ -38,7 +38,8 @@ async def test_full_sync():
     # Run initial sync
     print("\nRunning initial sync...")
     data_sync = DataSync()
-    await data_sync.sync_initial_data(db)
+    async with get_async_session_local()() as async_db:
+        await data_sync.sync_initial_data(async_db)
     
     # Check results
     print("\n=== Sync Results ===")
@@ -62,7 +63,8 @@ async def test_full_sync():
     
     # Run pre-race sync to get entries
     print("\n\nRunning pre-race sync...")
-    await data_sync.sync_pre_race_data(db)
+    async with get_async_session_local()() as async_db:
+        await data_sync.sync_pre_race_data(async_db)
     
     # Check entries
     print("\n=== Entry Results ===")
@@ -83,7 +85,8 @@ async def test_full_sync():
     # Generate recommendations
     print("\n\nGenerating recommendations...")
     scheduler = RaceScheduler()
-    await scheduler.generate_daily_recommendations(db)
+    async with get_async_session_local()() as async_db:
+        await scheduler.generate_daily_recommendations(async_db)
     
     # Check bets
     print("\n=== Betting Results ===")
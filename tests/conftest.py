@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+# The fake server has no quota
+os.environ.setdefault('RACING_API_RATE_LIMIT', '0')
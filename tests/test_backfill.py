@@ -0,0 +1,96 @@
+import asyncio
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("httpx")
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("needs DATABASE_URL pointing at a scratch Postgres database", allow_module_level=True)
+
+from backfill import Backfill, BackfillStats
+from data_sync import DataSync, race_api_id
+from database import (Base, HistoricalPerformance, Horse, Race, RaceEntry, SyncJournalEntry, Track,
+                      dispose_async_engine, get_async_session_local, get_engine, get_session_local)
+from racing_api import RacingAPIClient
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=get_engine())
+    session = get_session_local()()
+    yield session
+    session.rollback()
+    session.close()
+
+
+def _history(runs: int) -> dict:
+    """`runs` weekly performances, oldest first, the last one a week ago"""
+    first = date.today() - timedelta(weeks=runs)
+    return {"performances": [
+        {"race_date": (first + timedelta(weeks=i)).isoformat(), "distance": 6, "surface": "Dirt",
+         "finish_position": i % 8 + 1, "odds": 4.0, "speed_figure": 80}
+        for i in range(runs)
+    ]}
+
+
+def test_backfill_loads_seasons_older_than_the_daily_sync(db):
+    suffix = uuid.uuid4().hex[:8]
+    track = Track(name=f"Backfill Test {suffix}", code=f"T{suffix}")
+    horse = Horse(registration_number=f"BF{suffix}", name=f"Backfill Horse {suffix}")
+    db.add_all([track, horse])
+    db.flush()
+    race = Race(api_id=race_api_id(track.code, date.today(), 1), track_id=track.id, race_number=1,
+                race_date=date.today(), race_time=datetime.now())
+    db.add(race)
+    db.flush()
+    entry = RaceEntry(race_id=race.id, horse_id=horse.id, post_position=1)
+    db.add(entry)
+    db.commit()
+
+    history = _history(60)
+    reg_number, entry_id, race_id = horse.registration_number, entry.id, race.id
+
+    def stored() -> int:
+        return db.query(HistoricalPerformance).filter(HistoricalPerformance.horse_id == horse.id).count()
+
+    backfill = Backfill(date.today(), date.today(), resume=False, api_client=RacingAPIClient())
+    backfill.stats = BackfillStats(1)
+
+    async def fetch_histories(reg_numbers, stats=None):
+        for reg_number in reg_numbers:
+            if stats is not None:
+                stats[reg_number] = (1.0, None)
+        return {reg_number: history for reg_number in reg_numbers}
+
+    backfill.sync._fetch_horse_histories = fetch_histories
+
+    async def run():
+        try:
+            async with get_async_session_local()() as async_db:
+                # The daily sync stores the last 20 runs and moves the horse's watermark to the latest one
+                sync = DataSync(RacingAPIClient())
+                await async_db.run_sync(sync._store_histories, {reg_number: entry_id}, {reg_number: history})
+                await async_db.commit()
+                assert stored() == 20
+
+                await backfill._backfill_histories(async_db, [race_id])
+        finally:
+            await dispose_async_engine()
+
+    try:
+        asyncio.run(run())
+
+        assert stored() == 60
+        assert backfill.stats.performances == 40
+    finally:
+        db.rollback()
+        db.query(HistoricalPerformance).filter(HistoricalPerformance.horse_id == horse.id).delete()
+        db.query(SyncJournalEntry).filter(SyncJournalEntry.unit == horse.registration_number).delete()
+        db.query(RaceEntry).filter(RaceEntry.id == entry.id).delete()
+        db.query(Race).filter(Race.id == race.id).delete()
+        db.query(Horse).filter(Horse.id == horse.id).delete()
+        db.query(Track).filter(Track.id == track.id).delete()
+        db.commit()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from datetime import date
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("needs DATABASE_URL pointing at a scratch Postgres database", allow_module_level=True)
+
+from data_sync import DataSync, history_watermarks
+from database import Base, dispose_async_engine, get_async_session_local, get_engine
+from fake_racing_api import FakeConfig, create_app, synthetic_tracks
+from racing_api import RacingAPIClient
+from sync_journal import SyncJournal
+from track_registry import track_registry
+
+
+def test_unchanged_histories_are_not_refetched_the_same_day():
+    Base.metadata.create_all(bind=get_engine())
+    config = FakeConfig(tracks=1, races_per_card=2, field_size=4, latency_ms=0, jitter_ms=0,
+                        error_rate=0, throttle_rate=0)
+    fake_app = create_app(config)
+    today = date.today()
+    fetched = []
+
+    async def run():
+        api_client = RacingAPIClient(transport=httpx.ASGITransport(app=fake_app))
+        api_client.base_url = "http://fake-racing-api"
+        sync = DataSync(api_client)
+        sync.use_task_queue = False
+        fetch_histories = sync._fetch_horse_histories
+
+        async def counting_fetch(reg_numbers, stats=None):
+            fetched.append(len(reg_numbers))
+            return await fetch_histories(reg_numbers, stats)
+
+        sync._fetch_horse_histories = counting_fetch
+
+        async def pre_race_sync():
+            # A fresh resume=False journal per run, as the scheduler's reruns use
+            journal = SyncJournal("pre_race", today, resume=False)
+            async with get_async_session_local()() as db:
+                await sync._sync_track_pre_race(db, track, today, journal)
+
+        try:
+            async with get_async_session_local()() as db:
+                await db.run_sync(track_registry.seed, synthetic_tracks(1))
+                await db.run_sync(track_registry.load, reload=True)
+                track = track_registry.get("FK01")
+                await sync._sync_track_races(db, track, today, SyncJournal("initial", today, resume=False))
+
+            # Warm the payload hashes, then start a new day with nothing synced yet
+            await pre_race_sync()
+            history_watermarks.synced_on.clear()
+
+            await pre_race_sync()
+            await pre_race_sync()
+        finally:
+            await api_client.aclose()
+            await dispose_async_engine()
+
+    asyncio.run(run())
+
+    # The new day's first run refetches every horse, their payloads are unchanged
+    # and the second run still sees them as synced today
+    assert fetched[1] > 0
+    assert fetched[2] == 0
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+
+from fake_racing_api import FakeConfig, create_app
+from racing_api import RacingAPIClient
+
+MEETS = "/v1/north-america/meets"
+MEETS_PARAMS = {"start_date": "2024-06-14", "end_date": "2024-06-14"}
+
+
+def _fake_client(latency_ms: float = 0):
+    config = FakeConfig(tracks=2, races_per_card=2, field_size=4, latency_ms=latency_ms, jitter_ms=0,
+                        error_rate=0, throttle_rate=0)
+    fake_app = create_app(config)
+    client = RacingAPIClient(transport=httpx.ASGITransport(app=fake_app))
+    client.base_url = "http://fake-racing-api"
+    return client, fake_app
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    client, fake_app = _fake_client(latency_ms=50)
+
+    async def fetch():
+        try:
+            return await asyncio.gather(*[client._get(MEETS, dict(MEETS_PARAMS)) for _ in range(5)])
+        finally:
+            await client.aclose()
+
+    responses = asyncio.run(fetch())
+    assert fake_app.state.stats["requests"] == 1
+    assert len({id(response) for response in responses}) == 1
+    assert client._inflight == {}
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    client, fake_app = _fake_client(latency_ms=50)
+
+    async def fetch():
+        try:
+            callers = [asyncio.ensure_future(client._get(MEETS, dict(MEETS_PARAMS))) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            callers[0].cancel()
+            return await asyncio.gather(*callers, return_exceptions=True)
+        finally:
+            await client.aclose()
+
+    cancelled, *responses = asyncio.run(fetch())
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert all(response.status_code == 200 for response in responses)
+    assert fake_app.state.stats["requests"] == 1
+
+
+def test_missing_meet_is_negatively_cached():
+    client, fake_app = _fake_client()
+    race_date = date.today()
+
+    async def resolve():
+        try:
+            first = await client._resolve_meet("NOPE", race_date)
+            second = await client._resolve_meet("NOPE", race_date)
+            # Once the short negative TTL is over the lookup goes upstream again
+            client.meet_negative_ttl = 0
+            client.invalidate_meet_cache("NOPE", race_date)
+            await client._resolve_meet("NOPE", race_date)
+            await client._resolve_meet("NOPE", race_date)
+            return first, second
+        finally:
+            await client.aclose()
+
+    first, second = asyncio.run(resolve())
+    assert first[0] is None and second[0] is None
+    assert first[2]["looking_for"] == ["NOPE"]
+    assert fake_app.state.stats["requests"] == 3
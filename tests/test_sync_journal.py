@@ -0,0 +1,59 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("needs DATABASE_URL pointing at a scratch Postgres database", allow_module_level=True)
+
+from database import Base, SyncJournalEntry, dispose_async_engine, get_async_session_local, get_engine, get_session_local
+from sync_journal import SyncJournal, run_key_for
+
+
+def test_resumed_run_skips_completed_units_and_retries_failed_ones():
+    Base.metadata.create_all(bind=get_engine())
+    kind = f"test_{uuid.uuid4().hex[:8]}"
+    runs = []
+
+    async def sync_run(resume: bool):
+        """A pipeline over three units the way DataSync runs them, the second one fails on the first run"""
+        journal = SyncJournal(kind, resume=resume)
+        async with get_async_session_local()() as db:
+            await db.run_sync(journal.load)
+            for unit in ("a", "b", "c"):
+                if journal.is_done("units", unit):
+                    continue
+                async with journal.unit(db, "units", unit):
+                    runs.append(unit)
+                    if unit == "b" and len(runs) <= 3:
+                        raise RuntimeError("upstream timeout")
+        return journal
+
+    async def run():
+        try:
+            first = await sync_run(resume=True)
+            resumed = await sync_run(resume=True)
+            rerun = await sync_run(resume=False)
+            return first, resumed, rerun
+        finally:
+            await dispose_async_engine()
+
+    db = get_session_local()()
+    try:
+        first, resumed, rerun = asyncio.run(run())
+
+        # First run: all three; resumed run: only the failed one; resume=False: all three again
+        assert runs == ["a", "b", "c", "b", "a", "b", "c"]
+        assert first.is_done("units", "a") and not first.is_done("units", "b")
+        assert resumed.is_done("units", "b")
+
+        entries = dict(db.query(SyncJournalEntry.unit, SyncJournalEntry.attempts).filter(
+            SyncJournalEntry.run_key == run_key_for(kind)
+        ).all())
+        assert entries == {"a": 2, "b": 3, "c": 2}
+    finally:
+        db.query(SyncJournalEntry).filter(SyncJournalEntry.run_key == run_key_for(kind)).delete()
+        db.commit()
+        db.close()
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("httpx")
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("needs DATABASE_URL pointing at a scratch Postgres database", allow_module_level=True)
+
+import task_queue
+from database import Base, SyncTask, dispose_async_engine, get_async_session_local, get_engine, get_session_local
+from task_queue import claim_task, enqueue_task, run_task
+
+# Available long before anything else in the queue, so these tests' claims pick their own tasks first
+LONG_AGO = timedelta(days=-10000)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(bind=get_engine())
+    session = get_session_local()()
+    task_ids = []
+    session.info["test_task_ids"] = task_ids
+    yield session
+    session.rollback()
+    session.query(SyncTask).filter(SyncTask.id.in_(task_ids)).delete(synchronize_session=False)
+    session.commit()
+    session.close()
+
+
+def _enqueue(db, kind: str, count: int = 1):
+    ids = [enqueue_task(db, kind, {}, delay=LONG_AGO) for _ in range(count)]
+    db.commit()
+    db.info["test_task_ids"].extend(ids)
+    return ids
+
+
+def _expire_lease(db, task_id: int):
+    db.query(SyncTask).filter(SyncTask.id == task_id).update(
+        {"locked_until": datetime.now() - timedelta(seconds=1)}, synchronize_session=False
+    )
+    db.commit()
+
+
+def test_concurrent_claims_get_different_tasks(db):
+    ids = _enqueue(db, f"test_{uuid.uuid4().hex[:8]}", count=4)
+    barrier = threading.Barrier(4)
+    claimed = []
+
+    def claim(worker_id):
+        session = get_session_local()()
+        try:
+            barrier.wait()
+            task = claim_task(session, worker_id)
+            claimed.append(task.id if task else None)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=claim, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(ids)
+
+
+def test_task_is_reclaimed_after_its_visibility_timeout(db):
+    task_id, = _enqueue(db, f"test_{uuid.uuid4().hex[:8]}")
+
+    first = claim_task(db, "worker-a")
+    assert first.id == task_id
+    # Still leased to worker-a
+    other = claim_task(db, "worker-b")
+    assert other is None or other.id != task_id
+
+    _expire_lease(db, task_id)
+    second = claim_task(db, "worker-b")
+    assert second.id == task_id
+    assert second.locked_by == "worker-b"
+    assert second.attempts == 2
+
+
+def test_stale_worker_outcome_is_dropped(db, monkeypatch):
+    kind = f"test_{uuid.uuid4().hex[:8]}"
+    task_id, = _enqueue(db, kind)
+
+    async def noop(async_db, payload):
+        pass
+
+    monkeypatch.setitem(task_queue.TASK_HANDLERS, kind, noop)
+
+    async def run():
+        try:
+            SessionLocal = get_async_session_local()
+            async with SessionLocal() as db_a, SessionLocal() as db_b:
+                task_a = await db_a.run_sync(claim_task, "worker-a")
+                assert task_a.id == task_id
+                # worker-a hangs past its lease and worker-b takes the task over
+                await db_b.run_sync(_expire_lease, task_id)
+                task_b = await db_b.run_sync(claim_task, "worker-b")
+                assert task_b.id == task_id
+
+                # worker-a finishing late must not mark worker-b's task done
+                await run_task(db_a, task_a)
+        finally:
+            await dispose_async_engine()
+
+    asyncio.run(run())
+
+    row = db.query(SyncTask).populate_existing().filter(SyncTask.id == task_id).one()
+    assert row.status == "running"
+    assert row.locked_by == "worker-b"
+
+
+def test_duplicate_dedupe_key_is_skipped(db):
+    dedupe_key = f"test:{uuid.uuid4().hex}"
+    first = enqueue_task(db, "fetch_history", {"entry_id": 0}, dedupe_key=dedupe_key, delay=timedelta(days=1))
+    second = enqueue_task(db, "fetch_history", {"entry_id": 0}, dedupe_key=dedupe_key, delay=timedelta(days=1))
+    db.commit()
+    db.info["test_task_ids"].append(first)
+
+    assert first is not None
+    assert second is None
+    assert db.query(SyncTask).filter(SyncTask.dedupe_key == dedupe_key).count() == 1